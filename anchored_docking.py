@@ -5,7 +5,9 @@ import os
 import logging
 
 from pipeline_elements import BASE_DIR, Preparation, ReceptorPreparation, AnchorGenerator, \
-    DockingRun, RmsdAnalysis
+    DockingRun, ResourceReport, RmsdAnalysis, Scheduler, set_process_limit
+from pipeline_elements.results import add_ingestion
+from pipeline_elements.work_queue import submit_workflow
 
 
 class AnchoredDocking:
@@ -103,20 +105,13 @@ class AnchoredDocking:
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        logging.info('receptor preparation')
-        self.__receptor_preparation.run(recalc)
-
-        logging.info('ligand preparation')
-        if recalc or not self.__ligand_preparation.output_exists():
-            self.__ligand_preparation.run()
-
-        logging.info('anchoring ligand')
-        if recalc or not self.__anchor_generator.output_exists():
-            self.__anchor_generator.run()
-
-        # docking run is always rerun
-        logging.info('docking')
-        self.__docking_run.run()
+        scheduler = Scheduler(self.config.getint('Execution', 'workers', fallback=1))
+        scheduler.add(self.__receptor_preparation, 'receptor preparation')
+        scheduler.add(self.__ligand_preparation, 'ligand preparation')
+        scheduler.add(self.__anchor_generator, 'anchoring ligand')
+        scheduler.add(self.__docking_run, 'docking')
+        add_ingestion(scheduler, self.config, self.docked, self.output, self.protein)
+        scheduler.run(recalc)
 
         if self.rmsd_reference:
             self.__rmsd_analysis.run()
@@ -133,6 +128,18 @@ def main(args):
     logging.basicConfig(level=logging.DEBUG)
     config = configparser.ConfigParser()
     config.read(args.config)
+    if args.queue:
+        submit_workflow(args.queue, config, 'anchored_docking', {
+            'protein': args.protein,
+            'native_ligand': args.native_ligand,
+            'docking_ligand': args.docking_ligand,
+            'template': args.template,
+            'docking_in': args.docking_in,
+            'rmsd_reference': args.rmsd_reference,
+            'receptor': args.receptor
+        }, args.output, recalc=args.recalc)
+        return
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
     cross_docking = AnchoredDocking(
         args.protein,
         args.native_ligand,
@@ -144,7 +151,9 @@ def main(args):
         rmsd_reference=args.rmsd_reference,
         receptor=args.receptor
     )
-    cross_docking.run(args.recalc)
+    with ResourceReport() as report:
+        cross_docking.run(args.recalc)
+    report.write(os.path.join(cross_docking.output, 'resources.json'))
 
 
 if __name__ == '__main__':
@@ -176,4 +185,9 @@ if __name__ == '__main__':
         type=str,
         help='path to the receptor, if it doesn\'t exist, it will be generated at this path'
     )
+    parser.add_argument(
+        '--queue',
+        type=str,
+        help='submit the job to a work queue directory drained by queue_worker.py instead'
+    )
     main(parser.parse_args())
@@ -4,7 +4,8 @@ import configparser
 import logging
 import os
 
-from pipeline_elements import BASE_DIR, ReceptorPreparation, AnchoredDeNovo
+from pipeline_elements import BASE_DIR, ReceptorPreparation, AnchoredDeNovo, Scheduler, \
+    ResourceReport, set_process_limit
 
 
 class AnchoredGrowing:
@@ -73,11 +74,10 @@ class AnchoredGrowing:
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        logging.info('receptor preparation')
-        self.__receptor_preparation.run(recalc)
-
-        logging.info('de novo growing')
-        self.__anchored_de_novo.run()
+        scheduler = Scheduler(self.config.getint('Execution', 'workers', fallback=1))
+        scheduler.add(self.__receptor_preparation, 'receptor preparation')
+        scheduler.add(self.__anchored_de_novo, 'de novo growing')
+        scheduler.run(recalc)
 
         return self
 
@@ -92,6 +92,7 @@ def main(args):
     logging.basicConfig(level=logging.DEBUG)
     config = configparser.ConfigParser()
     config.read(args.config)
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
     anchored_de_novo = AnchoredGrowing(
         args.protein,
         args.native_ligand,
@@ -102,7 +103,9 @@ def main(args):
         docking_in=args.docking_in,
         receptor=args.receptor
     )
-    anchored_de_novo.run(args.recalc)
+    with ResourceReport() as report:
+        anchored_de_novo.run(args.recalc)
+    report.write(os.path.join(anchored_de_novo.output, 'resources.json'))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,195 @@
+"""Batch anchored docking of an analog series using the DOCK workflow"""
+import argparse
+import configparser
+import logging
+import os
+
+from pipeline_elements import BASE_DIR, ReceptorPreparation, BatchAnchorGenerator, Scheduler, \
+    ResourceReport, set_process_limit
+from pipeline_elements.batch import dock_ligands, ligand_name, prepare_ligands, split_ligands, \
+    write_results
+from pipeline_elements.prepare import is_converted
+
+
+class BatchAnchoredDocking:
+    """Batch anchored docking of an analog series using the DOCK workflow
+
+    The receptor is prepared once and the anchors of all ligands are
+    generated against one template. Anchored docking of every ligand runs
+    in a pool of worker processes with one output directory per ligand.
+    """
+
+    def __init__(
+            self,
+            protein,
+            native_ligand,
+            ligands,
+            template,
+            output,
+            config,
+            docking_in=None,
+            rmsd=False,
+            receptor=None,
+            workers=None
+    ):
+        """Batch anchored docking of an analog series using the DOCK workflow
+
+        :param protein: protein pdb to dock into
+        :param native_ligand: native ligand for active site definition
+        :param ligands: directory of ligand files or multi-molecule SDF/MOL2 file
+        :param template: template to anchor the ligands to
+        :param output: output directory for final and intermediate files
+        :param config: config object
+        :param docking_in: DOCK input template file
+        :param rmsd: calculate the RMSD of every ligand to its input pose
+        :param receptor: path to the receptor
+        :param workers: number of worker processes, defaults to the number of CPUs
+        """
+        self.protein = os.path.abspath(protein)
+        self.native_ligand = os.path.abspath(native_ligand)
+        self.ligands = os.path.abspath(ligands)
+        self.template = os.path.abspath(template)
+        self.output = os.path.abspath(output)
+        self.config = config
+        self.docking_in = os.path.join(BASE_DIR, 'templates', 'FAD.in.template')
+        if docking_in:
+            self.docking_in = docking_in
+        elif rmsd:
+            self.docking_in = os.path.join(BASE_DIR, 'templates', 'FAD_rmsd_reference.in.template')
+        self.rmsd = rmsd
+        self.workers = workers if workers else os.cpu_count()
+        self.ligand_dir = os.path.join(self.output, 'ligands')
+        self.preparation_dir = os.path.join(self.output, 'prepare')
+        self.anchor_dir = os.path.join(self.output, 'anchors')
+        self.docking_dir = os.path.join(self.output, 'docking')
+        self.results = os.path.join(self.output, 'results.tsv')
+        receptor_preparation_dir = os.path.join(self.output, 'receptor')
+        if receptor:
+            receptor_preparation_dir = os.path.abspath(receptor)
+        self.__receptor_preparation = ReceptorPreparation(
+            self.protein,
+            self.native_ligand,
+            receptor_preparation_dir,
+            self.config
+        )
+
+    def run(self, recalc=False):
+        """Run batch anchored docking
+
+        :param recalc: recalculate all intermediate results
+        """
+        if not os.path.exists(self.output):
+            os.mkdir(self.output)
+
+        logging.info('receptor preparation')
+        self.__receptor_preparation.run(recalc)
+
+        ligands = split_ligands(self.ligands, self.ligand_dir)
+        if not ligands:
+            raise RuntimeError('Did not find ligands in: {}'.format(self.ligands))
+        names = [ligand_name(ligand) for ligand in ligands]
+        logging.info('preparing %d ligands on %d workers', len(ligands), self.workers)
+        converted_ligands = prepare_ligands(
+            ligands, self.preparation_dir, self.config, workers=self.workers, recalc=recalc)
+        converted = [
+            (name, converted_ligand) for name, converted_ligand in zip(names, converted_ligands)
+            if is_converted(converted_ligand)
+        ]
+        if not converted:
+            raise RuntimeError('Preparation failed for all ligands')
+
+        if not os.path.exists(self.anchor_dir):
+            os.mkdir(self.anchor_dir)
+        batch_anchor_generator = BatchAnchorGenerator(
+            [converted_ligand for _name, converted_ligand in converted],
+            self.template,
+            [os.path.join(self.anchor_dir, name + '.in') for name, _converted_ligand in converted],
+            docking_in=self.docking_in,
+            anchors=os.path.join(self.anchor_dir, 'anchors.tsv')
+        )
+        Scheduler().add(batch_anchor_generator, 'anchoring ligands').run(recalc)
+
+        failed = set(batch_anchor_generator.failed)
+        jobs = [
+            (name, converted_ligand, anchored_docking_in, converted_ligand if self.rmsd else None)
+            for (name, converted_ligand), anchored_docking_in
+            in zip(converted, batch_anchor_generator.output_files)
+            if converted_ligand not in failed
+        ]
+        logging.info('docking %d ligands on %d workers', len(jobs), self.workers)
+        results = dock_ligands(
+            jobs,
+            self.__receptor_preparation.selected_spheres,
+            self.__receptor_preparation.grid_prefix,
+            self.docking_dir,
+            self.config,
+            workers=self.workers,
+            recalc=recalc
+        )
+        write_results(self.results, names, results, columns=3 if self.rmsd else 2)
+        return self
+
+
+def main(args):
+    """Module main to demonstrate functionality"""
+    logging.basicConfig(level=logging.INFO)
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
+    batch_anchored_docking = BatchAnchoredDocking(
+        args.protein,
+        args.native_ligand,
+        args.ligands,
+        args.template,
+        args.output,
+        config,
+        docking_in=args.docking_in,
+        rmsd=args.rmsd,
+        receptor=args.receptor,
+        workers=args.workers
+    )
+    with ResourceReport() as report:
+        batch_anchored_docking.run(args.recalc)
+    report.write(os.path.join(batch_anchored_docking.output, 'resources.json'))
+    print(batch_anchored_docking.results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('protein', type=str, help='path to the protein')
+    parser.add_argument('native_ligand', type=str, help='path to the native ligand')
+    parser.add_argument(
+        'ligands',
+        type=str,
+        help='directory of ligands or multi-molecule SDF/MOL2 file to dock'
+    )
+    parser.add_argument('template', type=str, help='path to anchor template')
+    parser.add_argument('output', type=str, help='output directory to write prepared')
+    parser.add_argument(
+        '--recalc',
+        action='store_true',
+        help='recalculate all intermediate results'
+    )
+    parser.add_argument(
+        '--config',
+        type=str,
+        help='path to a config file',
+        default=os.path.join(BASE_DIR, 'config.ini')
+    )
+    parser.add_argument('--docking_in', type=str, help='custom docking input file for DOCK')
+    parser.add_argument(
+        '--rmsd',
+        action='store_true',
+        help='calculate the RMSD of every docked ligand to its input pose'
+    )
+    parser.add_argument(
+        '--receptor',
+        type=str,
+        help='path to the receptor, if it doesn\'t exist, it will be generated at this path'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='number of worker processes, defaults to the number of CPUs'
+    )
+    main(parser.parse_args())
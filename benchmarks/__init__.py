@@ -0,0 +1 @@
+"""Benchmarks of the workflow orchestration and the Python parsers"""
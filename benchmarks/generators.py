@@ -0,0 +1,132 @@
+"""Generators of synthetic inputs of arbitrary size for the Python parsers
+
+All generators are deterministic for a seed and stream their output, so
+inputs far larger than memory can be written.
+"""
+import random
+
+HEADER = '##########{:>36}:{:>20}\n'
+ATOM = '{:7d} {:<8}{:10.4f}{:10.4f}{:10.4f} {:<8}{:>3}  {:<8}{:10.4f}\n'
+BOND = '{:6d}{:6d}{:6d} {}\n'
+# lattice spacing of generated atoms in Å, far above any anchor tolerance
+LATTICE_SPACING = 1.5
+UNITS = ('nM', 'uM', 'pM')
+
+
+def lattice_coordinates(atoms, rng):
+    """Coordinates of atoms on a jittered cubic lattice, unique within 1 Å"""
+    edge = max(1, round(atoms ** (1 / 3)) + 1)
+    coordinates = []
+    for index in range(atoms):
+        x, y, z = index % edge, index // edge % edge, index // (edge * edge)
+        coordinates.append(tuple(
+            LATTICE_SPACING * lattice + rng.uniform(-0.2, 0.2) for lattice in (x, y, z)))
+    return coordinates
+
+
+def write_molecule(mol2_file, name, coordinates, atom_types=None, headers=()):
+    """Write a MOL2 molecule with a chain of single bonds
+
+    :param mol2_file: open MOL2 file
+    :param name: molecule name
+    :param coordinates: x, y, z of every atom
+    :param atom_types: SYBYL type of every atom, C.3 if None
+    :param headers: DOCK header fields and values written before the molecule
+    """
+    for field, value in headers:
+        mol2_file.write(HEADER.format(field, value))
+    if headers:
+        mol2_file.write('\n')
+    bonds = max(0, len(coordinates) - 1)
+    mol2_file.write('@<TRIPOS>MOLECULE\n{}\n{:5d}{:6d} 1 0 0\nSMALL\nUSER_CHARGES\n\n'.format(
+        name, len(coordinates), bonds))
+    mol2_file.write('@<TRIPOS>ATOM\n')
+    for index, (x, y, z) in enumerate(coordinates):
+        atom_type = atom_types[index] if atom_types else 'C.3'
+        mol2_file.write(ATOM.format(
+            index + 1, atom_type.split('.')[0] + str(index + 1), x, y, z, atom_type, 1, 'LIG',
+            0.0))
+    mol2_file.write('@<TRIPOS>BOND\n')
+    for index in range(bonds):
+        mol2_file.write(BOND.format(index + 1, index + 1, index + 2, 1))
+    mol2_file.write('\n')
+
+
+def write_docked_poses(path, poses, atoms=30, seed=0):
+    """Write a DOCK scored MOL2 file of poses sorted by grid score
+
+    :param path: MOL2 file to write
+    :param poses: number of poses
+    :param atoms: number of atoms per pose
+    :param seed: random seed
+    """
+    rng = random.Random(seed)
+    coordinates = lattice_coordinates(atoms, rng)
+    grid_score = -60.0
+    with open(path, 'w') as docked_file:
+        for pose in range(poses):
+            grid_score += rng.uniform(0.0, 40.0 / poses)
+            vdw = grid_score * rng.uniform(0.7, 1.0)
+            rmsd = rng.uniform(0.2, 8.0)
+            write_molecule(
+                docked_file,
+                'ligand_{}'.format(pose),
+                coordinates,
+                headers=(
+                    ('Name', 'ligand_{}'.format(pose)),
+                    ('HA_RMSDs', '{:.4f}'.format(rmsd)),
+                    ('HA_RMSDh', '{:.4f}'.format(rmsd * rng.uniform(0.9, 1.1))),
+                    ('HA_RMSDm', '{:.4f}'.format(rmsd * rng.uniform(0.6, 1.0))),
+                    ('Grid_Score', '{:.6f}'.format(grid_score)),
+                    ('Grid_vdw_energy', '{:.6f}'.format(vdw)),
+                    ('Grid_es_energy', '{:.6f}'.format(grid_score - vdw)),
+                    ('Internal_energy_repulsive', '{:.6f}'.format(rng.uniform(0.0, 10.0)))
+                )
+            )
+
+
+def write_template(template_path, ligand_path, atoms, seed=0):
+    """Write an anchor template and a ligand built on it
+
+    The template is the ligand with a linker Du atom bonded to its last
+    atom, so the last ligand atom is the anchor.
+
+    :param template_path: template MOL2 file to write
+    :param ligand_path: ligand MOL2 file to write
+    :param atoms: number of ligand atoms
+    :param seed: random seed
+    :return: atom id of the anchor atom in the ligand
+    """
+    rng = random.Random(seed)
+    coordinates = lattice_coordinates(atoms + 1, rng)
+    with open(ligand_path, 'w') as ligand_file:
+        write_molecule(ligand_file, 'ligand', coordinates[:atoms])
+    with open(template_path, 'w') as template_file:
+        write_molecule(template_file, 'template', coordinates, ['C.3'] * atoms + ['Du'])
+    return atoms
+
+
+def write_ranking(scores_path, affinities_path, compounds, seed=0, stereoisomers=0.1,
+                  measurements=2, unscored=0.05):
+    """Write a scores TSV and an affinities CSV for a ranking analysis
+
+    :param scores_path: scores TSV to write
+    :param affinities_path: affinities CSV to write
+    :param compounds: number of compounds
+    :param seed: random seed
+    :param stereoisomers: fraction of compounds scored a second time as a stereoisomer
+    :param measurements: maximum number of affinity measurements per compound
+    :param unscored: fraction of compounds without a score
+    """
+    rng = random.Random(seed)
+    with open(affinities_path, 'w') as affinities_file:
+        for compound in range(compounds):
+            for _measurement in range(rng.randint(1, measurements)):
+                affinities_file.write('compound{},,{:.3f},{}\n'.format(
+                    compound, 10 ** rng.uniform(-1, 4), rng.choice(UNITS)))
+    with open(scores_path, 'w') as scores_file:
+        for compound in range(compounds):
+            copies = 2 if rng.random() < stereoisomers else 1
+            for copy in range(copies):
+                score = '' if rng.random() < unscored else '{:.4f}'.format(rng.uniform(-60, -5))
+                scores_file.write('compound{}_{}\t{}\n'.format(compound, copy + 1, score))
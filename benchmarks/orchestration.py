@@ -0,0 +1,145 @@
+"""Benchmark of the workflow orchestration with stand-in binaries
+
+Every job runs a complete workflow in its own output directory against the
+stand-in binaries of tests/stub_binary.py. Jobs run in a pool of worker
+processes. The time spent outside of the binaries is the overhead of the
+workflow itself, for example template rendering, file checks and process
+spawning.
+
+    python -m benchmarks.orchestration --jobs 20 --workers 1 2 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import configparser
+import json
+import os
+import tempfile
+import time
+
+from anchored_docking import AnchoredDocking
+from cross_docking import CrossDocking
+from pipeline_elements import BASE_DIR, ResourceReport
+from self_docking import SelfDocking
+from tests.stubs import write_stub_config, write_stubs
+
+TEST_FILES = os.path.join(BASE_DIR, 'tests', 'test_files')
+WORKFLOWS = ('self_docking', 'cross_docking', 'anchored_docking')
+COLUMNS = (
+    'workflow', 'workers', 'jobs', 'wall_time', 'jobs_per_second', 'binary_time_per_job',
+    'overhead_per_job'
+)
+
+
+def run_job(workflow, output, config_path):
+    """Run one workflow and return its wall time and the wall time of its binaries
+
+    :param workflow: one of WORKFLOWS
+    :param output: output directory of the workflow
+    :param config_path: config file
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    protein = os.path.join(TEST_FILES, '1cps.pdb')
+    native_ligand = os.path.join(TEST_FILES, '1cps_ligand.sdf')
+    docking_ligand = os.path.join(TEST_FILES, '1cbx_ligand.sdf')
+    if workflow == 'self_docking':
+        job = SelfDocking(protein, native_ligand, output, config, rmsd_reference=native_ligand)
+    elif workflow == 'cross_docking':
+        job = CrossDocking(protein, native_ligand, docking_ligand, output, config)
+    elif workflow == 'anchored_docking':
+        job = AnchoredDocking(
+            protein, native_ligand, docking_ligand, os.path.join(TEST_FILES, '1cbx_core.mol2'),
+            output, config
+        )
+    else:
+        raise RuntimeError('Unknown workflow: {}'.format(workflow))
+    start = time.monotonic()
+    with ResourceReport() as report:
+        job.run()
+    wall_time = time.monotonic() - start
+    return wall_time, sum(process['wall_time'] for process in report.processes)
+
+
+def benchmark(workflow, jobs, workers, output, config_path):
+    """Run jobs of a workflow on workers and measure throughput and overhead
+
+    :param workflow: one of WORKFLOWS
+    :param jobs: number of jobs
+    :param workers: number of worker processes
+    :param output: directory for the job output directories
+    :param config_path: config file
+    :return: result with the keys of COLUMNS
+    """
+    outputs = [os.path.join(output, '{}_{}'.format(workflow, job)) for job in range(jobs)]
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        times = list(executor.map(
+            run_job, [workflow] * jobs, outputs, [config_path] * jobs))
+    wall_time = time.monotonic() - start
+    binary_time = sum(binary_time for _job_time, binary_time in times)
+    job_time = sum(job_time for job_time, _binary_time in times)
+    return {
+        'workflow': workflow,
+        'workers': workers,
+        'jobs': jobs,
+        'wall_time': wall_time,
+        'jobs_per_second': jobs / wall_time,
+        'binary_time_per_job': binary_time / jobs,
+        'overhead_per_job': (job_time - binary_time) / jobs
+    }
+
+
+def main(args):
+    """Module main to run the orchestration benchmark"""
+    output = args.output or tempfile.mkdtemp(prefix='orchestration_benchmark_')
+    os.makedirs(output, exist_ok=True)
+    stubs = write_stubs(os.path.join(output, 'bin'), args.sleep, args.records)
+    config_path = write_stub_config(os.path.join(output, 'config.ini'), stubs)
+    results = []
+    print('\t'.join(COLUMNS))
+    for workflow in args.workflows:
+        for workers in args.workers:
+            run_output = os.path.join(output, '{}_workers_{}'.format(workflow, workers))
+            os.makedirs(run_output, exist_ok=True)
+            result = benchmark(workflow, args.jobs, workers, run_output, config_path)
+            results.append(result)
+            print('{workflow}\t{workers}\t{jobs}\t{wall_time:.3f}\t{jobs_per_second:.2f}\t'
+                  '{binary_time_per_job:.4f}\t{overhead_per_job:.4f}'.format(**result))
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({
+                'sleep': args.sleep,
+                'records': args.records,
+                'results': results
+            }, json_file, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=10, help='number of jobs per run')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        nargs='+',
+        default=[1],
+        help='numbers of worker processes to measure'
+    )
+    parser.add_argument(
+        '--workflows',
+        type=str,
+        nargs='+',
+        choices=WORKFLOWS,
+        default=list(WORKFLOWS),
+        help='workflows to measure'
+    )
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds every binary sleeps')
+    parser.add_argument(
+        '--records',
+        type=int,
+        default=10,
+        help='poses per ligand, spheres and grid points per edge the binaries write'
+    )
+    parser.add_argument('--output', type=str, help='output directory, temporary if not given')
+    parser.add_argument('--json', type=str, help='file to write the results to as JSON')
+    main(parser.parse_args())
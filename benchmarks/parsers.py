@@ -0,0 +1,192 @@
+"""Micro-benchmark of the Python parsers across input sizes
+
+Every parser runs on synthetic inputs of growing size from generators.py.
+The wall time and the peak traced memory are measured per size and the
+scaling exponent of the time with the input size is fitted on a log-log
+scale. An exponent above the limit, for example about 2 for a path that
+turned quadratic, fails the benchmark.
+
+    python -m benchmarks.parsers --sizes 1000 10000 100000 --limit 1.5
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generators import write_docked_poses, write_ranking, write_template
+from pipeline_elements.anchor import AnchorGenerator
+from pipeline_elements.rmsd_analysis import RmsdAnalysis
+from ranking_analysis import RankingAnalysis
+
+COLUMNS = ('parser', 'size', 'input_bytes', 'time', 'peak_memory')
+DEFAULT_LIMIT = 1.5
+
+
+def rmsd_analysis(directory, size):
+    """RMSD analysis of all poses of a file of size poses"""
+    docked = os.path.join(directory, 'docked_{}.mol2'.format(size))
+    write_docked_poses(docked, size)
+    return [docked], lambda: RmsdAnalysis(docked, all_poses=True).run()
+
+
+def anchor_generator(directory, size):
+    """Anchor generation on a template and ligand of size atoms"""
+    template = os.path.join(directory, 'template_{}.mol2'.format(size))
+    ligand = os.path.join(directory, 'ligand_{}.mol2'.format(size))
+    output = os.path.join(directory, 'anchored_{}.in'.format(size))
+    write_template(template, ligand, size)
+    return [template, ligand], lambda: AnchorGenerator(ligand, template, output).run()
+
+
+def ranking_analysis(directory, size):
+    """Ranking analysis of size compounds"""
+    scores = os.path.join(directory, 'scores_{}.tsv'.format(size))
+    affinities = os.path.join(directory, 'affinities_{}.csv'.format(size))
+    write_ranking(scores, affinities, size)
+
+    def perform():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            RankingAnalysis(scores, affinities).perform()
+    return [scores, affinities], perform
+
+
+PARSERS = {
+    'rmsd_analysis': rmsd_analysis,
+    'anchor_generator': anchor_generator,
+    'ranking_analysis': ranking_analysis
+}
+
+
+def measure(function, repeats=3):
+    """Best wall time of repeats and peak traced memory of one run of a function
+
+    :param function: function without arguments
+    :param repeats: number of timed runs
+    :return: time in seconds and peak memory in bytes
+    """
+    times = []
+    for _repeat in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def scaling_exponent(sizes, values):
+    """Slope of a least squares fit of log(values) over log(sizes)
+
+    :param sizes: input sizes
+    :param values: measurements per size
+    :return: exponent, 1 for linear and 2 for quadratic scaling
+    """
+    if len(sizes) < 2:
+        raise RuntimeError('Fitting a scaling exponent requires at least two sizes')
+    slope, _intercept = statistics.linear_regression(
+        [math.log(size) for size in sizes],
+        [math.log(max(value, 1e-9)) for value in values]
+    )
+    return slope
+
+
+def benchmark(parser, sizes, directory, repeats=3):
+    """Measure a parser across input sizes
+
+    :param parser: one of PARSERS
+    :param sizes: input sizes in increasing order
+    :param directory: directory to write the synthetic inputs to
+    :param repeats: number of timed runs per size
+    :return: result per size with the keys of COLUMNS
+    """
+    results = []
+    for size in sizes:
+        inputs, function = PARSERS[parser](directory, size)
+        run_time, peak_memory = measure(function, repeats)
+        results.append({
+            'parser': parser,
+            'size': size,
+            'input_bytes': sum(os.path.getsize(path) for path in inputs),
+            'time': run_time,
+            'peak_memory': peak_memory
+        })
+    return results
+
+
+def main(args):
+    """Module main to run the parser benchmark
+
+    :return: exponents by parser, exits with 1 if any time exponent exceeds the limit
+    """
+    directory = args.output or tempfile.mkdtemp(prefix='parser_benchmark_')
+    os.makedirs(directory, exist_ok=True)
+    sizes = sorted(args.sizes)
+    results = []
+    exponents = {}
+    print('\t'.join(COLUMNS))
+    for parser in args.parsers:
+        parser_results = benchmark(parser, sizes, directory, args.repeats)
+        for result in parser_results:
+            print('{parser}\t{size}\t{input_bytes}\t{time:.6f}\t{peak_memory}'.format(**result))
+        results.extend(parser_results)
+        exponents[parser] = {
+            'time': scaling_exponent(sizes, [result['time'] for result in parser_results]),
+            'peak_memory': scaling_exponent(
+                sizes, [result['peak_memory'] for result in parser_results])
+        }
+    failed = []
+    for parser, exponent in exponents.items():
+        print('exponent: {}, time {:.2f}, peak memory {:.2f}'.format(
+            parser, exponent['time'], exponent['peak_memory']))
+        if exponent['time'] > args.limit:
+            failed.append(parser)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({
+                'limit': args.limit,
+                'results': results,
+                'exponents': exponents
+            }, json_file, indent=2)
+    if failed:
+        print('superlinear scaling above {}: {}'.format(args.limit, ', '.join(failed)))
+        sys.exit(1)
+    return exponents
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1000, 4000, 16000],
+        help='poses, template atoms and compounds to measure'
+    )
+    parser.add_argument(
+        '--parsers',
+        type=str,
+        nargs='+',
+        choices=list(PARSERS),
+        default=list(PARSERS),
+        help='parsers to measure'
+    )
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per size')
+    parser.add_argument(
+        '--limit',
+        type=float,
+        default=DEFAULT_LIMIT,
+        help='maximum scaling exponent of the time with the input size'
+    )
+    parser.add_argument('--output', type=str, help='input directory, temporary if not given')
+    parser.add_argument('--json', type=str, help='file to write the results to as JSON')
+    main(parser.parse_args())
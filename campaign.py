@@ -0,0 +1,174 @@
+"""Resumable campaign of docking workflow jobs"""
+import argparse
+import configparser
+import csv
+import logging
+import os
+
+from anchored_docking import AnchoredDocking
+from cross_docking import CrossDocking
+from pipeline_elements import BASE_DIR, CampaignManifest, ResourceReport, set_process_limit
+from pipeline_elements.manifest import job_status
+from self_docking import SelfDocking
+
+MANIFEST = 'campaign.sqlite'
+# workflow arguments of a job, the first two are required by every workflow
+ARGUMENTS = ('protein', 'native_ligand', 'docking_ligand', 'template', 'rmsd_reference')
+WORKFLOWS = ('self_docking', 'cross_docking', 'anchored_docking')
+
+
+def read_jobs(jobs_tsv):
+    """Jobs of a TSV file with a header of name, workflow and workflow arguments
+
+    Relative paths are relative to the directory of the TSV file.
+
+    :param jobs_tsv: TSV file of jobs
+    :return: list of name, workflow and argument dictionary
+    """
+    base = os.path.dirname(os.path.abspath(jobs_tsv))
+    jobs = []
+    with open(jobs_tsv, newline='') as jobs_file:
+        for row in csv.DictReader(jobs_file, delimiter='\t'):
+            if row['workflow'] not in WORKFLOWS:
+                raise RuntimeError('Unknown workflow of {}: {}'.format(
+                    row['name'], row['workflow']))
+            arguments = {
+                argument: os.path.join(base, row[argument])
+                for argument in ARGUMENTS if row.get(argument)
+            }
+            jobs.append((row['name'], row['workflow'], arguments))
+    return jobs
+
+
+def build_workflow(workflow, arguments, output, config):
+    """Workflow of a job
+
+    Besides the files of ARGUMENTS the arguments may hold docking_in for
+    every workflow, shards, funnel_top_k and funnel_threshold for
+    cross-docking and receptor for anchored docking.
+
+    :param workflow: one of WORKFLOWS
+    :param arguments: workflow arguments by name
+    :param output: output directory of the job
+    :param config: config object
+    """
+    protein = arguments['protein']
+    native_ligand = arguments['native_ligand']
+    docking_in = arguments.get('docking_in')
+    rmsd_reference = arguments.get('rmsd_reference')
+    if workflow == 'self_docking':
+        return SelfDocking(
+            protein, native_ligand, output, config, docking_in=docking_in,
+            rmsd_reference=rmsd_reference
+        )
+    if workflow == 'cross_docking':
+        return CrossDocking(
+            protein, native_ligand, arguments['docking_ligand'], output, config,
+            docking_in=docking_in,
+            rmsd_reference=rmsd_reference,
+            shards=arguments.get('shards', 1),
+            funnel_top_k=arguments.get('funnel_top_k'),
+            funnel_threshold=arguments.get('funnel_threshold')
+        )
+    if workflow == 'anchored_docking':
+        return AnchoredDocking(
+            protein, native_ligand, arguments['docking_ligand'], arguments['template'], output,
+            config, docking_in=docking_in, rmsd_reference=rmsd_reference,
+            receptor=arguments.get('receptor')
+        )
+    raise RuntimeError('Unknown workflow: {}'.format(workflow))
+
+
+class Campaign:
+    """Resumable campaign of docking workflow jobs
+
+    The state of every job and of every pipeline element within a job is
+    kept in a campaign manifest in the output directory. Jobs run one after
+    another, each in its own output directory. A restart after a crash
+    resumes the unfinished jobs, within a job the result cache skips the
+    pipeline elements that finished before the crash.
+    """
+
+    def __init__(self, jobs_tsv, output, config, max_attempts=1):
+        """Resumable campaign of docking workflow jobs
+
+        :param jobs_tsv: TSV file of jobs with a header of name, workflow and workflow arguments
+        :param output: output directory with one directory per job
+        :param config: config object
+        :param max_attempts: maximum attempts of a failing job over all restarts
+        """
+        self.jobs_tsv = os.path.abspath(jobs_tsv)
+        self.output = os.path.abspath(output)
+        self.config = config
+        self.max_attempts = max_attempts
+        self.manifest_path = os.path.join(self.output, MANIFEST)
+
+    def run(self, recalc=False):
+        """Run the unfinished jobs of the campaign
+
+        :param recalc: recalculate all intermediate results
+        """
+        if not os.path.exists(self.output):
+            os.mkdir(self.output)
+        manifest = CampaignManifest(self.manifest_path)
+        for name, workflow, arguments in read_jobs(self.jobs_tsv):
+            manifest.add_job(name, workflow, arguments, os.path.join(self.output, name))
+        recovered = manifest.recover()
+        if recovered:
+            logging.info('recovered %d interrupted jobs', recovered)
+
+        names = manifest.unfinished(self.max_attempts)
+        logging.info('running %d unfinished jobs', len(names))
+        for name in names:
+            job = manifest.job(name)
+            try:
+                with job_status(manifest, name), ResourceReport() as report:
+                    build_workflow(
+                        job['workflow'], job['arguments'], job['output'], self.config
+                    ).run(recalc)
+                report.write(os.path.join(job['output'], 'resources.json'))
+                logging.info('done: %s', name)
+            except Exception as error:
+                logging.error('job %s failed: %s', name, error)
+        counts = manifest.counts()
+        logging.info(', '.join('{} {}'.format(count, status) for status, count in counts.items()))
+        return self
+
+
+def main(args):
+    """Module main to run or resume a campaign"""
+    logging.basicConfig(level=logging.INFO)
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
+    campaign = Campaign(args.jobs, args.output, config, max_attempts=args.max_attempts)
+    campaign.run(args.recalc)
+    print(campaign.manifest_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'jobs',
+        type=str,
+        help='TSV of jobs with a header of name, workflow and ' + ', '.join(ARGUMENTS)
+    )
+    parser.add_argument('output', type=str, help='output directory of the campaign')
+    parser.add_argument(
+        '--recalc',
+        action='store_true',
+        help='recalculate all intermediate results'
+    )
+    parser.add_argument(
+        '--config',
+        type=str,
+        help='path to a config file',
+        default=os.path.join(BASE_DIR, 'config.ini')
+    )
+    parser.add_argument(
+        '--max_attempts',
+        type=int,
+        default=1,
+        help='maximum attempts of a failing job over all restarts'
+    )
+    main(parser.parse_args())
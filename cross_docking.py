@@ -4,7 +4,10 @@ import configparser
 import logging
 import os
 
-from pipeline_elements import BASE_DIR, Preparation, ReceptorPreparation, DockingRun, RmsdAnalysis
+from pipeline_elements import BASE_DIR, Preparation, ReceptorPreparation, DockingRun, \
+    DockingFunnel, ResourceReport, RmsdAnalysis, Scheduler, set_process_limit
+from pipeline_elements.results import add_ingestion
+from pipeline_elements.work_queue import submit_workflow
 
 
 class CrossDocking:
@@ -18,7 +21,10 @@ class CrossDocking:
             output,
             config,
             docking_in=None,
-            rmsd_reference=None
+            rmsd_reference=None,
+            shards=1,
+            funnel_top_k=None,
+            funnel_threshold=None
     ):
         """Cross-docking using the DOCK workflow
 
@@ -29,6 +35,10 @@ class CrossDocking:
         :param config: config object
         :param docking_in: DOCK input template file
         :param rmsd_reference: reference molecule for RMSD calculation
+        :param shards: number of shards to split a docking ligand library into
+        :param funnel_top_k: prescreen a ligand library and fully dock only the top k
+        :param funnel_threshold: prescreen a ligand library and fully dock only the
+            ligands scoring at or below the threshold
         """
         self.protein = os.path.abspath(protein)
         self.native_ligand = os.path.abspath(native_ligand)
@@ -37,6 +47,9 @@ class CrossDocking:
         self.config = config
         self.docking_in = docking_in
         self.rmsd_reference = os.path.abspath(rmsd_reference) if rmsd_reference else None
+        self.shards = shards
+        self.funnel_top_k = funnel_top_k
+        self.funnel_threshold = funnel_threshold
         self.__receptor_preparation = None
         self.__ligand_preparation = None
         self.__docking_run = None
@@ -58,15 +71,31 @@ class CrossDocking:
             self.config,
         )
         docking_dir = os.path.join(self.output, 'dock')
-        self.__docking_run = DockingRun(
-            self.__ligand_preparation.converted_ligand,
-            self.__receptor_preparation.selected_spheres,
-            self.__receptor_preparation.grid_prefix,
-            docking_dir,
-            self.config,
-            docking_in=self.docking_in,
-            rmsd_reference=self.rmsd_reference
-        )
+        if self.funnel_top_k is not None or self.funnel_threshold is not None:
+            if self.rmsd_reference:
+                raise RuntimeError('RMSD calculation is not supported by the docking funnel')
+            self.__docking_run = DockingFunnel(
+                self.__ligand_preparation.converted_ligand,
+                self.__receptor_preparation.selected_spheres,
+                self.__receptor_preparation.grid_prefix,
+                docking_dir,
+                self.config,
+                top_k=self.funnel_top_k,
+                score_threshold=self.funnel_threshold,
+                docking_in=self.docking_in,
+                shards=self.shards
+            )
+        else:
+            self.__docking_run = DockingRun(
+                self.__ligand_preparation.converted_ligand,
+                self.__receptor_preparation.selected_spheres,
+                self.__receptor_preparation.grid_prefix,
+                docking_dir,
+                self.config,
+                docking_in=self.docking_in,
+                rmsd_reference=self.rmsd_reference,
+                shards=self.shards
+            )
         self.__rmsd_analysis = RmsdAnalysis(self.__docking_run.docked)
 
     @property
@@ -82,16 +111,12 @@ class CrossDocking:
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        logging.info('receptor preparation')
-        self.__receptor_preparation.run(recalc)
-
-        logging.info('ligand preparation')
-        if recalc or not self.__ligand_preparation.output_exists():
-            self.__ligand_preparation.run()
-
-        # docking run is always rerun
-        logging.info('docking')
-        self.__docking_run.run()
+        scheduler = Scheduler(self.config.getint('Execution', 'workers', fallback=1))
+        scheduler.add(self.__receptor_preparation, 'receptor preparation')
+        scheduler.add(self.__ligand_preparation, 'ligand preparation')
+        scheduler.add(self.__docking_run, 'docking')
+        add_ingestion(scheduler, self.config, self.docked, self.output, self.protein)
+        scheduler.run(recalc)
 
         if self.rmsd_reference:
             self.__rmsd_analysis.run()
@@ -108,6 +133,19 @@ def main(args):
     logging.basicConfig(level=logging.DEBUG)
     config = configparser.ConfigParser()
     config.read(args.config)
+    if args.queue:
+        submit_workflow(args.queue, config, 'cross_docking', {
+            'protein': args.protein,
+            'native_ligand': args.native_ligand,
+            'docking_ligand': args.docking_ligand,
+            'docking_in': args.docking_in,
+            'rmsd_reference': args.rmsd_reference,
+            'shards': args.shards,
+            'funnel_top_k': args.funnel_top_k,
+            'funnel_threshold': args.funnel_threshold
+        }, args.output, recalc=args.recalc)
+        return
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
     cross_docking = CrossDocking(
         args.protein,
         args.native_ligand,
@@ -115,9 +153,14 @@ def main(args):
         args.output,
         config,
         docking_in=args.docking_in,
-        rmsd_reference=args.rmsd_reference
+        rmsd_reference=args.rmsd_reference,
+        shards=args.shards,
+        funnel_top_k=args.funnel_top_k,
+        funnel_threshold=args.funnel_threshold
     )
-    cross_docking.run(args.recalc)
+    with ResourceReport() as report:
+        cross_docking.run(args.recalc)
+    report.write(os.path.join(cross_docking.output, 'resources.json'))
     print(cross_docking.docked)
 
 
@@ -144,4 +187,25 @@ if __name__ == '__main__':
         type=str,
         help='reference molecule for RMSD calculation'
     )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help='number of concurrent DOCK processes for a docking ligand library'
+    )
+    parser.add_argument(
+        '--funnel_top_k',
+        type=int,
+        help='prescreen a docking ligand library and fully dock only the top k ligands'
+    )
+    parser.add_argument(
+        '--funnel_threshold',
+        type=float,
+        help='prescreen a docking ligand library and fully dock only ligands scoring at or below'
+    )
+    parser.add_argument(
+        '--queue',
+        type=str,
+        help='submit the job to a work queue directory drained by queue_worker.py instead'
+    )
     main(parser.parse_args())
@@ -4,11 +4,13 @@ import configparser
 import logging
 import os
 
-from pipeline_elements import BASE_DIR, PipelineElement
+from pipeline_elements import BASE_DIR, PipelineElement, set_process_limit
 
 
 class FragmentGeneration(PipelineElement):
     """DOCK de novo fragment generation"""
+    BINARIES = ('dock',)
+    PARAMETERS = ('vdw', 'flex', 'flex_drive')
 
     def __init__(self, molecules, output, config):
         """DOCK de novo fragment generation
@@ -30,6 +32,8 @@ class FragmentGeneration(PipelineElement):
         # fragments with no rotatable bonds and no linkers
         self.fragment_rigid = self.fragment_prefix + '_rigid.mol2'
         self.config = config
+        self.fragmentation_template = os.path.join(
+            BASE_DIR, 'templates', 'fragment_generation.in.template')
 
     def run(self, _recalc=False):
         """Run DOCK de novo fragment generation"""
@@ -45,10 +49,17 @@ class FragmentGeneration(PipelineElement):
             [self.fragment_sidechains, self.fragment_linkers, self.fragment_scaffolds,
              self.fragment_rigid, self.fragment_torenv])
 
+    @property
+    def inputs(self):
+        return [self.molecules, self.fragmentation_template]
+
+    @property
+    def outputs(self):
+        return [self.fragment_sidechains, self.fragment_linkers, self.fragment_scaffolds,
+                self.fragment_rigid, self.fragment_torenv]
+
     def __generate_fragments(self):
-        fragmentation_template_path = os.path.join(
-            BASE_DIR, 'templates', 'fragment_generation.in.template')
-        with open(fragmentation_template_path) as fragmentation_template:
+        with open(self.fragmentation_template) as fragmentation_template:
             fragmentation_in = fragmentation_template.read()
 
         fragmentation_in = fragmentation_in.format(
@@ -66,7 +77,8 @@ class FragmentGeneration(PipelineElement):
             self.config['Binaries']['dock'],
             '-i', os.path.relpath(fragmentation_in_path, self.output)
         ]
-        PipelineElement._commandline(args, cwd=self.output)
+        PipelineElement._commandline(
+            args, cwd=self.output, log=os.path.join(self.output, 'dock.log'))
         PipelineElement._files_must_exist(
             [self.fragment_sidechains, self.fragment_linkers, self.fragment_scaffolds,
              self.fragment_rigid, self.fragment_torenv])
@@ -77,6 +89,7 @@ def main(args):
     logging.basicConfig(level=logging.DEBUG)
     config = configparser.ConfigParser()
     config.read(args.config)
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
     fragment_generation = FragmentGeneration(args.molecules, args.output, config)
     fragment_generation.run()
 
@@ -0,0 +1,40 @@
+"""List and prune a receptor or grid store"""
+import argparse
+import datetime
+import logging
+
+from pipeline_elements import DirectoryStore
+
+
+def main(args):
+    """Module main to list and prune a store"""
+    logging.basicConfig(level=logging.INFO)
+    store = DirectoryStore(args.store)
+    if args.max_age is not None or args.budget is not None:
+        store.prune(
+            max_age=args.max_age * 24 * 60 * 60 if args.max_age is not None else None,
+            budget=args.budget * 1024 * 1024 if args.budget is not None else None
+        )
+    for entry in store.entries():
+        print('\t'.join([
+            entry['key'],
+            datetime.datetime.fromtimestamp(entry['last_used']).isoformat(timespec='seconds'),
+            str(entry['size']),
+            entry['description']
+        ]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store', type=str, help='path to the store')
+    parser.add_argument(
+        '--max_age',
+        type=float,
+        help='remove entries not used for this many days'
+    )
+    parser.add_argument(
+        '--budget',
+        type=float,
+        help='evict least recently used entries until the store fits this many MB'
+    )
+    main(parser.parse_args())
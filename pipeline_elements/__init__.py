@@ -1,11 +1,19 @@
 """Import pipeline elements into the top level namespace"""
+from .process import set_process_limit
+from .resources import ResourceReport
 from .pipeline import BASE_DIR, PipelineElement
+from .cache import ResultCache
+from .scheduler import Scheduler
+from .store import DirectoryStore
+from .manifest import CampaignManifest
 from .protoss import ProtossRun
-from .prepare import Preparation
+from .prepare import Preparation, BatchPreparation
 from .spheres import SphereGeneration
 from .grid import GridGeneration
 from .docking_run import DockingRun
+from .funnel import DockingFunnel
 from .prepare_receptor import ReceptorPreparation
 from .rmsd_analysis import RmsdAnalysis
-from .anchor import AnchorGenerator
+from .results import ResultsStore, ResultsIngestion
+from .anchor import AnchorGenerator, BatchAnchorGenerator
 from .anchored_de_novo import AnchoredDeNovo
@@ -1,28 +1,39 @@
 """Anchor generator for a DOCK workflow"""
+import csv
+import hashlib
+import logging
 import os
-import re
 
 from pipeline_elements import PipelineElement, BASE_DIR
+from pipeline_elements.geometry import SpatialHash
+from pipeline_elements.mol2 import read_molecules
+
+# maximum distance in Å between a template atom and its ligand atom
+DEFAULT_TOLERANCE = 0.01
 
 
 class AnchorGenerator(PipelineElement):
     """Anchor generator for a DOCK workflow
 
     The anchor is the only bond bound to a linker atom. The anchor generator
-    finds the anchor atom of a template in a ligand mol2 file based on string
-    equality of the coordinates. This is such a bad idea but it works.
+    finds the ligand atom at the coordinates of the anchor atom of a
+    template within a tolerance, so the ligand has to be built on the
+    template coordinates.
     """
-    def __init__(self, ligand, template, output_file, docking_in=None):
+    def __init__(self, ligand, template, output_file, docking_in=None,
+                 tolerance=DEFAULT_TOLERANCE):
         """Anchor generator for a DOCK workflow
 
         :param ligand: ligand to anchor
         :param template: template containing a linker which denotes the anchore
         :param output_file: docking input file with anchor records for DOCK
         :param docking_in: custom input docking file
+        :param tolerance: maximum distance between template and ligand anchor atom
         """
         self.ligand = ligand
         self.template = template
         self.output_file = output_file
+        self.tolerance = tolerance
         self.anchored_docking_in = os.path.join(BASE_DIR, 'templates', 'FAD.in.template')
         if docking_in:
             self.anchored_docking_in = docking_in
@@ -30,91 +41,211 @@ class AnchorGenerator(PipelineElement):
     def run(self, _recalc=False):
         """Run anchor generation"""
         PipelineElement._files_must_exist([self.ligand, self.template, self.anchored_docking_in])
-        ligand_atom_records, _ligand_bond_records = self.__read_atoms_and_bonds(self.ligand)
-        template_atom_records, template_bond_records = self.__read_atoms_and_bonds(self.template)
-        anchor_atom_record = AnchorGenerator.__get_anchor_atom_record(
-            template_atom_records,
-            template_bond_records
-        )
-        ligand_anchor_atom_record = AnchorGenerator.__get_corresponding_atom_record(
-            anchor_atom_record,
-            ligand_atom_records
-        )
-        anchor = ligand_anchor_atom_record[1] + ',' + ligand_anchor_atom_record[0]
-
-        with open(self.anchored_docking_in) as anchored_docking_template:
-            anchored_docking = anchored_docking_template.read()
-        if '{anchor}' not in anchored_docking:
-            raise RuntimeError('Docking input file does not support anchored docking')
-        # have to use replace because format() demands all keys be present
-        anchored_docking = anchored_docking.replace('{anchor}', anchor)
-        with open(self.output_file, 'w') as output_file:
-            output_file.write(anchored_docking)
+        anchor_coordinate = read_anchor_coordinate(self.template)
+        anchor = find_anchor(read_molecule(self.ligand), anchor_coordinate, self.tolerance)
+        anchored_docking = read_anchored_docking_in(self.anchored_docking_in)
+        write_anchored_docking_in(anchored_docking, anchor, self.output_file)
         return self
 
-    @staticmethod
-    def __parse_record(line):
-        """Strip whitespace an split into columns"""
-        stripped_line = re.sub(r'\s+', ' ', line)
-        return [x for x in stripped_line.split(' ') if x.strip()]
-
-    @staticmethod
-    def __read_atoms_and_bonds(mol_file_path):
-        """Read atom and bond records from a mol2 file"""
-        atom_record = []
-        bond_record = []
-        with open(mol_file_path) as prepared_file:
-            in_atom_block = False
-            in_bond_block = False
-            for line in prepared_file:
-                if in_bond_block:
-                    if '@' in line or not line.strip():
-                        in_bond_block = False
-                    else:
-                        bond_record.append(AnchorGenerator.__parse_record(line))
-
-                if in_atom_block:
-                    if '@<TRIPOS>BOND' in line:
-                        in_atom_block = False
-                        in_bond_block = True
-                    else:
-                        atom_record.append(AnchorGenerator.__parse_record(line))
-
-                if '@<TRIPOS>ATOM' in line:
-                    in_atom_block = True
-        return atom_record, bond_record
-
-    @staticmethod
-    def __get_anchor_atom_record(atom_records, bond_records):
-        """Get the anchor atom record"""
-        dummy_atomnum = None  # first find the linker atom record
-        for atom_record in atom_records:
-            if atom_record[5] == 'Du':
-                if dummy_atomnum:
-                    raise RuntimeError('Found multiple linkers')
-                dummy_atomnum = atom_record[0]
-        anchor_atomnum = None  # find the anchor atom number from the bond record to the linker
-        for bond_record in bond_records:
-            if bond_record[1] == dummy_atomnum:
-                if anchor_atomnum:
-                    raise RuntimeError('Found multiple bonds to linker')
-                anchor_atomnum = bond_record[2]
-            if bond_record[2] == dummy_atomnum:
-                if anchor_atomnum:
-                    raise RuntimeError('Found multiple bonds to linker')
-                anchor_atomnum = bond_record[1]
-        return atom_records[int(anchor_atomnum) - 1]  # atom number is 1 indexed
-
-    @staticmethod
-    def __get_corresponding_atom_record(query_atom_record, atom_records):
-        """Get corresponding atom record with equal coordinates"""
-        found_atom_record = None
-        for atom_record in atom_records:
-            if query_atom_record[2:5] == atom_record[2:5]:  # coordinate comparison
-                if found_atom_record:
-                    raise RuntimeError('Found multiple corresponding atom records')
-                found_atom_record = atom_record
-        return found_atom_record
-
     def output_exists(self):
         return PipelineElement._files_exist([self.output_file])
+
+    @property
+    def inputs(self):
+        return [self.ligand, self.template, self.anchored_docking_in]
+
+    @property
+    def outputs(self):
+        return [self.output_file]
+
+
+class BatchAnchorGenerator(PipelineElement):
+    """Anchor generator for many ligands sharing one template
+
+    The template and the docking input file are read once and the anchored
+    docking input files of all ligands are written in a single pass. Ligands
+    that cannot be anchored are collected in failed instead of failing the
+    whole batch. The outcome of every ligand is recorded in anchors, so a
+    rerun only anchors new or changed ligands.
+    """
+    def __init__(self, ligands, template, output_files, docking_in=None,
+                 tolerance=DEFAULT_TOLERANCE, anchors=None):
+        """Anchor generator for many ligands sharing one template
+
+        :param ligands: ligands to anchor
+        :param template: template containing a linker which denotes the anchor
+        :param output_files: docking input file with anchor records for each ligand
+        :param docking_in: custom input docking file
+        :param tolerance: maximum distance between template and ligand anchor atom
+        :param anchors: TSV of the outcome per ligand, anchors.tsv next to the first
+            output file by default
+        """
+        if len(ligands) != len(output_files):
+            raise RuntimeError('Every ligand requires one output file')
+        self.ligands = list(ligands)
+        self.template = template
+        self.output_files = list(output_files)
+        self.tolerance = tolerance
+        self.anchored_docking_in = os.path.join(BASE_DIR, 'templates', 'FAD.in.template')
+        if docking_in:
+            self.anchored_docking_in = docking_in
+        self.anchors = anchors
+        if not self.anchors and self.output_files:
+            self.anchors = os.path.join(os.path.dirname(self.output_files[0]), 'anchors.tsv')
+
+    def run(self, recalc=False):
+        """Run batch anchor generation
+
+        Ligands anchored or failed to anchor before are skipped unless they,
+        the template or the docking input file changed.
+
+        :param recalc: anchor all ligands
+        """
+        PipelineElement._files_must_exist([self.template, self.anchored_docking_in])
+        anchor_coordinate = read_anchor_coordinate(self.template)
+        anchored_docking = read_anchored_docking_in(self.anchored_docking_in)
+        recorded = {} if recalc else self.__read_anchors()
+        outcomes = []
+        for ligand, output_file in zip(self.ligands, self.output_files):
+            digest = self.__digest(ligand)
+            record = recorded.get(output_file)
+            if digest and record and record[0] == digest and \
+                    (record[1] == 'failed' or os.path.exists(output_file)):
+                outcomes.append((output_file, digest, record[1]))
+                continue
+            # stale anchors must not be docked
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            try:
+                anchor = find_anchor(read_molecule(ligand), anchor_coordinate, self.tolerance)
+            except (OSError, RuntimeError) as error:
+                logging.warning('anchoring %s failed: %s', ligand, error)
+                outcomes.append((output_file, digest, 'failed'))
+                continue
+            write_anchored_docking_in(anchored_docking, anchor, output_file)
+            outcomes.append((output_file, digest, 'anchored'))
+        with open(self.anchors, 'w', newline='') as anchors_file:
+            csv.writer(anchors_file, delimiter='\t').writerows(outcomes)
+        return self
+
+    def __digest(self, ligand):
+        """Digest of a ligand, the template, the docking input file and the tolerance"""
+        digest = hashlib.sha256(repr(self.tolerance).encode('utf8'))
+        for path in (ligand, self.template, self.anchored_docking_in):
+            try:
+                with open(path, 'rb') as input_file:
+                    digest.update(input_file.read())
+            except OSError:
+                return ''  # a missing ligand is retried
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def __read_anchors(self):
+        """Digest and outcome of the last anchoring by output file"""
+        if not os.path.exists(self.anchors):
+            return {}
+        with open(self.anchors, newline='') as anchors_file:
+            return {
+                output_file: (digest, outcome)
+                for output_file, digest, outcome in csv.reader(anchors_file, delimiter='\t')
+            }
+
+    @property
+    def failed(self):
+        """Ligands that failed to anchor in the last run"""
+        recorded = self.__read_anchors()
+        return [
+            ligand for ligand, output_file in zip(self.ligands, self.output_files)
+            if output_file in recorded and recorded[output_file][1] == 'failed'
+        ]
+
+    def output_exists(self):
+        """Every ligand was anchored or failed to anchor in the last run"""
+        recorded = self.__read_anchors()
+        return all(
+            output_file in recorded
+            and (recorded[output_file][1] == 'failed' or os.path.exists(output_file))
+            for output_file in self.output_files
+        )
+
+    @property
+    def inputs(self):
+        return self.ligands + [self.template, self.anchored_docking_in]
+
+    @property
+    def outputs(self):
+        return self.output_files + [self.anchors]
+
+
+def read_molecule(mol_file_path):
+    """Read the first molecule of a mol2 file"""
+    for molecule in read_molecules(mol_file_path):
+        return molecule
+    raise RuntimeError('Did not find a molecule in: {}'.format(mol_file_path))
+
+
+def read_anchor_coordinate(template):
+    """Coordinates of the anchor atom of a template mol2 file"""
+    molecule = read_molecule(template)
+    return molecule.coordinate(get_anchor_atom_index(molecule))
+
+
+def get_anchor_atom_index(molecule):
+    """Get the index of the anchor atom"""
+    dummy_atom_id = None  # first find the linker atom
+    for index, atom_type in enumerate(molecule.atom_types):
+        if atom_type == 'Du':
+            if dummy_atom_id:
+                raise RuntimeError('Found multiple linkers')
+            dummy_atom_id = molecule.atom_ids[index]
+    anchor_atom_id = None  # find the anchor atom id from the bond to the linker
+    for index in range(len(molecule.bond_types)):
+        origin, target = molecule.bond(index)
+        if origin == dummy_atom_id:
+            if anchor_atom_id:
+                raise RuntimeError('Found multiple bonds to linker')
+            anchor_atom_id = target
+        if target == dummy_atom_id:
+            if anchor_atom_id:
+                raise RuntimeError('Found multiple bonds to linker')
+            anchor_atom_id = origin
+    if anchor_atom_id is None:
+        raise RuntimeError('Found no bond to linker')
+    return anchor_atom_id - 1  # atom id is 1 indexed
+
+
+def find_anchor(molecule, anchor_coordinate, tolerance=DEFAULT_TOLERANCE):
+    """DOCK anchor record of the atom of a molecule at the coordinates of an anchor
+
+    :param molecule: molecule to anchor
+    :param anchor_coordinate: coordinates of the template anchor atom
+    :param tolerance: maximum distance between template and ligand anchor atom
+    :return: anchor record as atom name and atom id
+    """
+    atoms = SpatialHash(
+        (molecule.coordinate(index) for index in range(len(molecule))), tolerance)
+    corresponding = atoms.neighbours(anchor_coordinate, tolerance)
+    if len(corresponding) > 1:
+        raise RuntimeError('Found multiple corresponding atom records')
+    if not corresponding:
+        raise RuntimeError('Found no corresponding atom record')
+    return '{},{}'.format(
+        molecule.atom_names[corresponding[0]],
+        molecule.atom_ids[corresponding[0]]
+    )
+
+
+def read_anchored_docking_in(anchored_docking_in):
+    """Read a docking input file with an anchor placeholder"""
+    with open(anchored_docking_in) as anchored_docking_template:
+        anchored_docking = anchored_docking_template.read()
+    if '{anchor}' not in anchored_docking:
+        raise RuntimeError('Docking input file does not support anchored docking')
+    return anchored_docking
+
+
+def write_anchored_docking_in(anchored_docking, anchor, output_file):
+    """Write a docking input file with an anchor record"""
+    # have to use replace because format() demands all keys be present
+    with open(output_file, 'w') as anchored_docking_file:
+        anchored_docking_file.write(anchored_docking.replace('{anchor}', anchor))
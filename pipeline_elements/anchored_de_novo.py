@@ -9,6 +9,8 @@ from pipeline_elements import BASE_DIR, PipelineElement
 
 class AnchoredDeNovo(PipelineElement):
     """Anchored DOCK de novo run"""
+    BINARIES = ('dock',)
+    PARAMETERS = ('vdw', 'flex', 'flex_drive')
 
     def __init__(self, anchor, fragment_prefix, grid_prefix, output, config, docking_in=None):
         """Anchored DOCK de novo run
@@ -72,9 +74,28 @@ class AnchoredDeNovo(PipelineElement):
             self.config['Binaries']['dock'],
             '-i', os.path.relpath(docking_in_path, self.output)
         ]
-        PipelineElement._commandline(args, cwd=self.output)
+        PipelineElement._commandline(
+            args, cwd=self.output, log=os.path.join(self.output, 'dock.log'))
         PipelineElement._files_must_exist([self.built_molecules])
         return self
 
     def output_exists(self):
         return PipelineElement._files_exist([self.built_molecules])
+
+    @property
+    def inputs(self):
+        return [
+            self.anchor,
+            self.fragment_torenv,
+            self.fragment_sidechains,
+            self.fragment_linkers,
+            self.fragment_scaffolds,
+            self.fragment_rigid,
+            self.grid_prefix + '.nrg',
+            self.grid_prefix + '.bmp',
+            self.docking_in
+        ]
+
+    @property
+    def outputs(self):
+        return [self.built_molecules]
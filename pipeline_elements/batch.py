@@ -0,0 +1,228 @@
+"""Shared steps of batch docking workflows"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import logging
+import os
+import re
+
+from pipeline_elements import BatchPreparation, DockingRun, RmsdAnalysis, Scheduler
+from pipeline_elements.mol2 import read_molecules
+from pipeline_elements.prepare import is_converted
+from pipeline_elements.resources import ResourceReport, current_report, current_step
+
+LIGAND_EXTENSIONS = ('.sdf', '.mol', '.mol2')
+
+
+def split_ligands(ligands, output):
+    """Collect single ligand files from a directory or split a multi-molecule file
+
+    :param ligands: directory of ligand files with unique names or multi-molecule SDF/MOL2 file
+    :param output: output directory for the split ligand files
+    :return: list of single ligand files
+    """
+    if os.path.isdir(ligands):
+        ligand_files = sorted(
+            os.path.join(ligands, ligand) for ligand in os.listdir(ligands)
+            if os.path.splitext(ligand)[1].lower() in LIGAND_EXTENSIONS
+        )
+        # ligands are named after their file, so a.sdf and a.mol2 would share outputs
+        duplicates = sorted(
+            name for name, count in Counter(map(ligand_name, ligand_files)).items() if count > 1)
+        if duplicates:
+            raise RuntimeError('Ligand files with the same name: {}'.format(', '.join(duplicates)))
+        return ligand_files
+    if not os.path.exists(ligands):
+        raise RuntimeError('Did not find ligands: {}'.format(ligands))
+    if not os.path.exists(output):
+        os.mkdir(output)
+
+    extension = os.path.splitext(ligands)[1].lower()
+    blocks = _mol2_blocks(ligands) if extension == '.mol2' else _sdf_blocks(ligands)
+    ligand_files = []
+    names = set()
+    for index, (title, block) in enumerate(blocks):
+        name = re.sub(r'[^\w.-]', '_', title.strip()) or 'ligand'
+        if name in names:
+            name = '{}_{}'.format(name, index)
+        names.add(name)
+        ligand_file = os.path.join(output, name + extension)
+        with open(ligand_file, 'w') as single_ligand_file:
+            single_ligand_file.write(block)
+        ligand_files.append(ligand_file)
+    return ligand_files
+
+
+def _sdf_blocks(path):
+    """Yield title and text of each molecule of an SDF file"""
+    lines = []
+    with open(path) as sdf_file:
+        for line in sdf_file:
+            lines.append(line)
+            if line.startswith('$$$$'):
+                yield lines[0], ''.join(lines)
+                lines = []
+    if any(line.strip() for line in lines):
+        yield lines[0], ''.join(lines) + '$$$$\n'
+
+
+def _mol2_blocks(path):
+    """Yield title and text of each molecule of a MOL2 file"""
+    for molecule in read_molecules(path):
+        yield molecule.title, molecule.text
+
+
+def ligand_name(ligand):
+    """Name of a ligand from its file name"""
+    name, _extension = os.path.splitext(os.path.basename(ligand))
+    return name
+
+
+def prepare_ligands(ligands, output, config, workers=1, recalc=False):
+    """Convert ligands in one chimera process per worker
+
+    :param ligands: ligand files
+    :param output: output directory for the converted ligands
+    :param config: config object
+    :param workers: number of concurrent chimera processes
+    :param recalc: recalculate all intermediate results
+    :return: converted ligand of every ligand, unconverted ligands are logged
+    """
+    if not ligands:
+        raise RuntimeError('No ligands to prepare')
+    if not os.path.exists(output):
+        os.mkdir(output)
+    names = [ligand_name(ligand) for ligand in ligands]
+    chunk_size = -(-len(ligands) // workers)
+    scheduler = Scheduler(workers)
+    converted_ligands = []
+    for index, start in enumerate(range(0, len(ligands), chunk_size)):
+        batch_preparation = BatchPreparation(
+            ligands[start:start + chunk_size],
+            os.path.join(output, 'batch_{}'.format(index)),
+            config,
+            names=names[start:start + chunk_size]
+        )
+        scheduler.add(batch_preparation, 'ligand preparation batch {}'.format(index))
+        converted_ligands.extend(batch_preparation.converted_ligands)
+    scheduler.run(recalc)
+    for name, converted_ligand in zip(names, converted_ligands):
+        if not is_converted(converted_ligand):
+            logging.error('preparing %s failed', name)
+    return converted_ligands
+
+
+def dock_ligands(jobs, spheres, grid_prefix, output, config, workers=1, recalc=False):
+    """Dock ligands against a prepared receptor in a pool of worker processes
+
+    :param jobs: name, converted ligand, docking input file and RMSD reference of every ligand
+    :param spheres: selected spheres of the prepared receptor
+    :param grid_prefix: grid prefix of the prepared receptor
+    :param output: output directory with one directory per ligand
+    :param config: config object
+    :param workers: number of worker processes
+    :param recalc: recalculate all intermediate results
+    :return: top pose grid score, docked file and top pose RMSD by name, None if failed
+    """
+    if not os.path.exists(output):
+        os.mkdir(output)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for name, ligand, docking_in, rmsd_reference in jobs:
+            future = executor.submit(
+                _dock_ligand_with_report,
+                ligand,
+                spheres,
+                grid_prefix,
+                os.path.join(output, name),
+                config,
+                docking_in=docking_in,
+                rmsd_reference=rmsd_reference,
+                recalc=recalc
+            )
+            futures[future] = name
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name], report = future.result()
+                if current_report():
+                    current_report().merge(report, parent=current_step())
+                logging.info('docked: %s', name)
+            except Exception as error:  # pylint: disable=broad-except
+                logging.error('docking %s failed: %s', name, error)
+                results[name] = (None, None, None)
+    return results
+
+
+def dock_ligand(
+        ligand,
+        spheres,
+        grid_prefix,
+        output,
+        config,
+        docking_in=None,
+        rmsd_reference=None,
+        recalc=False
+):
+    """Dock a single converted ligand against a prepared receptor
+
+    Runs in a worker process and therefore only takes picklable arguments.
+
+    :param ligand: converted ligand to dock
+    :param spheres: selected spheres of the prepared receptor
+    :param grid_prefix: grid prefix of the prepared receptor
+    :param output: output directory for this ligand
+    :param config: config object
+    :param docking_in: DOCK input template file
+    :param rmsd_reference: reference molecule for RMSD calculation
+    :param recalc: recalculate all intermediate results
+    :return: top pose grid score, docked file and top pose RMSD
+    """
+    if not os.path.exists(output):
+        os.mkdir(output)
+    docking_run = DockingRun(
+        ligand,
+        spheres,
+        grid_prefix,
+        os.path.join(output, 'dock'),
+        config,
+        docking_in=docking_in,
+        rmsd_reference=rmsd_reference
+    )
+    scheduler = Scheduler()
+    scheduler.add(docking_run, 'docking')
+    scheduler.run(recalc)
+    top_rmsd = None
+    if rmsd_reference:
+        top_rmsd = RmsdAnalysis(docking_run.docked).run().top_rmsd
+    return top_grid_score(docking_run.docked), docking_run.docked, top_rmsd
+
+
+def _dock_ligand_with_report(*args, **kwargs):
+    """Dock a single ligand and return its result with the resource report of the worker"""
+    with ResourceReport() as report:
+        result = dock_ligand(*args, **kwargs)
+    return result, report.to_dict()
+
+
+def top_grid_score(docked):
+    """Grid score of the first pose in a docked file"""
+    for pose in read_molecules(docked, header_only=True):
+        return pose.value('Grid_Score')
+    return None
+
+
+def write_results(results_path, names, results, columns=2):
+    """Write batch docking results as TSV in input order
+
+    :param results_path: TSV file to write
+    :param names: ligand names in input order
+    :param results: result tuples by name, missing names are written empty
+    :param columns: number of result values written after the name
+    """
+    with open(results_path, 'w', newline='') as results_file:
+        writer = csv.writer(results_file, delimiter='\t')
+        for name in names:
+            result = (tuple(results.get(name) or ()) + (None,) * columns)[:columns]
+            writer.writerow([name] + ['' if value is None else value for value in result])
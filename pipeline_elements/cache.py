@@ -0,0 +1,87 @@
+"""Fingerprint based result cache for pipeline elements"""
+import hashlib
+import logging
+import os
+
+FINGERPRINT_SUFFIX = '.fingerprint'
+
+
+class ResultCache:
+    """Fingerprint based result cache for pipeline elements
+
+    The fingerprint of an element covers the contents of its input files
+    (including the templates it renders), the config parameters it uses and
+    the path and modification time of the binaries it calls. It is stored
+    next to the first output after a successful run. An element is only
+    skipped if its outputs exist and the stored fingerprint matches.
+    """
+
+    @staticmethod
+    def fingerprint(element):
+        """Fingerprint of everything that determines the element output
+
+        :param element: pipeline element
+        :return: hex digest or None if the element is not cacheable
+        """
+        if not element.CACHEABLE or not element.outputs:
+            return None
+        digest = hashlib.sha256(type(element).__name__.encode('utf8'))
+        for current_input in element.inputs:
+            digest.update(b'\0input\0')
+            if os.path.isfile(current_input):
+                with open(current_input, 'rb') as input_file:
+                    for chunk in iter(lambda: input_file.read(1 << 20), b''):
+                        digest.update(chunk)
+            else:
+                digest.update(b'\0missing\0')
+        config = getattr(element, 'config', None)
+        for parameter in element.PARAMETERS:
+            value = config.get('Parameters', parameter, fallback='')
+            digest.update('\0{}={}'.format(parameter, value).encode('utf8'))
+        for binary in element.BINARIES:
+            path = config.get('Binaries', binary, fallback='')
+            mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            digest.update('\0{}={}@{}'.format(binary, path, mtime).encode('utf8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def stamp(element):
+        """Path of the stored fingerprint of an element"""
+        first_output = element.outputs[0]
+        return os.path.join(
+            os.path.dirname(first_output),
+            '.' + os.path.basename(first_output) + FINGERPRINT_SUFFIX
+        )
+
+    @staticmethod
+    def hit(element, fingerprint):
+        """Element output exists and was computed from the current fingerprint
+
+        :param element: pipeline element
+        :param fingerprint: current fingerprint of the element
+        """
+        if not fingerprint or not element.output_exists():
+            return False
+        stamp = ResultCache.stamp(element)
+        if not os.path.exists(stamp):
+            logging.debug('no fingerprint for: %s', element.outputs[0])
+            return False
+        with open(stamp) as stamp_file:
+            if stamp_file.read().strip() != fingerprint:
+                logging.debug('stale output: %s', element.outputs[0])
+                return False
+        return True
+
+    @staticmethod
+    def store(element, fingerprint):
+        """Store the fingerprint an element output was computed from
+
+        :param element: pipeline element
+        :param fingerprint: fingerprint computed before the element was run
+        """
+        if not fingerprint:
+            return
+        stamp = ResultCache.stamp(element)
+        with open(stamp + '.tmp', 'w') as stamp_file:
+            stamp_file.write(fingerprint + '\n')
+        os.replace(stamp + '.tmp', stamp)
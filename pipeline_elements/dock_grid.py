@@ -0,0 +1,402 @@
+"""Memory mapped DOCK grids and grid score rescoring of poses"""
+from array import array
+import fnmatch
+from itertools import islice
+import math
+import mmap
+import os
+import struct
+
+from pipeline_elements.mol2 import read_molecules
+
+# size, spacing, origin and span of a grid
+HEADER = struct.Struct('=if3f3i')
+# atom model, attractive and repulsive exponent of an energy grid
+ENERGY_HEADER = struct.Struct('=3i')
+
+
+class DockGrid:
+    """Memory mapped DOCK energy and bump grids
+
+    The grid files written by the DOCK grid program are mapped into memory
+    instead of being read, so opening a grid is instant and its pages are
+    shared between processes. Grid values are ordered with x varying
+    fastest.
+    """
+
+    def __init__(self, prefix):
+        """Memory mapped DOCK energy and bump grids
+
+        :param prefix: grid prefix of the .nrg and .bmp files, the bump grid is optional
+        """
+        self.prefix = prefix
+        self.__maps = []
+        self.__views = []
+        self.size = None
+        self.spacing = None
+        self.origin = None
+        self.span = None
+        self.atom_model = None
+        self.attractive_exponent = None
+        self.repulsive_exponent = None
+        self.avdw = None
+        self.bvdw = None
+        self.es = None
+        self.bump = None
+        try:
+            self.__map_energy_grid(prefix + '.nrg')
+            if os.path.exists(prefix + '.bmp'):
+                self.__map_bump_grid(prefix + '.bmp')
+        except Exception:
+            self.close()
+            raise
+
+    def __map(self, path):
+        with open(path, 'rb') as grid_file:
+            grid_map = mmap.mmap(grid_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__maps.append(grid_map)
+        return self.__view(memoryview(grid_map))
+
+    def __view(self, view):
+        self.__views.append(view)
+        return view
+
+    def __set_header(self, header, path):
+        size, spacing, origin_x, origin_y, origin_z, span_x, span_y, span_z = header
+        if size != span_x * span_y * span_z:
+            raise RuntimeError('Invalid grid header: {}'.format(path))
+        if self.size is not None and (self.size, self.span) != (size, (span_x, span_y, span_z)):
+            raise RuntimeError('Grid dimensions do not match: {}'.format(path))
+        self.size = size
+        self.spacing = spacing
+        self.origin = (origin_x, origin_y, origin_z)
+        self.span = (span_x, span_y, span_z)
+
+    def __map_energy_grid(self, path):
+        grid_map = self.__map(path)
+        header_size = HEADER.size + ENERGY_HEADER.size
+        if len(grid_map) < header_size:
+            raise RuntimeError('Invalid energy grid: {}'.format(path))
+        # the grid header comes either before or after the energy parameters
+        header = HEADER.unpack_from(grid_map, 0)
+        if header[0] == header[5] * header[6] * header[7]:
+            energy_header = ENERGY_HEADER.unpack_from(grid_map, HEADER.size)
+        else:
+            energy_header = ENERGY_HEADER.unpack_from(grid_map, 0)
+            header = HEADER.unpack_from(grid_map, ENERGY_HEADER.size)
+        self.__set_header(header, path)
+        self.atom_model, self.attractive_exponent, self.repulsive_exponent = energy_header
+        if len(grid_map) < header_size + 12 * self.size:
+            raise RuntimeError('Truncated energy grid: {}'.format(path))
+        values = self.__view(grid_map[header_size:header_size + 12 * self.size])
+        values = self.__view(values.cast('f'))
+        self.avdw = self.__view(values[:self.size])
+        self.bvdw = self.__view(values[self.size:2 * self.size])
+        self.es = self.__view(values[2 * self.size:])
+
+    def __map_bump_grid(self, path):
+        grid_map = self.__map(path)
+        self.__set_header(read_header(path), path)
+        self.bump = self.__view(grid_map[HEADER.size:HEADER.size + self.size])
+
+    def close(self):
+        """Release the memory maps"""
+        self.avdw = self.bvdw = self.es = self.bump = None
+        for view in reversed(self.__views):
+            view.release()
+        self.__views = []
+        for grid_map in self.__maps:
+            grid_map.close()
+        self.__maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exception):
+        self.close()
+
+    def index(self, x, y, z):
+        """Index of a grid point"""
+        return (z * self.span[1] + y) * self.span[0] + x
+
+    def interpolate(self, values, point):
+        """Trilinear interpolation of grid values at a point, None outside the grid
+
+        :param values: one of avdw, bvdw or es
+        :param point: x, y, z coordinates
+        """
+        value, = self.interpolate_points(*([coordinate] for coordinate in point), grids=[values])
+        return None if math.isnan(value[0]) else value[0]
+
+    def interpolate_points(self, xs, ys, zs, grids=None):
+        """Trilinear interpolation of grids at a batch of points
+
+        The eight grid points around a point are located once for all
+        grids, points outside the grid are NaN.
+
+        :param xs: x coordinates
+        :param ys: y coordinates
+        :param zs: z coordinates
+        :param grids: grid values to interpolate, avdw, bvdw and es by default
+        :return: array of interpolated values per grid
+        """
+        if grids is None:
+            grids = (self.avdw, self.bvdw, self.es)
+        origin_x, origin_y, origin_z = self.origin
+        span_x, span_y, span_z = self.span
+        spacing = self.spacing
+        row = span_x
+        plane = span_x * span_y
+        corners = (0, 1, row, row + 1, plane, plane + 1, plane + row, plane + row + 1)
+        interpolated = [array('d', bytes(8 * len(xs))) for _grid in grids]
+        for point, (x, y, z) in enumerate(zip(xs, ys, zs)):
+            x = (x - origin_x) / spacing
+            y = (y - origin_y) / spacing
+            z = (z - origin_z) / spacing
+            if not (0 <= x <= span_x - 1 and 0 <= y <= span_y - 1 and 0 <= z <= span_z - 1):
+                for values in interpolated:
+                    values[point] = math.nan
+                continue
+            lower_x = min(int(x), span_x - 2)
+            lower_y = min(int(y), span_y - 2)
+            lower_z = min(int(z), span_z - 2)
+            x -= lower_x
+            y -= lower_y
+            z -= lower_z
+            base = (lower_z * span_y + lower_y) * span_x + lower_x
+            weights = (
+                (1 - x) * (1 - y) * (1 - z), x * (1 - y) * (1 - z),
+                (1 - x) * y * (1 - z), x * y * (1 - z),
+                (1 - x) * (1 - y) * z, x * (1 - y) * z,
+                (1 - x) * y * z, x * y * z
+            )
+            for grid, values in zip(grids, interpolated):
+                values[point] = sum(
+                    weight * grid[base + corner] for corner, weight in zip(corners, weights))
+        return interpolated
+
+    def bump_points(self, xs, ys, zs):
+        """Bump grid values at the nearest grid points of a batch of points
+
+        :return: array of bump values, infinite outside the grid or without bump grid
+        """
+        values = array('d', [math.inf]) * len(xs)
+        if self.bump is None:
+            return values
+        bump = self.bump
+        origin_x, origin_y, origin_z = self.origin
+        span_x, span_y, span_z = self.span
+        spacing = self.spacing
+        for point, (x, y, z) in enumerate(zip(xs, ys, zs)):
+            x = round((x - origin_x) / spacing)
+            y = round((y - origin_y) / spacing)
+            z = round((z - origin_z) / spacing)
+            if 0 <= x < span_x and 0 <= y < span_y and 0 <= z < span_z:
+                values[point] = bump[(z * span_y + y) * span_x + x]
+        return values
+
+    def bumps(self, point, radius):
+        """Whether an atom of a vdw radius bumps into the receptor at a point
+
+        The bump grid stores ten times the largest atom radius that fits at
+        a grid point. The nearest grid point decides.
+        """
+        return self.bump_points(*([coordinate] for coordinate in point))[0] < 10 * radius
+
+
+def read_header(path):
+    """Size, spacing, origin and span of a DOCK bump grid"""
+    with open(path, 'rb') as grid_file:
+        header = grid_file.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise RuntimeError('Invalid grid: {}'.format(path))
+    return HEADER.unpack(header)
+
+
+def read_vdw_definitions(path, atom_model='a'):
+    """Radius and well depth of the atom types of a DOCK vdw definition file
+
+    Only the atom type of a definition is used, neighbour conditions are
+    ignored. The first definition matching a SYBYL type wins.
+
+    :param path: vdw definition file, for example vdw_AMBER_parm99.defn
+    :param atom_model: atom model the definitions are read for, a for all atom
+    :return: list of SYBYL type pattern, radius and well depth
+    """
+    definitions = []
+    record = {}
+    with open(path) as definition_file:
+        for line in list(definition_file) + ['']:
+            columns = line.split()
+            if not columns:
+                if record.get('atom_model', atom_model) in (atom_model, 'e') \
+                        and 'radius' in record:
+                    for pattern in record.get('definition', []):
+                        definitions.append(
+                            (pattern, float(record['radius']), float(record['well_depth'])))
+                record = {}
+            elif columns[0] == 'definition':
+                record.setdefault('definition', []).append(columns[1])
+            elif len(columns) > 1:
+                record[columns[0]] = columns[1]
+    return definitions
+
+
+class GridScorer:
+    """Grid score of poses from memory mapped DOCK grids
+
+    The grid score is the sum of the van der Waals and electrostatic
+    energies interpolated from the grids. The van der Waals coefficients of
+    a ligand atom are derived from its radius and well depth with the
+    exponents of the grid. Poses are scored in batches, see score_poses.
+
+    The bump_overlap of the grid input is ignored. The DOCK grid program
+    applies it when it writes the bump grid, an atom bumps if the bump grid
+    value at its nearest grid point is below ten times its radius.
+    """
+
+    def __init__(self, grid, vdw_definitions):
+        """Grid score of poses from memory mapped DOCK grids
+
+        :param grid: DockGrid
+        :param vdw_definitions: list of SYBYL type pattern, radius and well depth
+        """
+        self.grid = grid
+        self.vdw_definitions = vdw_definitions
+        self.__coefficients = {}
+
+    def coefficients(self, atom_type):
+        """Attractive and repulsive coefficient and radius of a SYBYL atom type"""
+        if atom_type not in self.__coefficients:
+            for pattern, radius, well_depth in self.vdw_definitions:
+                if fnmatch.fnmatchcase(atom_type, pattern):
+                    break
+            else:
+                raise RuntimeError('No vdw definition for atom type: {}'.format(atom_type))
+            attractive = self.grid.attractive_exponent
+            repulsive = self.grid.repulsive_exponent
+            self.__coefficients[atom_type] = (
+                math.sqrt(well_depth * attractive / (repulsive - attractive)
+                          * (2 * radius) ** repulsive),
+                math.sqrt(well_depth * repulsive / (repulsive - attractive)
+                          * (2 * radius) ** attractive),
+                radius
+            )
+        return self.__coefficients[atom_type]
+
+    def score(self, molecule):
+        """Grid score, vdw energy, es energy and number of bumps of a pose
+
+        :return: energies of the pose, None if an atom is outside the grid
+        """
+        return self.score_poses([molecule])[0]
+
+    def score_poses(self, poses):
+        """Grid score, vdw energy, es energy and number of bumps of a batch of poses
+
+        The atoms of all poses are gathered into flat arrays and looked up
+        in the grids in one pass.
+
+        :param poses: list of molecules
+        :return: list of energies per pose, None for poses with an atom outside the grid
+        """
+        xs = array('d')
+        ys = array('d')
+        zs = array('d')
+        repulsive_coefficients = array('d')
+        attractive_coefficients = array('d')
+        radii = array('d')
+        charges = array('d')
+        ends = []
+        for pose in poses:
+            coordinates = pose.coordinates
+            xs.extend(coordinates[0::3])
+            ys.extend(coordinates[1::3])
+            zs.extend(coordinates[2::3])
+            for atom_type in pose.atom_types:
+                repulsive, attractive, radius = self.coefficients(atom_type)
+                repulsive_coefficients.append(repulsive)
+                attractive_coefficients.append(attractive)
+                radii.append(radius)
+            charges.extend(pose.charges)
+            ends.append(len(xs))
+        avdw, bvdw, es = self.grid.interpolate_points(xs, ys, zs)
+        bump = self.grid.bump_points(xs, ys, zs)
+        scores = []
+        start = 0
+        for end in ends:
+            atoms = range(start, end)
+            start = end
+            vdw = math.fsum(
+                repulsive_coefficients[atom] * avdw[atom]
+                - attractive_coefficients[atom] * bvdw[atom] for atom in atoms
+            )
+            if math.isnan(vdw):
+                scores.append(None)
+                continue
+            pose_es = math.fsum(charges[atom] * es[atom] for atom in atoms)
+            bumps = sum(1 for atom in atoms if bump[atom] < 10 * radii[atom])
+            scores.append((vdw + pose_es, vdw, pose_es, bumps))
+        return scores
+
+    def rescore(self, docked, batch_size=1000):
+        """Score all poses of a docked file
+
+        :param docked: MOL2 file of poses
+        :param batch_size: number of poses scored at once
+        :return: generator of pose name and score columns, None for poses outside the grid
+        """
+        poses = read_molecules(docked)
+        while True:
+            batch = list(islice(poses, batch_size))
+            if not batch:
+                return
+            for pose, score in zip(batch, self.score_poses(batch)):
+                yield pose.name, score
+
+    def rescore_columns(self, docked):
+        """Score all poses of a docked file into columns of floats
+
+        Poses outside the grid are NaN and have no bumps.
+        """
+        columns = {
+            'grid_score': array('d'),
+            'vdw': array('d'),
+            'es': array('d'),
+            'bumps': array('l')
+        }
+        for _name, score in self.rescore(docked):
+            grid_score, vdw, es, bumps = score if score else (math.nan, math.nan, math.nan, 0)
+            columns['grid_score'].append(grid_score)
+            columns['vdw'].append(vdw)
+            columns['es'].append(es)
+            columns['bumps'].append(bumps)
+        return columns
+
+
+def write_dock_grid(prefix, origin, spacing, span, avdw, bvdw, es, bump=None, atom_model=1,
+                    attractive_exponent=6, repulsive_exponent=12):
+    """Write DOCK energy and bump grid files
+
+    :param prefix: grid prefix of the .nrg and .bmp files
+    :param origin: x, y, z of the first grid point
+    :param spacing: grid spacing
+    :param span: number of grid points in x, y and z
+    :param avdw: repulsive van der Waals values, x varying fastest
+    :param bvdw: attractive van der Waals values
+    :param es: electrostatic values
+    :param bump: bump values, no bump grid is written if None
+    """
+    size = span[0] * span[1] * span[2]
+    header = HEADER.pack(size, spacing, *origin, *span)
+    with open(prefix + '.nrg', 'wb') as energy_grid:
+        energy_grid.write(header)
+        energy_grid.write(ENERGY_HEADER.pack(atom_model, attractive_exponent, repulsive_exponent))
+        for values in (avdw, bvdw, es):
+            if len(values) != size:
+                raise RuntimeError('Grid values do not match the grid size')
+            array('f', values).tofile(energy_grid)
+    if bump is not None:
+        with open(prefix + '.bmp', 'wb') as bump_grid:
+            bump_grid.write(header)
+            bump_grid.write(bytes(bump))
@@ -1,14 +1,19 @@
 """Docking run using DOCK"""
 import argparse
+import asyncio
 import configparser
 import logging
+import math
 import os
 
 from pipeline_elements import PipelineElement, BASE_DIR
+from pipeline_elements.mol2 import Mol2Writer, read_molecules
 
 
 class DockingRun(PipelineElement):
     """Docking run using DOCK"""
+    BINARIES = ('dock',)
+    PARAMETERS = ('vdw', 'flex', 'flex_drive')
 
     def __init__(
             self,
@@ -18,13 +23,18 @@ class DockingRun(PipelineElement):
             output,
             config,
             docking_in=None,
-            rmsd_reference=None
+            rmsd_reference=None,
+            shards=1
     ):
         """Docking run using DOCK
 
         The docking input file used is either user specified with docking_in or
         an adapted FLX protocol docking input file from doi: 10.1002/jcc.23905.
 
+        With more than one shard the ligand library is split into balanced
+        shards that are docked by concurrent DOCK processes. The docked poses
+        of all shards are merged sorted by grid score.
+
         :param ligand: ligand mol2 file
         :param spheres: spheres file
         :param grid: grid prefix
@@ -32,6 +42,7 @@ class DockingRun(PipelineElement):
         :param config: config object
         :param docking_in: DOCK input template file
         :param rmsd_reference: reference molecule for RMSD calculation
+        :param shards: number of shards to split the ligand library into
         """
         self.ligand = os.path.abspath(ligand)
         self.spheres = os.path.abspath(spheres)
@@ -46,6 +57,7 @@ class DockingRun(PipelineElement):
         self.rmsd_reference = os.path.abspath(rmsd_reference) if rmsd_reference else None
         self.docked_prefix = docked_prefix = os.path.join(self.output, 'docked')
         self.docked = docked_prefix + '_scored.mol2'
+        self.shards = max(1, shards)
 
     def run(self, _recalc=False):
         """Run docking"""
@@ -55,36 +67,118 @@ class DockingRun(PipelineElement):
             os.mkdir(self.output)
 
         with open(self.docking_in) as dock_template:
-            dock_in = dock_template.read()
+            dock_template = dock_template.read()
+        if self.shards > 1:
+            self.__run_shards(dock_template)
+        else:
+            dock_in_path = self.__write_dock_in(dock_template, self.ligand, self.output)
+            args = [
+                self.config['Binaries']['dock'],
+                '-i', dock_in_path
+            ]
+            PipelineElement._commandline(
+                args, cwd=self.output, log=os.path.join(self.output, 'dock.log'))
+        PipelineElement._files_must_exist([self.docked])
+        return self
 
+    def __write_dock_in(self, dock_template, ligand, output):
+        """Write the DOCK input file for docking a ligand file in an output directory"""
+        docked_prefix = os.path.join(output, os.path.basename(self.docked_prefix))
         parameter_map = {
-            'ligand': os.path.relpath(self.ligand, self.output),
-            'spheres': os.path.relpath(self.spheres, self.output),
-            'grid': os.path.relpath(self.grid, self.output),
+            'ligand': os.path.relpath(ligand, output),
+            'spheres': os.path.relpath(self.spheres, output),
+            'grid': os.path.relpath(self.grid, output),
             'vdw': self.config['Parameters']['vdw'],
             'flex': self.config['Parameters']['flex'],
             'flex_drive': self.config['Parameters']['flex_drive'],
-            'docked_prefix': os.path.relpath(self.docked_prefix, self.output)
+            'docked_prefix': os.path.relpath(docked_prefix, output)
         }
-        if self.rmsd_reference and '{reference}' in dock_in:
-            parameter_map['reference'] = os.path.relpath(self.rmsd_reference, self.output)
+        if self.rmsd_reference and '{reference}' in dock_template:
+            parameter_map['reference'] = os.path.relpath(self.rmsd_reference, output)
         elif self.rmsd_reference:
             raise RuntimeError(
                 'RMSD reference was specified for a docking input file that '
                 'does not support RMSD calculation'
             )
-        dock_in = dock_in.format(**parameter_map)
+        dock_in = dock_template.format(**parameter_map)
 
-        dock_in_path = os.path.join(self.output, 'dock.in')
+        dock_in_path = os.path.join(output, 'dock.in')
         with open(dock_in_path, 'w') as dock_in_file:
             dock_in_file.write(dock_in)
-        args = [
-            self.config['Binaries']['dock'],
-            '-i', dock_in_path
+        return dock_in_path
+
+    def __run_shards(self, dock_template):
+        shard_ligands = self.__split_ligand()
+        dock_in_paths = [
+            self.__write_dock_in(dock_template, shard_ligand, os.path.dirname(shard_ligand))
+            for shard_ligand in shard_ligands
         ]
-        PipelineElement._commandline(args, cwd=self.output)
-        PipelineElement._files_must_exist([self.docked])
-        return self
+        logging.debug('docking %d shards', len(shard_ligands))
+        asyncio.run(self.__dock_shards(dock_in_paths))
+        self.__merge_shards([os.path.dirname(shard_ligand) for shard_ligand in shard_ligands])
+
+    async def __dock_shards(self, dock_in_paths):
+        await asyncio.gather(*[
+            PipelineElement._commandline_async(
+                [self.config['Binaries']['dock'], '-i', dock_in_path],
+                cwd=os.path.dirname(dock_in_path),
+                log=os.path.join(os.path.dirname(dock_in_path), 'dock.log')
+            )
+            for dock_in_path in dock_in_paths
+        ])
+
+    def __split_ligand(self):
+        """Split the ligand library round robin into shards at molecule boundaries"""
+        shard_ligands = []
+        shard_writers = []
+        for index in range(self.shards):
+            shard_dir = os.path.join(self.output, 'shard_{}'.format(index))
+            if not os.path.exists(shard_dir):
+                os.mkdir(shard_dir)
+            shard_ligands.append(os.path.join(shard_dir, 'ligands.mol2'))
+            shard_writers.append(Mol2Writer(shard_ligands[-1]))
+        molecules = 0
+        try:
+            for molecule in read_molecules(self.ligand, header_only=True):
+                shard_writers[molecules % self.shards].write(molecule)
+                molecules += 1
+        finally:
+            for shard_writer in shard_writers:
+                shard_writer.close()
+        # a shard without molecules would make DOCK fail
+        for shard_ligand in shard_ligands[molecules:]:
+            os.remove(shard_ligand)
+        return shard_ligands[:molecules]
+
+    def __merge_shards(self, shard_dirs):
+        """Merge docked poses of all shards sorted by grid score"""
+        poses = []
+        for shard_dir in shard_dirs:
+            shard_docked = os.path.join(shard_dir, os.path.basename(self.docked))
+            if not os.path.exists(shard_docked):
+                logging.warning('no docked poses for shard: %s', shard_dir)
+                continue
+            poses.extend(read_molecules(shard_docked, header_only=True))
+        poses.sort(key=DockingRun.__grid_score)
+        with Mol2Writer(self.docked) as docked_writer:
+            for pose in poses:
+                docked_writer.write(pose)
+
+    @staticmethod
+    def __grid_score(pose):
+        grid_score = pose.value('Grid_Score')
+        return math.inf if grid_score is None else grid_score
 
     def output_exists(self):
         return PipelineElement._files_exist([self.docked])
+
+    @property
+    def inputs(self):
+        files = [self.ligand, self.spheres, self.grid + '.nrg', self.grid + '.bmp', self.docking_in]
+        if self.rmsd_reference:
+            files.append(self.rmsd_reference)
+        return files
+
+    @property
+    def outputs(self):
+        return [self.docked]
@@ -0,0 +1,189 @@
+"""Two stage docking funnel using DOCK"""
+import csv
+import logging
+import math
+import os
+
+from pipeline_elements import PipelineElement, BASE_DIR, DockingRun, Scheduler
+from pipeline_elements.mol2 import Mol2Writer, read_molecules
+
+
+class DockingFunnel(PipelineElement):
+    """Two stage docking funnel using DOCK
+
+    All ligands are docked with a cheap prescreen protocol first. Only the
+    best ligands of the prescreen are docked again with the full protocol.
+    The best grid score of every ligand in both stages is written to a
+    results TSV, ligands that were not docked again have no full score.
+    """
+    # the docking stages are cached individually
+    CACHEABLE = False
+
+    def __init__(
+            self,
+            ligand,
+            spheres,
+            grid,
+            output,
+            config,
+            top_k=None,
+            score_threshold=None,
+            prescreen_in=None,
+            docking_in=None,
+            shards=1
+    ):
+        """Two stage docking funnel using DOCK
+
+        Survivors of the prescreen are the top_k ligands by grid score that
+        also score at or below score_threshold. Either criterion may be
+        omitted but not both.
+
+        :param ligand: ligand mol2 file
+        :param spheres: spheres file
+        :param grid: grid prefix
+        :param output: output directory to write to
+        :param config: config object
+        :param top_k: number of ligands docked again with the full protocol
+        :param score_threshold: maximum prescreen grid score of a ligand docked again
+        :param prescreen_in: DOCK input template file of the prescreen
+        :param docking_in: DOCK input template file of the full protocol
+        :param shards: number of shards to split the ligand library of each stage into
+        """
+        if top_k is None and score_threshold is None:
+            raise RuntimeError('Docking funnel requires top_k or score_threshold')
+        self.ligand = os.path.abspath(ligand)
+        self.spheres = os.path.abspath(spheres)
+        self.grid = grid
+        self.output = os.path.abspath(output)
+        self.config = config
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.prescreen_in = os.path.join(BASE_DIR, 'templates', 'FLX_prescreen.in.template')
+        if prescreen_in:
+            self.prescreen_in = prescreen_in
+        self.survivors = os.path.join(self.output, 'survivors.mol2')
+        self.results = os.path.join(self.output, 'funnel.tsv')
+        self.__prescreen = DockingRun(
+            self.ligand,
+            self.spheres,
+            self.grid,
+            os.path.join(self.output, 'prescreen'),
+            self.config,
+            docking_in=self.prescreen_in,
+            shards=shards
+        )
+        self.__full = DockingRun(
+            self.survivors,
+            self.spheres,
+            self.grid,
+            os.path.join(self.output, 'full'),
+            self.config,
+            docking_in=docking_in,
+            shards=shards
+        )
+
+    @property
+    def prescreen_docked(self):
+        """get prescreen docking run docked"""
+        return self.__prescreen.docked
+
+    @property
+    def docked(self):
+        """get full docking run docked"""
+        return self.__full.docked
+
+    def run(self, recalc=False):
+        """Run the docking funnel
+
+        :param recalc: recalculate all intermediate results
+        """
+        if not os.path.exists(self.output):
+            os.mkdir(self.output)
+
+        Scheduler().add(self.__prescreen, 'prescreen docking').run(recalc)
+        prescreen_scores = best_grid_scores(self.__prescreen.docked)
+        survivors = select_survivors(prescreen_scores, self.top_k, self.score_threshold)
+        logging.info(
+            '%d of %d ligands survived the prescreen', len(survivors), len(prescreen_scores))
+        if not survivors:
+            raise RuntimeError('No ligand survived the prescreen')
+        write_molecules(self.ligand, survivors, self.survivors)
+
+        Scheduler().add(self.__full, 'full docking').run(recalc)
+        write_funnel_results(
+            self.results, prescreen_scores, best_grid_scores(self.__full.docked))
+        return self
+
+    def output_exists(self):
+        return PipelineElement._files_exist([self.__full.docked, self.results])
+
+    @property
+    def inputs(self):
+        return self.__prescreen.inputs + [self.__full.docking_in]
+
+    @property
+    def outputs(self):
+        return [self.__prescreen.docked, self.__full.docked, self.results]
+
+
+def best_grid_scores(docked):
+    """Best grid score of every ligand of a docked file by name in file order"""
+    scores = {}
+    for pose in read_molecules(docked, header_only=True):
+        grid_score = pose.value('Grid_Score')
+        if grid_score is None:
+            grid_score = math.inf
+        if pose.name not in scores or grid_score < scores[pose.name]:
+            scores[pose.name] = grid_score
+    return scores
+
+
+def select_survivors(scores, top_k=None, score_threshold=None):
+    """Names of the best ligands by grid score
+
+    :param scores: grid score by name
+    :param top_k: maximum number of survivors, unlimited if None
+    :param score_threshold: maximum grid score of a survivor, unlimited if None
+    :return: survivor names from best to worst
+    """
+    ranked = sorted(scores, key=scores.get)
+    if score_threshold is not None:
+        ranked = [name for name in ranked if scores[name] <= score_threshold]
+    else:
+        ranked = [name for name in ranked if scores[name] != math.inf]
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    return ranked
+
+
+def write_molecules(mol2, names, output):
+    """Copy the molecules of a MOL2 file with one of the names
+
+    :param mol2: MOL2 file to copy from
+    :param names: names of the molecules to copy
+    :param output: MOL2 file to write
+    """
+    names = set(names)
+    with Mol2Writer(output) as writer:
+        for molecule in read_molecules(mol2, header_only=True):
+            if molecule.name in names:
+                writer.write(molecule)
+
+
+def write_funnel_results(results_path, prescreen_scores, full_scores):
+    """Write prescreen and full grid scores of all ligands as TSV
+
+    :param results_path: TSV file to write
+    :param prescreen_scores: prescreen grid score by name
+    :param full_scores: full grid score by name of the ligands docked again
+    """
+    with open(results_path, 'w', newline='') as results_file:
+        writer = csv.writer(results_file, delimiter='\t')
+        writer.writerow(['name', 'prescreen_grid_score', 'full_grid_score'])
+        for name, prescreen_score in prescreen_scores.items():
+            full_score = full_scores.get(name)
+            writer.writerow([
+                name,
+                '' if prescreen_score == math.inf else prescreen_score,
+                '' if full_score is None or full_score == math.inf else full_score
+            ])
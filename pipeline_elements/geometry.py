@@ -0,0 +1,64 @@
+"""Spatial lookups of 3D coordinates"""
+import math
+
+
+class SpatialHash:
+    """Uniform grid hash of points for fixed radius neighbour queries
+
+    Points are bucketed into cubic cells. A query only visits the cells that
+    overlap its radius, so lookups cost the number of nearby points instead
+    of the number of all points.
+    """
+
+    def __init__(self, points, cell_size):
+        """Uniform grid hash of points for fixed radius neighbour queries
+
+        :param points: sequence of (x, y, z) coordinates
+        :param cell_size: edge length of a cell, ideally the typical query radius
+        """
+        if cell_size <= 0:
+            raise RuntimeError('Cell size must be positive: {}'.format(cell_size))
+        self.cell_size = cell_size
+        self.points = [tuple(point) for point in points]
+        self.__cells = {}
+        for index, point in enumerate(self.points):
+            self.__cells.setdefault(self.__cell(point), []).append(index)
+
+    def __cell(self, point):
+        return tuple(math.floor(coordinate / self.cell_size) for coordinate in point)
+
+    def neighbours(self, point, radius):
+        """Indices of all points closer than radius to a point"""
+        reach = math.ceil(radius / self.cell_size)
+        cell_x, cell_y, cell_z = self.__cell(point)
+        squared_radius = radius * radius
+        neighbours = []
+        for x in range(cell_x - reach, cell_x + reach + 1):
+            for y in range(cell_y - reach, cell_y + reach + 1):
+                for z in range(cell_z - reach, cell_z + reach + 1):
+                    for index in self.__cells.get((x, y, z), ()):
+                        if squared_distance(point, self.points[index]) < squared_radius:
+                            neighbours.append(index)
+        return neighbours
+
+    def any_within(self, point, radius):
+        """Whether any point is closer than radius to a point"""
+        reach = math.ceil(radius / self.cell_size)
+        cell_x, cell_y, cell_z = self.__cell(point)
+        squared_radius = radius * radius
+        for x in range(cell_x - reach, cell_x + reach + 1):
+            for y in range(cell_y - reach, cell_y + reach + 1):
+                for z in range(cell_z - reach, cell_z + reach + 1):
+                    for index in self.__cells.get((x, y, z), ()):
+                        if squared_distance(point, self.points[index]) < squared_radius:
+                            return True
+        return False
+
+
+def squared_distance(first, second):
+    """Squared euclidean distance of two points"""
+    return (
+        (first[0] - second[0]) ** 2
+        + (first[1] - second[1]) ** 2
+        + (first[2] - second[2]) ** 2
+    )
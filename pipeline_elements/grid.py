@@ -2,13 +2,40 @@
 import argparse
 import configparser
 import logging
+import math
 import os
 
-from pipeline_elements import PipelineElement, BASE_DIR
+from pipeline_elements import PipelineElement, BASE_DIR, DirectoryStore
+from pipeline_elements.sph import read_spheres
+from pipeline_elements.store import link_file
+
+# margin in Å added around the selected spheres, the showbox default
+DEFAULT_BOX_MARGIN = 5.0
+BOX_ATOM = 'ATOM  {:5d}  DU{} BOX     1    {:8.3f}{:8.3f}{:8.3f}\n'
+# corners of the box as minimum (0) or maximum (1) in x, y and z
+BOX_CORNERS = (
+    ('A', (0, 0, 0)), ('B', (1, 0, 0)), ('C', (1, 0, 1)), ('D', (0, 0, 1)),
+    ('E', (0, 1, 0)), ('F', (1, 1, 0)), ('G', (1, 1, 1)), ('H', (0, 1, 1))
+)
+BOX_CONECT = (
+    (1, 2, 4, 5), (2, 1, 3, 6), (3, 2, 4, 7), (4, 1, 3, 8),
+    (5, 1, 6, 8), (6, 2, 5, 7), (7, 3, 6, 8), (8, 4, 5, 7)
+)
 
 
 class GridGeneration(PipelineElement):
-    """Grid generation for DOCK workflow"""
+    """Grid generation for DOCK workflow
+
+    The box around the selected spheres is built in process. The number of
+    grid points is known before grid runs and can be limited with
+    max_grid_points in the Execution section of the config.
+
+    If a grid store is configured, grids are shared between output
+    directories. They are keyed by the active site, the box, the grid
+    parameters and the vdw definitions and hard linked into the output.
+    """
+    BINARIES = ('grid',)
+    PARAMETERS = ('vdw', 'box_margin')
 
     def __init__(self, active_site, spheres, output, config):
         """Grid generation for DOCK workflow
@@ -25,6 +52,11 @@ class GridGeneration(PipelineElement):
         self.grid_prefix = os.path.join(self.output, 'grid')
         self.energy_grid = self.grid_prefix + '.nrg'
         self.bump_grid = self.grid_prefix + '.bmp'
+        self.box = os.path.join(self.output, 'box.pdb')
+        self.box_center = None
+        self.box_dimensions = None
+        self.grid_points = None
+        self.grid_template = os.path.join(BASE_DIR, 'templates', 'grid.in.template')
 
     def run(self, _recalc=False):
         """Run grid generation"""
@@ -32,34 +64,58 @@ class GridGeneration(PipelineElement):
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        box = self.__create_box()
-        self.__create_grid(box)
+        self.__create_box()
+        grid_in = self.__write_grid_in()
+        grid_store = self.__grid_store()
+        if grid_store:
+            key = grid_key(self.active_site, self.box, self.grid_template, self.config)
+            entry = grid_store.get(key)
+            if entry:
+                logging.info('using stored grid: %s', key)
+                for grid in (self.energy_grid, self.bump_grid):
+                    link_file(os.path.join(entry, os.path.basename(grid)), grid)
+                PipelineElement._files_must_exist([self.energy_grid, self.bump_grid])
+                return self
+        self.__create_grid(grid_in)
+        if grid_store:
+            grid_store.add(key, self.output, description=self.active_site)
         return self
 
     def output_exists(self):
         return PipelineElement._files_exist([self.energy_grid, self.bump_grid])
 
+    @property
+    def inputs(self):
+        return [self.active_site, self.spheres, self.grid_template]
+
+    @property
+    def outputs(self):
+        return [self.energy_grid, self.bump_grid]
+
     def __create_box(self):
-        box = os.path.join(self.output, 'box.pdb')
-        box_template_path = os.path.join(BASE_DIR, 'templates', 'box.in.template')
-        with open(box_template_path) as box_template:
-            box_in = box_template.read()
-        box_in = box_in.format(
-            spheres=os.path.relpath(self.spheres, self.output),
-            box=os.path.relpath(box, self.output)
-        )
-        logging.debug(box_in)
-        PipelineElement._commandline(
-            [self.config['Binaries']['showbox']],
-            input=bytes(box_in, 'utf8'),
-            cwd=self.output
+        margin = self.config.getfloat('Parameters', 'box_margin', fallback=DEFAULT_BOX_MARGIN)
+        self.box_center, self.box_dimensions = sphere_box(read_spheres(self.spheres), margin)
+        write_box_pdb(self.box_center, self.box_dimensions, self.box)
+        spacing = read_grid_spacing(self.grid_template)
+        self.grid_points = grid_points(self.box_dimensions, spacing)
+        logging.info(
+            'grid of %d points (%.1f x %.1f x %.1f at spacing %g)',
+            self.grid_points, *self.box_dimensions, spacing
         )
-        PipelineElement._files_must_exist([box])
-        return box
+        max_grid_points = self.config.getint('Execution', 'max_grid_points', fallback=0)
+        if max_grid_points and self.grid_points > max_grid_points:
+            raise RuntimeError('Grid of {} points exceeds max_grid_points {}'.format(
+                self.grid_points, max_grid_points))
+
+    def __grid_store(self):
+        root = self.config.get('Execution', 'grid_store', fallback='')
+        if not root:
+            return None
+        budget = self.config.getint('Execution', 'grid_store_budget', fallback=0)
+        return DirectoryStore(root, budget * 1024 * 1024 if budget else None)
 
-    def __create_grid(self, box):
-        grid_template_path = os.path.join(BASE_DIR, 'templates', 'grid.in.template')
-        with open(grid_template_path) as grid_template:
+    def __write_grid_in(self):
+        with open(self.grid_template) as grid_template:
             grid_in = grid_template.read()
 
         # TODO go back over all paths and check they are not longer than 80 chars
@@ -69,7 +125,7 @@ class GridGeneration(PipelineElement):
 
         grid_in = grid_in.format(
             active_site=active_site_path,
-            box=os.path.relpath(box, self.output),
+            box=os.path.relpath(self.box, self.output),
             vdw=self.config['Parameters']['vdw'],
             grid=os.path.relpath(self.grid_prefix, self.output)
         )
@@ -77,9 +133,98 @@ class GridGeneration(PipelineElement):
         grid_in_path = os.path.join(self.output, 'grid.in')
         with open(grid_in_path, 'w') as grid_in_file:
             grid_in_file.write(grid_in)
+        return grid_in_path
+
+    def __create_grid(self, grid_in_path):
+        # grids may be hard linked to a grid store and must not be overwritten in place
+        for grid in (self.energy_grid, self.bump_grid):
+            if os.path.exists(grid):
+                os.remove(grid)
         args = [
             self.config['Binaries']['grid'],
             '-i', os.path.relpath(grid_in_path, self.output)
         ]
-        PipelineElement._commandline(args, cwd=self.output)
+        PipelineElement._commandline(
+            args, cwd=self.output, log=os.path.join(self.output, 'grid.log'))
         PipelineElement._files_must_exist([self.energy_grid, self.bump_grid])
+
+
+def grid_key(active_site, box, grid_template, config):
+    """Grid store key of the grid of an active site in a box
+
+    :param active_site: active site mol2 file
+    :param box: box PDB file
+    :param grid_template: grid input template with the grid parameters
+    :param config: config object
+    """
+    vdw = config['Parameters']['vdw']
+    PipelineElement._files_must_exist([vdw])
+    return DirectoryStore.key(
+        [active_site, box, grid_template, vdw],
+        ['grid={}'.format(config.get('Binaries', 'grid', fallback=''))]
+    )
+
+
+def sphere_box(spheres, margin=DEFAULT_BOX_MARGIN):
+    """Center and dimensions of the box enclosing spheres with a margin
+
+    :param spheres: SphereSet
+    :param margin: distance added between the spheres and every face of the box
+    :return: x, y, z of the center and x, y, z edge lengths
+    """
+    if not spheres:
+        raise RuntimeError('Cannot build a box around no spheres')
+    minimum = [math.inf] * 3
+    maximum = [-math.inf] * 3
+    for index, radius in enumerate(spheres.radii):
+        for dimension, coordinate in enumerate(spheres.center(index)):
+            minimum[dimension] = min(minimum[dimension], coordinate - radius)
+            maximum[dimension] = max(maximum[dimension], coordinate + radius)
+    center = tuple((low + high) / 2 for low, high in zip(minimum, maximum))
+    dimensions = tuple(high - low + 2 * margin for low, high in zip(minimum, maximum))
+    return center, dimensions
+
+
+def write_box_pdb(center, dimensions, path):
+    """Write a box as DOCK showbox PDB
+
+    :param center: x, y, z of the box center
+    :param dimensions: x, y, z edge lengths of the box
+    :param path: PDB file to write
+    """
+    bounds = [
+        (middle - length / 2, middle + length / 2) for middle, length in zip(center, dimensions)
+    ]
+    with open(path, 'w') as box_file:
+        box_file.write('HEADER    CORNERS OF BOX\n')
+        box_file.write('REMARK    CENTER (X Y Z)        {:10.3f}{:10.3f}{:10.3f}\n'.format(*center))
+        box_file.write(
+            'REMARK    DIMENSIONS (X Y Z)    {:10.3f}{:10.3f}{:10.3f}\n'.format(*dimensions))
+        for serial, (name, corner) in enumerate(BOX_CORNERS, start=1):
+            box_file.write(BOX_ATOM.format(
+                serial, name, *(bound[side] for bound, side in zip(bounds, corner))))
+        for conect in BOX_CONECT:
+            box_file.write('CONECT' + ''.join('{:5d}'.format(serial) for serial in conect) + '\n')
+        box_file.write('END\n')
+
+
+def read_grid_spacing(grid_in):
+    """Grid spacing of a DOCK grid input file"""
+    with open(grid_in) as grid_in_file:
+        for line in grid_in_file:
+            columns = line.split()
+            if len(columns) > 1 and columns[0] == 'grid_spacing':
+                return float(columns[1])
+    raise RuntimeError('Did not find grid_spacing in: {}'.format(grid_in))
+
+
+def grid_points(dimensions, spacing):
+    """Number of points of a grid covering a box
+
+    :param dimensions: x, y, z edge lengths of the box
+    :param spacing: grid spacing
+    """
+    points = 1
+    for length in dimensions:
+        points *= math.ceil(length / spacing) + 1
+    return points
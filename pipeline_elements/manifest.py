@@ -0,0 +1,276 @@
+"""Crash safe manifest of the jobs of a docking campaign"""
+from contextlib import contextmanager
+import contextvars
+import json
+import sqlite3
+import time
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+STATUSES = (PENDING, RUNNING, DONE, FAILED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    workflow TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    output TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS elements (
+    job TEXT NOT NULL REFERENCES jobs (name),
+    description TEXT NOT NULL,
+    element TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    outputs TEXT NOT NULL,
+    error TEXT,
+    PRIMARY KEY (job, description)
+);
+'''
+
+# manifest and name of the running job
+_job = contextvars.ContextVar('manifest_job', default=None)
+
+
+class CampaignManifest:
+    """Crash safe manifest of the jobs of a docking campaign
+
+    Every job and every pipeline element run by a scheduler within a job
+    has a status (pending, running, done or failed), an attempt count,
+    start and finish times and its output paths. Status transitions are
+    single SQLite transactions, so the manifest is consistent after a crash
+    at any point. Jobs left running by a crash are returned to pending by
+    recover, so a restart resumes exactly the unfinished jobs without
+    checking any output files.
+    """
+
+    def __init__(self, path):
+        """Crash safe manifest of the jobs of a docking campaign
+
+        :param path: SQLite database file, created if it does not exist
+        """
+        self.path = path
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            # executescript commits by itself
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def __transaction(self):
+        """Connection in an immediate transaction committed on success
+
+        A connection per transaction keeps the manifest usable from
+        scheduler threads and worker processes.
+        """
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute('PRAGMA synchronous = FULL')
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def add_job(self, name, workflow, arguments, output):
+        """Add a pending job unless a job of the name exists
+
+        :param name: unique job name
+        :param workflow: workflow of the job
+        :param arguments: JSON serializable workflow arguments
+        :param output: output directory of the job
+        :return: job was added
+        """
+        with self.__transaction() as connection:
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO jobs (name, workflow, arguments, output) '
+                'VALUES (?, ?, ?, ?)',
+                (name, workflow, json.dumps(arguments, sort_keys=True), output)
+            )
+            return cursor.rowcount == 1
+
+    def job(self, name):
+        """Job record as dictionary with decoded arguments or None"""
+        with self.__transaction() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE name = ?', (name,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def jobs(self, status=None):
+        """Job records as dictionaries in insertion order
+
+        :param status: only jobs of this status, all jobs if None
+        """
+        with self.__transaction() as connection:
+            if status is None:
+                rows = connection.execute('SELECT * FROM jobs ORDER BY rowid').fetchall()
+            else:
+                rows = connection.execute(
+                    'SELECT * FROM jobs WHERE status = ? ORDER BY rowid', (status,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def elements(self, job):
+        """Element records of a job as dictionaries in start order"""
+        with self.__transaction() as connection:
+            rows = connection.execute(
+                'SELECT * FROM elements WHERE job = ? ORDER BY rowid', (job,)).fetchall()
+        elements = []
+        for row in rows:
+            element = dict(row)
+            element['outputs'] = json.loads(element['outputs'])
+            element['cached'] = bool(element['cached'])
+            elements.append(element)
+        return elements
+
+    def counts(self):
+        """Number of jobs by status"""
+        counts = dict.fromkeys(STATUSES, 0)
+        with self.__transaction() as connection:
+            for status, count in connection.execute(
+                    'SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+                counts[status] = count
+        return counts
+
+    def recover(self):
+        """Return jobs and elements left running by a crash to pending
+
+        :return: number of recovered jobs
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE elements SET status = ? WHERE status = ?', (PENDING, RUNNING))
+            return connection.execute(
+                'UPDATE jobs SET status = ? WHERE status = ?', (PENDING, RUNNING)).rowcount
+
+    def unfinished(self, max_attempts=None):
+        """Names of pending jobs and failed jobs with attempts left in insertion order
+
+        :param max_attempts: maximum attempts of a job, failed jobs are not retried if None
+        """
+        with self.__transaction() as connection:
+            rows = connection.execute(
+                'SELECT name FROM jobs WHERE status = ? OR (status = ? AND attempts < ?) '
+                'ORDER BY rowid',
+                (PENDING, FAILED, max_attempts or 0)
+            ).fetchall()
+        return [row['name'] for row in rows]
+
+    def start_job(self, name):
+        """Atomically move a pending or failed job to running
+
+        :return: job was started, False if it is running or done
+        """
+        with self.__transaction() as connection:
+            return connection.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, started = ?, '
+                'finished = NULL, error = NULL WHERE name = ? AND status IN (?, ?)',
+                (RUNNING, time.time(), name, PENDING, FAILED)
+            ).rowcount == 1
+
+    def finish_job(self, name, error=None):
+        """Move a running job to done or to failed with an error"""
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, finished = ?, error = ? '
+                'WHERE name = ? AND status = ?',
+                (DONE if error is None else FAILED, time.time(), error, name, RUNNING)
+            )
+
+    def start_element(self, job, description, element, outputs):
+        """Record a pipeline element of a job as running
+
+        :param job: job name
+        :param description: description of the step
+        :param element: class name of the pipeline element
+        :param outputs: output files of the pipeline element
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                'INSERT INTO elements (job, description, element, status, attempts, started, '
+                'outputs) VALUES (?, ?, ?, ?, 1, ?, ?) '
+                'ON CONFLICT (job, description) DO UPDATE SET element = excluded.element, '
+                'status = excluded.status, attempts = attempts + 1, cached = 0, '
+                'started = excluded.started, finished = NULL, outputs = excluded.outputs, '
+                'error = NULL',
+                (job, description, element, RUNNING, time.time(), json.dumps(outputs))
+            )
+
+    def finish_element(self, job, description, error=None, cached=False):
+        """Move a running pipeline element of a job to done or to failed with an error"""
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE elements SET status = ?, cached = ?, finished = ?, error = ? '
+                'WHERE job = ? AND description = ?',
+                (DONE if error is None else FAILED, int(cached), time.time(), error, job,
+                 description)
+            )
+
+
+def _job_dict(row):
+    """Job row as dictionary with decoded arguments"""
+    job = dict(row)
+    job['arguments'] = json.loads(job['arguments'])
+    return job
+
+
+@contextmanager
+def job_status(manifest, name):
+    """Run a job of a manifest, the job is done on success and failed on an exception
+
+    Pipeline elements run by schedulers within the job are recorded as
+    elements of the job.
+
+    :param manifest: campaign manifest
+    :param name: name of a pending or failed job
+    """
+    if not manifest.start_job(name):
+        raise RuntimeError('Job is not pending or failed: {}'.format(name))
+    token = _job.set((manifest, name))
+    try:
+        yield
+    except Exception as error:
+        manifest.finish_job(name, error=str(error) or type(error).__name__)
+        raise
+    finally:
+        _job.reset(token)
+    manifest.finish_job(name)
+
+
+@contextmanager
+def element_status(description, element):
+    """Record a pipeline element run in the manifest of the running job
+
+    :param description: description of the step
+    :param element: pipeline element
+    :return: status record, cached can be set on it, None if no job is running
+    """
+    job = _job.get()
+    if job is None:
+        yield None
+        return
+    manifest, name = job
+    manifest.start_element(
+        name, description, type(element).__name__, [str(output) for output in element.outputs])
+    status = {'cached': False}
+    try:
+        yield status
+    except Exception as error:
+        manifest.finish_element(name, description, error=str(error) or type(error).__name__)
+        raise
+    manifest.finish_element(name, description, cached=status['cached'])
@@ -0,0 +1,240 @@
+"""Streaming reader and writer of MOL2 files"""
+from array import array
+
+HEADER = b'##########'
+MOLECULE = b'@<TRIPOS>MOLECULE'
+
+
+class Molecule:
+    """Molecule of a MOL2 file
+
+    Atom and bond records are only parsed on first access. Coordinates and
+    bonds are kept in flat arrays instead of per atom objects.
+    """
+    __slots__ = (
+        'headers', 'title', 'text', 'source', 'offset', 'length',
+        '_atom_ids', '_atom_names', '_atom_types', '_coordinates', '_charges', '_bonds',
+        '_bond_types'
+    )
+
+    def __init__(self, headers, title, text, source=None, offset=0, length=0):
+        """Molecule of a MOL2 file
+
+        :param headers: fields of the ########## header lines in order
+        :param title: molecule name of the MOLECULE record
+        :param text: complete text of the molecule or None if only the headers were read
+        :param source: file the molecule was read from
+        :param offset: byte offset of the molecule in its file
+        :param length: byte length of the molecule in its file
+        """
+        self.headers = headers
+        self.title = title
+        self.text = text
+        self.source = source
+        self.offset = offset
+        self.length = length
+        self._atom_ids = None
+        self._atom_names = None
+        self._atom_types = None
+        self._coordinates = None
+        self._charges = None
+        self._bonds = None
+        self._bond_types = None
+
+    @property
+    def name(self):
+        """Name from the headers or the MOLECULE record"""
+        return self.headers.get('Name', self.title)
+
+    def value(self, field):
+        """Numeric value of a header field or None if it is missing"""
+        value = self.headers.get(field)
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    @property
+    def atom_ids(self):
+        """Atom ids as array"""
+        self.__parse()
+        return self._atom_ids
+
+    @property
+    def atom_names(self):
+        """Atom names"""
+        self.__parse()
+        return self._atom_names
+
+    @property
+    def atom_types(self):
+        """SYBYL atom types"""
+        self.__parse()
+        return self._atom_types
+
+    @property
+    def coordinates(self):
+        """Flat array of x, y, z of all atoms"""
+        self.__parse()
+        return self._coordinates
+
+    @property
+    def charges(self):
+        """Partial charges as array, 0 if the record has none"""
+        self.__parse()
+        return self._charges
+
+    @property
+    def bonds(self):
+        """Flat array of origin and target atom id of all bonds"""
+        self.__parse()
+        return self._bonds
+
+    @property
+    def bond_types(self):
+        """Bond types"""
+        self.__parse()
+        return self._bond_types
+
+    def __len__(self):
+        return len(self.atom_ids)
+
+    def coordinate(self, index):
+        """Coordinates of an atom by index"""
+        coordinates = self.coordinates
+        return coordinates[3 * index], coordinates[3 * index + 1], coordinates[3 * index + 2]
+
+    def bond(self, index):
+        """Origin and target atom id of a bond by index"""
+        return self.bonds[2 * index], self.bonds[2 * index + 1]
+
+    def __parse(self):
+        if self._atom_ids is not None:
+            return
+        if self.text is None:
+            raise RuntimeError('Atoms of molecule were not read: {}'.format(self.name))
+        self._atom_ids = array('l')
+        self._atom_names = []
+        self._atom_types = []
+        self._coordinates = array('d')
+        self._charges = array('d')
+        self._bonds = array('l')
+        self._bond_types = []
+        section = None
+        for line in self.text.splitlines():
+            if line.startswith('@<TRIPOS>'):
+                section = line.strip()
+                continue
+            columns = line.split()
+            if not columns:
+                continue
+            if section == '@<TRIPOS>ATOM':
+                self._atom_ids.append(int(columns[0]))
+                self._atom_names.append(columns[1])
+                self._coordinates.extend(
+                    (float(columns[2]), float(columns[3]), float(columns[4])))
+                self._atom_types.append(columns[5])
+                self._charges.append(float(columns[8]) if len(columns) > 8 else 0.0)
+            elif section == '@<TRIPOS>BOND':
+                self._bonds.extend((int(columns[1]), int(columns[2])))
+                self._bond_types.append(columns[3])
+
+
+def read_molecules(path, header_only=False):
+    """Lazily read the molecules of a MOL2 file
+
+    Comment and ########## header lines belong to the molecule that
+    follows them. Memory is bounded by the largest molecule.
+
+    :param path: MOL2 file
+    :param header_only: only keep headers, name and position, not the molecule text
+    :return: generator of molecules
+    """
+    with open(path, 'rb') as mol2_file:
+        block = _Block(path, 0, header_only)
+        offset = 0
+        title_next = False
+        for line in mol2_file:
+            is_molecule = line.startswith(MOLECULE)
+            if block.started and (is_molecule or line.startswith(b'#')):
+                yield block.molecule(offset)
+                block = _Block(path, offset, header_only)
+            if line.startswith(HEADER):
+                field, _separator, value = line[len(HEADER):].partition(b':')
+                block.headers[field.decode('utf8', 'replace').strip()] = \
+                    value.decode('utf8', 'replace').strip()
+            elif is_molecule:
+                block.started = True
+                title_next = True
+            elif title_next:
+                block.title = line.decode('utf8', 'replace').strip()
+                title_next = False
+            if not header_only:
+                block.lines.append(line)
+            offset += len(line)
+        if block.started:
+            yield block.molecule(offset)
+
+
+class _Block:
+    """Molecule under construction while reading"""
+    __slots__ = ('source', 'offset', 'header_only', 'headers', 'title', 'lines', 'started')
+
+    def __init__(self, source, offset, header_only):
+        self.source = source
+        self.offset = offset
+        self.header_only = header_only
+        self.headers = {}
+        self.title = None
+        self.lines = []
+        self.started = False
+
+    def molecule(self, end):
+        text = None if self.header_only else b''.join(self.lines).decode('utf8', 'replace')
+        return Molecule(
+            self.headers, self.title, text,
+            source=self.source, offset=self.offset, length=end - self.offset
+        )
+
+
+class Mol2Writer:
+    """Streaming writer of MOL2 files
+
+    Molecules are written from their text or, if only their headers were
+    read, copied byte for byte from their source file.
+    """
+
+    def __init__(self, path):
+        """Streaming writer of MOL2 files
+
+        :param path: MOL2 file to write
+        """
+        self.path = path
+        self.__file = open(path, 'wb')
+        self.__sources = {}
+
+    def write(self, molecule):
+        """Write a molecule"""
+        if molecule.text is None:
+            if molecule.source not in self.__sources:
+                self.__sources[molecule.source] = open(molecule.source, 'rb')
+            source = self.__sources[molecule.source]
+            source.seek(molecule.offset)
+            self.__file.write(source.read(molecule.length))
+        else:
+            self.__file.write(molecule.text.encode('utf8'))
+
+    def close(self):
+        """Close the written file and all source files"""
+        for source in self.__sources.values():
+            source.close()
+        self.__sources = {}
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exception):
+        self.close()
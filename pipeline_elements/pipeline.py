@@ -1,15 +1,21 @@
 """Common pipeline functionality"""
 from abc import ABC, abstractmethod
 import logging
-import subprocess
 import os
 
+from pipeline_elements.process import run_process, run_process_async
+
 # parent directory of the pipeline_elements directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class PipelineElement(ABC):
     """Pipeline element abstract class"""
+    # config['Binaries'] and config['Parameters'] keys the output depends on
+    BINARIES = ()
+    PARAMETERS = ()
+    # output can be reused if the fingerprint of the element is unchanged
+    CACHEABLE = True
 
     @abstractmethod
     def run(self, recalc=False):
@@ -19,15 +25,41 @@ class PipelineElement(ABC):
     def output_exists(self):
         """Pipeline element output exists"""
 
+    @property
+    def inputs(self):
+        """Files the pipeline element reads"""
+        return []
+
+    @property
+    def outputs(self):
+        """Files the pipeline element writes"""
+        return []
+
+    @staticmethod
+    def _commandline(args, cwd=None, input=None, log=None):
+        """run a commandline call from a pipeline element with logging
+
+        :param log: file the output of the call is streamed to
+        """
+        logging.debug('running: %s', ' '.join(args))
+        if cwd:
+            logging.debug('in: %s', cwd)
+        if log:
+            logging.debug('log: %s', log)
+        run_process(args, cwd=cwd, input=input, log=log)
+
     @staticmethod
-    def _commandline(args, cwd=None, input=None):
-        """run a commandline call from a pipeline element with logging"""
+    async def _commandline_async(args, cwd=None, input=None, log=None):
+        """awaitable commandline call from a pipeline element with logging
+
+        :param log: file the output of the call is streamed to
+        """
         logging.debug('running: %s', ' '.join(args))
         if cwd:
             logging.debug('in: %s', cwd)
-        output = subprocess.check_output(args, cwd=cwd, input=input, stderr=subprocess.STDOUT)
-        if output:
-            logging.debug(output.decode('utf8'))
+        if log:
+            logging.debug('log: %s', log)
+        await run_process_async(args, cwd=cwd, input=input, log=log)
 
     @staticmethod
     def _files_must_exist(files):
@@ -1,21 +1,33 @@
 """Protein-ligand preparation for a DOCK workflow"""
 import argparse
 import configparser
+import csv
+import hashlib
 import logging
 import os
 
 from pipeline_elements import PipelineElement, BASE_DIR
+from pipeline_elements.geometry import SpatialHash
+from pipeline_elements.mol2 import read_molecules
+
+# residues never part of an active site
+EXCLUDED_RESIDUES = ('HOH',)
 
 
 class Preparation(PipelineElement):
     """Protein-ligand preparation for a DOCK workflow"""
+    BINARIES = ('chimera',)
+    PARAMETERS = ('active_site_radius',)
 
     def __init__(self, ligand, output, config, protein=None, name=None):
         """Protein-ligand preparation for a DOCK workflow
 
         Protein and ligand will be processed into an active site of 15Å around
         the ligand in MOL2 format and a ligand in MOL2 format. If only a ligand
-        is given the ligand will be converted.
+        is given the ligand will be converted. The active site consists of all
+        whole residues with an atom within the radius of a ligand atom except
+        water. It is cut natively and converted to MOL2 by the same chimera
+        process that converts the ligand.
 
         :param protein: path to the protein as PDB
         :param ligand: path to the ligand as SDF
@@ -36,6 +48,8 @@ class Preparation(PipelineElement):
         self.active_site_pdb = os.path.join(self.output, self.name + '_active_site.pdb')
         self.active_site_mol2 = os.path.join(self.output, self.name + '_active_site.mol2')
         self.converted_ligand = os.path.join(self.output, self.name + '_ligand.mol2')
+        self.converted_ligand_template = os.path.join(
+            BASE_DIR, 'templates', 'write_converted_ligand.py.template')
 
     def run(self, _recalc=False):
         """Run protein-ligand preparation"""
@@ -46,9 +60,17 @@ class Preparation(PipelineElement):
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
+        conversions = [(self.ligand, self.converted_ligand)]
         if self.protein and self.ligand:
-            self.__write_active_site()
-        self.__convert_ligand()
+            write_active_site(
+                self.protein,
+                self.ligand,
+                float(self.config['Parameters']['active_site_radius']),
+                self.active_site_pdb
+            )
+            conversions.insert(0, (self.active_site_pdb, self.active_site_mol2))
+        convert_ligands(conversions, self.converted_ligand_template, self.output, self.config)
+        PipelineElement._files_must_exist([converted for _source, converted in conversions])
         return self
 
     def output_exists(self):
@@ -57,50 +79,262 @@ class Preparation(PipelineElement):
             files.extend([self.active_site_pdb, self.active_site_mol2])
         return PipelineElement._files_exist(files)
 
-    def __write_active_site(self):
-        # I wrote a python script in a python script so I could write python while I write python
-        script_template_path = os.path.join(BASE_DIR, 'templates', 'write_active_site.py.template')
-        with open(script_template_path) as script_template:
-            script = script_template.read()
-        script = script.format(
-            protein=self.protein,
-            ligand=self.ligand,
-            radius=self.config['Parameters']['active_site_radius'],
-            active_site_pdb=self.active_site_pdb,
-            active_site_mol2=self.active_site_mol2
-        )
-        script_path = os.path.join(self.output, 'write_active_site.py')
-        logging.debug(script)
-        with open(script_path, 'w') as script_file:
-            script_file.write(script)
-        args = [
-            self.config['Binaries']['chimera'],
-            '--nogui',
-            script_path
+    @property
+    def inputs(self):
+        if self.protein:
+            return [self.ligand, self.protein, self.converted_ligand_template]
+        return [self.ligand, self.converted_ligand_template]
+
+    @property
+    def outputs(self):
+        if self.protein:
+            return [self.converted_ligand, self.active_site_pdb, self.active_site_mol2]
+        return [self.converted_ligand]
+
+
+class BatchPreparation(PipelineElement):
+    """Ligand conversion of many ligands in a single chimera process"""
+    BINARIES = ('chimera',)
+
+    def __init__(self, ligands, output, config, names=None):
+        """Ligand conversion of many ligands in a single chimera process
+
+        Starting chimera dominates the conversion of a small molecule, so all
+        ligands are converted by one script. Ligands that fail to convert are
+        collected in failed instead of failing the whole batch.
+
+        :param ligands: paths to the ligands as SDF
+        :param output: output directory for final and intermediate files
+        :param config: config object
+        :param names: names of the converted ligands, defaults to the ligand file names
+        """
+        if not ligands:
+            raise RuntimeError('At least one ligand required')
+        self.ligands = [os.path.abspath(ligand) for ligand in ligands]
+        if not names:
+            names = [
+                os.path.splitext(os.path.basename(ligand))[0] for ligand in self.ligands
+            ]
+        if len(names) != len(self.ligands) or len(set(names)) != len(names):
+            raise RuntimeError('Ligand names must be unique and match the ligands')
+        self.output = os.path.abspath(output)
+        self.config = config
+        self.converted_ligands = [
+            os.path.join(self.output, name + '_ligand.mol2') for name in names
         ]
-        PipelineElement._commandline(args)
-        PipelineElement._files_must_exist([self.active_site_pdb, self.active_site_mol2])
-
-    def __convert_ligand(self):
-        script_template_path = os.path.join(
-            BASE_DIR,
-            'templates',
-            'write_converted_ligand.py.template'
-        )
-        with open(script_template_path) as script_template:
-            script = script_template.read()
-        script = script.format(
-            ligand=self.ligand,
-            converted_ligand=self.converted_ligand
-        )
-        script_path = os.path.join(self.output, 'write_converted_ligand.py')
-        logging.debug(script)
-        with open(script_path, 'w') as script_file:
-            script_file.write(script)
-        args = [
-            self.config['Binaries']['chimera'],
-            '--nogui',
-            script_path
+        self.converted_ligand_template = os.path.join(
+            BASE_DIR, 'templates', 'write_converted_ligand.py.template')
+        self.conversions = os.path.join(self.output, 'conversions.tsv')
+        self.failed = []
+
+    def run(self, recalc=False):
+        """Run batch ligand conversion
+
+        Only ligands that are new, changed or whose conversion is missing
+        are converted. Ligands that failed to convert before are not retried
+        unless they changed.
+
+        :param recalc: convert all ligands
+        """
+        PipelineElement._files_must_exist(self.ligands)
+        if not os.path.exists(self.output):
+            os.mkdir(self.output)
+        recorded = {} if recalc else self.__read_conversions()
+        digests = {}
+        stale = []
+        for ligand, converted_ligand in zip(self.ligands, self.converted_ligands):
+            digests[converted_ligand] = self.__digest(ligand)
+            record = recorded.get(converted_ligand)
+            if record and record[0] == digests[converted_ligand] and \
+                    (record[1] == 'failed' or is_converted(converted_ligand)):
+                continue
+            # stale conversions must not pass validation
+            if os.path.exists(converted_ligand):
+                os.remove(converted_ligand)
+            stale.append((ligand, converted_ligand))
+
+        if stale:
+            convert_ligands(stale, self.converted_ligand_template, self.output, self.config)
+        self.failed = [
+            ligand for ligand, converted_ligand in zip(self.ligands, self.converted_ligands)
+            if not is_converted(converted_ligand)
         ]
-        PipelineElement._commandline(args)
-        PipelineElement._files_must_exist([self.converted_ligand])
+        for ligand in self.failed:
+            logging.warning('ligand conversion failed: %s', ligand)
+        with open(self.conversions, 'w', newline='') as conversions_file:
+            writer = csv.writer(conversions_file, delimiter='\t')
+            for converted_ligand in self.converted_ligands:
+                writer.writerow([
+                    converted_ligand,
+                    digests[converted_ligand],
+                    'converted' if is_converted(converted_ligand) else 'failed'
+                ])
+        return self
+
+    def __digest(self, ligand):
+        """Digest of a ligand and the conversion script template"""
+        digest = hashlib.sha256()
+        for path in (ligand, self.converted_ligand_template):
+            with open(path, 'rb') as input_file:
+                digest.update(input_file.read())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def __read_conversions(self):
+        """Digest and outcome of the last conversion by converted ligand"""
+        if not os.path.exists(self.conversions):
+            return {}
+        with open(self.conversions, newline='') as conversions_file:
+            return {
+                converted_ligand: (digest, outcome)
+                for converted_ligand, digest, outcome
+                in csv.reader(conversions_file, delimiter='\t')
+            }
+
+    def output_exists(self):
+        """Every ligand was converted or failed to convert in the last run"""
+        recorded = self.__read_conversions()
+        return all(
+            converted_ligand in recorded
+            and (recorded[converted_ligand][1] == 'failed' or os.path.exists(converted_ligand))
+            for converted_ligand in self.converted_ligands
+        )
+
+    @property
+    def inputs(self):
+        return self.ligands + [self.converted_ligand_template]
+
+    @property
+    def outputs(self):
+        return self.converted_ligands + [self.conversions]
+
+
+def convert_ligands(conversions, template, output, config):
+    """Convert ligands to MOL2 with a single chimera process
+
+    :param conversions: pairs of ligand and converted ligand paths
+    :param template: conversion script template
+    :param output: directory to write the script and log to
+    :param config: config object
+    """
+    with open(template) as script_template:
+        script = script_template.read()
+    script = script.format(ligands=repr([tuple(conversion) for conversion in conversions]))
+    script_path = os.path.join(output, 'write_converted_ligand.py')
+    logging.debug(script)
+    with open(script_path, 'w') as script_file:
+        script_file.write(script)
+    args = [
+        config['Binaries']['chimera'],
+        '--nogui',
+        script_path
+    ]
+    PipelineElement._commandline(args, log=os.path.join(output, 'write_converted_ligand.log'))
+
+
+def is_converted(converted_ligand):
+    """Whether a converted ligand was written as MOL2"""
+    try:
+        with open(converted_ligand) as converted_ligand_file:
+            for line in converted_ligand_file:
+                if line.startswith('@<TRIPOS>MOLECULE'):
+                    return True
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def write_active_site(protein, ligand, radius, active_site_pdb):
+    """Write all residues of a protein near a ligand as PDB
+
+    Whole residues with any atom closer than radius to any ligand atom are
+    selected, water excluded. Records keep their serials and CONECT records
+    between selected atoms are kept.
+
+    :param protein: protein PDB
+    :param ligand: ligand SDF, MOL2 or PDB
+    :param radius: selection radius in Å
+    :param active_site_pdb: active site PDB to write
+    :return: number of selected atoms
+    """
+    ligand_hash = SpatialHash(read_coordinates(ligand), radius)
+    if not ligand_hash.points:
+        raise RuntimeError('Did not find ligand atoms in: {}'.format(ligand))
+
+    atom_records = []
+    conect_records = []
+    selected_residues = set()
+    with open(protein) as protein_file:
+        for line in protein_file:
+            if line.startswith(('ATOM', 'HETATM')):
+                residue = (line[21], line[22:27], line[17:20].strip())
+                atom_records.append((residue, line))
+                if residue in selected_residues or residue[2] in EXCLUDED_RESIDUES:
+                    continue
+                if ligand_hash.any_within(_pdb_coordinates(line), radius):
+                    selected_residues.add(residue)
+            elif line.startswith('CONECT'):
+                conect_records.append(line)
+            elif line.startswith('ENDMDL'):
+                break  # only the first model
+
+    selected_serials = set()
+    with open(active_site_pdb, 'w') as active_site_file:
+        for residue, line in atom_records:
+            if residue in selected_residues:
+                selected_serials.add(line[6:11].strip())
+                active_site_file.write(line)
+        for line in conect_records:
+            serials = [line[start:start + 5].strip() for start in range(6, len(line.rstrip()), 5)]
+            if serials[0] not in selected_serials:
+                continue
+            bonded = [serial for serial in serials[1:] if serial in selected_serials]
+            if bonded:
+                active_site_file.write(
+                    'CONECT' + ''.join('{:>5}'.format(serial) for serial in serials[:1] + bonded)
+                    + '\n'
+                )
+        active_site_file.write('END\n')
+    return len(selected_serials)
+
+
+def read_coordinates(molecule):
+    """Atom coordinates of the first molecule in an SDF, MOL2 or PDB file"""
+    extension = os.path.splitext(molecule)[1].lower()
+    if extension == '.mol2':
+        for mol2_molecule in read_molecules(molecule):
+            return [
+                mol2_molecule.coordinate(index) for index in range(len(mol2_molecule))
+            ]
+        return []
+    with open(molecule) as molecule_file:
+        if extension == '.pdb':
+            return [
+                _pdb_coordinates(line) for line in molecule_file
+                if line.startswith(('ATOM', 'HETATM'))
+            ]
+        return _sdf_coordinates(molecule_file)
+
+
+def _pdb_coordinates(line):
+    return float(line[30:38]), float(line[38:46]), float(line[46:54])
+
+
+def _sdf_coordinates(sdf_file):
+    counts = [sdf_file.readline() for _line in range(4)][3]
+    coordinates = []
+    if 'V3000' in counts:
+        in_atoms = False
+        for line in sdf_file:
+            if line.startswith('M  V30 BEGIN ATOM'):
+                in_atoms = True
+            elif line.startswith('M  V30 END ATOM'):
+                break
+            elif in_atoms:
+                columns = line.split()
+                coordinates.append((float(columns[4]), float(columns[5]), float(columns[6])))
+        return coordinates
+    for _atom in range(int(counts[0:3])):
+        line = sdf_file.readline()
+        coordinates.append((float(line[0:10]), float(line[10:20]), float(line[20:30])))
+    return coordinates
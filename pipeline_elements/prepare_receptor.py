@@ -5,11 +5,19 @@ import logging
 import os
 
 from pipeline_elements import PipelineElement, BASE_DIR, ProtossRun, Preparation, \
-    SphereGeneration, GridGeneration
+    SphereGeneration, GridGeneration, Scheduler, DirectoryStore
+from pipeline_elements.store import copy_tree
 
 
 class ReceptorPreparation(PipelineElement):
-    """Receptor Preparation for a DOCK workflow"""
+    """Receptor Preparation for a DOCK workflow
+
+    If a receptor store is configured, prepared receptors are shared between
+    output directories. They are keyed by the protein, the native ligand and
+    the preparation parameters.
+    """
+    # the receptor preparation steps are cached individually
+    CACHEABLE = False
 
     def __init__(self, protein, native_ligand, output, config):
         """Receptor Preparation for a DOCK workflow
@@ -82,24 +90,61 @@ class ReceptorPreparation(PipelineElement):
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        logging.debug('protoss')
-        if recalc or not self.__protoss_run.output_exists():
-            self.__protoss_run.run()
-
-        logging.debug('preparation')
-        if recalc or not self.__preparation.output_exists():
-            self.__preparation.run()
-
-        logging.debug('sphere generation')
-        if recalc or not self.__sphere_generation.output_exists():
-            self.__sphere_generation.run()
-
-        logging.debug('grid generation')
-        if recalc or not self.__grid_generation.output_exists():
-            self.__grid_generation.run()
+        receptor_store = self.__receptor_store()
+        if receptor_store:
+            PipelineElement._files_must_exist([self.protein, self.native_ligand])
+            key = self.__receptor_key()
+            entry = receptor_store.get(key)
+            if entry and not recalc and not self.output_exists():
+                logging.info('using stored receptor: %s', key)
+                copy_tree(entry, self.output)
+
+        # steps copied from the receptor store are skipped on fingerprint hits
+        scheduler = Scheduler(self.config.getint('Execution', 'workers', fallback=1))
+        scheduler.add(self.__protoss_run, 'protoss')
+        scheduler.add(self.__preparation, 'preparation')
+        scheduler.add(self.__sphere_generation, 'sphere generation')
+        scheduler.add(self.__grid_generation, 'grid generation')
+        scheduler.run(recalc)
+
+        if receptor_store:
+            receptor_store.add(
+                key,
+                self.output,
+                description='{} {}'.format(
+                    os.path.basename(self.protein), os.path.basename(self.native_ligand))
+            )
         return self
 
+    def __receptor_store(self):
+        root = self.config.get('Execution', 'receptor_store', fallback='')
+        if not root:
+            return None
+        budget = self.config.getint('Execution', 'receptor_store_budget', fallback=0)
+        return DirectoryStore(root, budget * 1024 * 1024 if budget else None)
+
+    def __receptor_key(self):
+        parameters = set()
+        for element in [self.__protoss_run, self.__preparation, self.__sphere_generation,
+                        self.__grid_generation]:
+            for parameter in element.PARAMETERS:
+                parameters.add('{}={}'.format(
+                    parameter, self.config.get('Parameters', parameter, fallback='')))
+            for binary in element.BINARIES:
+                parameters.add('{}={}'.format(
+                    binary, self.config.get('Binaries', binary, fallback='')))
+        return DirectoryStore.key([self.protein, self.native_ligand], sorted(parameters))
+
     def output_exists(self):
         return self.__preparation.output_exists() \
                and self.__sphere_generation.output_exists() \
                and self.__grid_generation.output_exists()
+
+    @property
+    def inputs(self):
+        return [self.protein, self.native_ligand]
+
+    @property
+    def outputs(self):
+        return self.__preparation.outputs + self.__sphere_generation.outputs \
+               + self.__grid_generation.outputs
@@ -0,0 +1,93 @@
+"""Streaming execution of external binaries"""
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from pipeline_elements.resources import record_process
+
+# limits the number of concurrently running external binaries in this process
+_limiter = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+
+def set_process_limit(limit):
+    """Limit the number of concurrently running external binaries
+
+    The limit is global to the calling process. Worker processes of a
+    process pool each have their own limit.
+
+    :param limit: maximum number of binaries, number of CPUs if 0 or None
+    """
+    global _limiter
+    _limiter = threading.BoundedSemaphore(limit or os.cpu_count() or 1)
+
+
+def run_process(args, cwd=None, input=None, log=None):
+    """Run an external binary streaming its output line by line
+
+    Output is never buffered as a whole, so memory stays flat for binaries
+    with a lot of output. The binary is reaped with wait4 to record its
+    resource usage in the running resource report.
+
+    :param args: commandline arguments
+    :param cwd: working directory
+    :param input: bytes written to the standard input of the binary
+    :param log: file the output is streamed to, output is logged at debug level if None
+    """
+    with _limiter:
+        log_file = open(log, 'wb') if log else None
+        try:
+            start = time.monotonic()
+            process = subprocess.Popen(
+                args,
+                cwd=cwd,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT
+            )
+            writer = None
+            if input is not None:
+                # feed input from a thread so a binary blocked on output cannot deadlock
+                writer = threading.Thread(target=_write_input, args=(process.stdin, input))
+                writer.start()
+            for line in process.stdout:
+                if log_file:
+                    log_file.write(line)
+                else:
+                    logging.debug(line.decode('utf8', 'replace').rstrip())
+            process.stdout.close()
+            if writer:
+                writer.join()
+            _pid, status, rusage = os.wait4(process.pid, 0)
+            returncode = process.returncode = os.waitstatus_to_exitcode(status)
+            record_process(args, time.monotonic() - start, rusage, returncode)
+        finally:
+            if log_file:
+                log_file.close()
+    if returncode:
+        if log:
+            logging.error('%s failed, output in: %s', args[0], log)
+        raise subprocess.CalledProcessError(returncode, args)
+
+
+async def run_process_async(args, cwd=None, input=None, log=None):
+    """Awaitable version of run_process
+
+    The binary is driven from a worker thread so the event loop stays free
+    and the global process limit applies.
+    """
+    await asyncio.to_thread(run_process, args, cwd=cwd, input=input, log=log)
+
+
+def _write_input(stdin, input):
+    try:
+        stdin.write(input)
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
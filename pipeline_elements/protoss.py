@@ -9,6 +9,7 @@ from pipeline_elements import PipelineElement, BASE_DIR
 
 class ProtossRun(PipelineElement):
     """Perform protonation using protoss"""
+    BINARIES = ('protoss', 'clean_binding_site')
 
     def __init__(self, protein, output, config, ligand=None):
         """Perform protonation using protoss
@@ -52,7 +53,7 @@ class ProtossRun(PipelineElement):
                 '--ligand_input', self.ligand,
                 '--ligand_output', self.protonated_ligand
             ])
-        PipelineElement._commandline(args)
+        PipelineElement._commandline(args, log=os.path.join(self.output, 'protoss.log'))
         files = [self.protonated_protein]
         if self.ligand:
             files.append(self.protonated_ligand)
@@ -65,8 +66,18 @@ class ProtossRun(PipelineElement):
             '-l', self.protonated_ligand,
             '-c', self.protonated_protein
         ]
-        PipelineElement._commandline(args)
+        PipelineElement._commandline(args, log=os.path.join(self.output, 'clean_binding_site.log'))
         PipelineElement._files_must_exist([self.protonated_protein])
 
     def output_exists(self):
         return PipelineElement._files_exist([self.protonated_protein, self.protonated_ligand])
+
+    @property
+    def inputs(self):
+        return [self.protein, self.ligand] if self.ligand else [self.protein]
+
+    @property
+    def outputs(self):
+        if self.ligand:
+            return [self.protonated_protein, self.protonated_ligand]
+        return [self.protonated_protein]
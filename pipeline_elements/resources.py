@@ -0,0 +1,232 @@
+"""Resource accounting of pipeline elements and external binaries"""
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import threading
+import time
+
+from pipeline_elements.store import directory_size
+
+# report of the running workflow and step of the running pipeline element
+_report = contextvars.ContextVar('resource_report', default=None)
+_step = contextvars.ContextVar('resource_step', default=None)
+
+
+class ResourceReport:
+    """Resource usage of the pipeline elements and binaries of a workflow run
+
+    A report collects while it is entered. Every external binary records
+    its wall time, user and system CPU time and peak resident set size, and
+    every pipeline element run by a scheduler records its wall time and the
+    bytes it added to its output directories. Binaries are attributed to the
+    innermost running element. The report follows the context into
+    scheduler threads, worker processes report back through merge.
+    """
+
+    def __init__(self):
+        """Resource usage of the pipeline elements and binaries of a workflow run"""
+        self.started = time.time()
+        self.wall_time = None
+        self.steps = []
+        self.processes = []
+        self.__lock = threading.Lock()
+        self.__start = None
+        self.__token = None
+
+    def __enter__(self):
+        self.__start = time.monotonic()
+        self.__token = _report.set(self)
+        return self
+
+    def __exit__(self, *_exception):
+        _report.reset(self.__token)
+        self.wall_time = time.monotonic() - self.__start
+
+    def add_step(self, step):
+        """Add a step record and return its index"""
+        with self.__lock:
+            self.steps.append(step)
+            return len(self.steps) - 1
+
+    def add_process(self, process):
+        """Add a process record"""
+        with self.__lock:
+            self.processes.append(process)
+
+    def merge(self, report, parent=None):
+        """Merge the dictionary of a report, for example from a worker process
+
+        :param report: report dictionary
+        :param parent: index of the step the merged steps run in
+        """
+        with self.__lock:
+            offset = len(self.steps)
+            for step in report['steps']:
+                step = dict(step)
+                step['parent'] = parent if step['parent'] is None else step['parent'] + offset
+                self.steps.append(step)
+            for process in report['processes']:
+                process = dict(process)
+                process['step'] = parent if process['step'] is None else process['step'] + offset
+                self.processes.append(process)
+
+    def to_dict(self):
+        """Report as dictionary with the process usage summed per step"""
+        with self.__lock:
+            steps = [dict(step, user_time=0.0, system_time=0.0, max_rss=0, processes=0)
+                     for step in self.steps]
+            processes = [dict(process) for process in self.processes]
+        for process in processes:
+            if process['step'] is None:
+                continue
+            step = steps[process['step']]
+            step['user_time'] += process['user_time']
+            step['system_time'] += process['system_time']
+            step['max_rss'] = max(step['max_rss'], process['max_rss'])
+            step['processes'] += 1
+        return {
+            'started': self.started,
+            'wall_time': self.wall_time,
+            'steps': steps,
+            'processes': processes
+        }
+
+    def write(self, path):
+        """Write the report as JSON"""
+        with open(path, 'w') as report_file:
+            json.dump(self.to_dict(), report_file, indent=2)
+
+
+def current_report():
+    """Report of the running workflow or None"""
+    return _report.get()
+
+
+def current_step():
+    """Index of the step of the running pipeline element or None"""
+    return _step.get()
+
+
+def record_process(args, wall_time, rusage, returncode):
+    """Record the resource usage of a finished external binary
+
+    :param args: commandline arguments
+    :param wall_time: wall time in seconds
+    :param rusage: resource usage of the binary from os.wait4
+    :param returncode: exit code of the binary
+    """
+    report = _report.get()
+    if report is None:
+        return
+    report.add_process({
+        'binary': os.path.basename(args[0]),
+        'args': [str(arg) for arg in args],
+        'step': _step.get(),
+        'wall_time': wall_time,
+        'user_time': rusage.ru_utime,
+        'system_time': rusage.ru_stime,
+        # kilobytes on linux
+        'max_rss': rusage.ru_maxrss * 1024,
+        'returncode': returncode
+    })
+
+
+@contextmanager
+def step_usage(description, element):
+    """Record the wall time and output growth of a pipeline element run
+
+    :param description: description of the step
+    :param element: pipeline element
+    :return: step record, cached can be set on it, None if no report is running
+    """
+    report = _report.get()
+    if report is None:
+        yield None
+        return
+    directories = output_directories(element.outputs)
+    size = sum(directory_size(directory) for directory in directories)
+    step = {
+        'description': description,
+        'element': type(element).__name__,
+        'parent': _step.get(),
+        'cached': False,
+        'wall_time': None,
+        'bytes_written': None
+    }
+    index = report.add_step(step)
+    token = _step.set(index)
+    start = time.monotonic()
+    try:
+        yield step
+    finally:
+        step['wall_time'] = time.monotonic() - start
+        _step.reset(token)
+        step['bytes_written'] = max(
+            0, sum(directory_size(directory) for directory in directories) - size)
+
+
+def output_directories(outputs):
+    """Directories of output files without directories nested in others"""
+    directories = sorted({os.path.dirname(os.path.abspath(output)) for output in outputs})
+    outermost = []
+    for directory in directories:
+        if not outermost or os.path.commonpath([outermost[-1], directory]) != outermost[-1]:
+            outermost.append(directory)
+    return outermost
+
+
+def self_wall_times(steps):
+    """Wall time of every step without the wall time of its child steps
+
+    :param steps: step records of a report dictionary
+    :return: list of wall times in the order of the steps
+    """
+    wall_times = [step['wall_time'] or 0.0 for step in steps]
+    for step in steps:
+        if step['parent'] is not None:
+            wall_times[step['parent']] -= step['wall_time'] or 0.0
+    # concurrent child steps can add up to more than their parent
+    return [max(0.0, wall_time) for wall_time in wall_times]
+
+
+def dominant_step(report):
+    """Step of a report dictionary with the longest own wall time
+
+    :param report: report dictionary
+    :return: step record and its own wall time, None if every step was cached
+    """
+    steps = [
+        (step, wall_time)
+        for step, wall_time in zip(report['steps'], self_wall_times(report['steps']))
+        if not step['cached']
+    ]
+    if not steps:
+        return None
+    return max(steps, key=lambda step: step[1])
+
+
+def summarize(reports):
+    """Resource usage summed per step description over reports
+
+    Parent steps, for example a pipeline element running its own scheduler,
+    only count their own wall time, so the wall times add up to the time of
+    the run.
+
+    :param reports: report dictionaries, for example of all targets of a batch run
+    :return: dictionary by description with count, wall_time, user_time,
+        system_time, bytes_written and the largest max_rss
+    """
+    summary = {}
+    for report in reports:
+        for step, wall_time in zip(report['steps'], self_wall_times(report['steps'])):
+            totals = summary.setdefault(step['description'], {
+                'count': 0, 'wall_time': 0.0, 'user_time': 0.0, 'system_time': 0.0,
+                'bytes_written': 0, 'max_rss': 0
+            })
+            totals['count'] += 1
+            totals['wall_time'] += wall_time
+            for key in ('user_time', 'system_time', 'bytes_written'):
+                totals[key] += step[key] or 0
+            totals['max_rss'] = max(totals['max_rss'], step['max_rss'])
+    return summary
@@ -0,0 +1,239 @@
+"""Indexed SQLite store of docked poses"""
+from contextlib import contextmanager
+import os
+import sqlite3
+import time
+
+from pipeline_elements import PipelineElement
+from pipeline_elements.mol2 import read_molecules
+from pipeline_elements.rmsd_analysis import RmsdAnalysis
+
+# pose column to DOCK header field
+COLUMNS = RmsdAnalysis.COLUMNS
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY,
+    receptor TEXT,
+    source TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    poses INTEGER NOT NULL,
+    ingested REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS poses (
+    run TEXT NOT NULL REFERENCES runs (run),
+    pose INTEGER NOT NULL,
+    ligand TEXT NOT NULL,
+    receptor TEXT,
+    {columns},
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (run, pose)
+);
+CREATE INDEX IF NOT EXISTS poses_grid_score ON poses (grid_score);
+CREATE INDEX IF NOT EXISTS poses_receptor ON poses (receptor, grid_score);
+CREATE INDEX IF NOT EXISTS poses_ligand ON poses (ligand, grid_score);
+'''.format(columns=',\n    '.join('{} REAL'.format(column) for column in COLUMNS))
+POSE_COLUMNS = ('run', 'pose', 'ligand', 'receptor') + tuple(COLUMNS) + ('offset', 'length')
+
+
+class ResultsStore:
+    """Indexed SQLite store of docked poses
+
+    Every pose of an ingested docked file is a row with the DOCK header
+    fields of RmsdAnalysis.COLUMNS, its ligand name, receptor, run id and
+    the byte offset and length of the pose in the docked file. Top hits,
+    per receptor leaderboards and comparisons of a ligand across runs are
+    index lookups. The pose itself is read back from the docked file.
+    """
+
+    def __init__(self, path):
+        """Indexed SQLite store of docked poses
+
+        :param path: SQLite database file, created if it does not exist
+        """
+        self.path = path
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def __connection(self):
+        """Connection committed on success and closed afterwards"""
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def is_ingested(self, docked, run):
+        """A run was ingested from the current version of a docked file"""
+        if not os.path.exists(docked):
+            return False
+        stat = os.stat(docked)
+        with self.__connection() as connection:
+            row = connection.execute(
+                'SELECT source, size, mtime_ns FROM runs WHERE run = ?', (run,)).fetchone()
+        return row is not None and tuple(row) == (
+            os.path.abspath(docked), stat.st_size, stat.st_mtime_ns)
+
+    def ingest(self, docked, run, receptor=None):
+        """Replace the poses of a run with the poses of a docked file
+
+        :param docked: docked MOL2 file with DOCK headers
+        :param run: run id, for example the output directory of the workflow
+        :param receptor: receptor the poses were docked into
+        :return: number of ingested poses
+        """
+        docked = os.path.abspath(docked)
+        stat = os.stat(docked)
+        rows = (
+            (run, index, pose.name, receptor)
+            + tuple(pose.value(field) for field in COLUMNS.values())
+            + (pose.offset, pose.length)
+            for index, pose in enumerate(read_molecules(docked, header_only=True))
+        )
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM poses WHERE run = ?', (run,))
+            poses = connection.executemany(
+                'INSERT INTO poses ({}) VALUES ({})'.format(
+                    ', '.join(POSE_COLUMNS), ', '.join('?' * len(POSE_COLUMNS))),
+                rows
+            ).rowcount
+            connection.execute(
+                'INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (run, receptor, docked, stat.st_size, stat.st_mtime_ns, poses, time.time())
+            )
+        return poses
+
+    def runs(self):
+        """Ingested runs as dictionaries"""
+        with self.__connection() as connection:
+            return [dict(row) for row in connection.execute('SELECT * FROM runs ORDER BY run')]
+
+    def top_hits(self, limit=10, receptor=None):
+        """Poses with the best grid scores
+
+        :param limit: maximum number of poses
+        :param receptor: only poses docked into this receptor, all if None
+        :return: pose dictionaries from best to worst
+        """
+        query = 'SELECT * FROM poses WHERE grid_score IS NOT NULL'
+        parameters = ()
+        if receptor is not None:
+            query += ' AND receptor = ?'
+            parameters = (receptor,)
+        query += ' ORDER BY grid_score LIMIT ?'
+        return self.__poses(query, parameters + (limit,))
+
+    def leaderboard(self, receptor, limit=10):
+        """Best pose of every ligand docked into a receptor
+
+        :param receptor: receptor
+        :param limit: maximum number of ligands
+        :return: pose dictionaries from best to worst ligand
+        """
+        return self.__poses(
+            'SELECT *, MIN(grid_score) FROM poses WHERE receptor = ? AND grid_score IS NOT NULL '
+            'GROUP BY ligand ORDER BY grid_score LIMIT ?',
+            (receptor, limit)
+        )
+
+    def compare(self, ligand):
+        """Best pose of a ligand in every run
+
+        :param ligand: ligand name
+        :return: pose dictionaries from best to worst run
+        """
+        return self.__poses(
+            'SELECT *, MIN(grid_score) FROM poses WHERE ligand = ? AND grid_score IS NOT NULL '
+            'GROUP BY run ORDER BY grid_score',
+            (ligand,)
+        )
+
+    def pose(self, run, pose):
+        """Pose dictionary of a run by index or None"""
+        poses = self.__poses('SELECT * FROM poses WHERE run = ? AND pose = ?', (run, pose))
+        return poses[0] if poses else None
+
+    def pose_text(self, pose):
+        """MOL2 text of a pose dictionary read from its docked file"""
+        with self.__connection() as connection:
+            source, = connection.execute(
+                'SELECT source FROM runs WHERE run = ?', (pose['run'],)).fetchone()
+        with open(source, 'rb') as docked:
+            docked.seek(pose['offset'])
+            return docked.read(pose['length']).decode('utf8', 'replace')
+
+    def __poses(self, query, parameters):
+        with self.__connection() as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        return [{column: row[column] for column in POSE_COLUMNS} for row in rows]
+
+
+class ResultsIngestion(PipelineElement):
+    """Ingestion of a docked file into a results store
+
+    Ingestion replaces the poses of the run, so it is idempotent and skipped
+    if the run was ingested from the current docked file.
+    """
+    # the store is shared between runs and tracks ingested files itself
+    CACHEABLE = False
+
+    def __init__(self, docked, store, run, receptor=None):
+        """Ingestion of a docked file into a results store
+
+        :param docked: docked MOL2 file with DOCK headers
+        :param store: SQLite database file of the results store
+        :param run: run id, for example the output directory of the workflow
+        :param receptor: receptor the poses were docked into
+        """
+        self.docked = os.path.abspath(docked)
+        self.store = os.path.abspath(store)
+        self.run_id = run
+        self.receptor = receptor
+        self.poses = None
+
+    def run(self, recalc=False):
+        """Run ingestion
+
+        :param recalc: ingest even if the run is up to date
+        """
+        PipelineElement._files_must_exist([self.docked])
+        store = ResultsStore(self.store)
+        if not recalc and store.is_ingested(self.docked, self.run_id):
+            return self
+        self.poses = store.ingest(self.docked, self.run_id, self.receptor)
+        return self
+
+    def output_exists(self):
+        return os.path.exists(self.store) and \
+            ResultsStore(self.store).is_ingested(self.docked, self.run_id)
+
+    @property
+    def inputs(self):
+        return [self.docked]
+
+
+def add_ingestion(scheduler, config, docked, run, receptor):
+    """Schedule the ingestion of a docked file if a results store is configured
+
+    :param scheduler: scheduler of the workflow
+    :param config: config object, the store is results_store of the Execution section
+    :param docked: docked MOL2 file
+    :param run: run id, for example the output directory of the workflow
+    :param receptor: protein file, its name without extension is the receptor
+    """
+    results_store = config.get('Execution', 'results_store', fallback='')
+    if results_store:
+        scheduler.add(ResultsIngestion(
+            docked,
+            results_store,
+            run,
+            receptor=os.path.splitext(os.path.basename(receptor))[0]
+        ), 'results ingestion')
+    return scheduler
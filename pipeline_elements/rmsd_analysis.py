@@ -1,54 +1,120 @@
 """Basic RMSD analysis of a file of docked poses"""
-import re
+from array import array
+import math
+import statistics
 
 from pipeline_elements import PipelineElement
+from pipeline_elements.mol2 import read_molecules
 
 
 class RmsdAnalysis(PipelineElement):
-    """Basic RMSD analysis of a file of docked poses"""
+    """Basic RMSD analysis of a file of docked poses
 
-    def __init__(self, docked_poses):
+    By default only the top pose is analyzed. With all_poses the header
+    fields of every pose are streamed into columns of floats, so pose
+    queries never need the coordinates of a pose. Missing values are NaN.
+    """
+    # column name to DOCK header field
+    COLUMNS = {
+        'grid_score': 'Grid_Score',
+        'vdw': 'Grid_vdw_energy',
+        'es': 'Grid_es_energy',
+        'internal_energy': 'Internal_energy_repulsive',
+        'rmsd_s': 'HA_RMSDs',
+        'rmsd_h': 'HA_RMSDh',
+        'rmsd_m': 'HA_RMSDm'
+    }
+
+    def __init__(self, docked_poses, all_poses=False):
         """Basic RMSD analysis of a file of docked poses
 
         :param docked_poses: file of poses from a docking
+        :param all_poses: analyze all poses instead of only the top pose
         """
         self.docked_poses = docked_poses
+        self.all_poses = all_poses
         self.top_rmsd_s = None
         self.top_rmsd_h = None
         self.top_rmsd_m = None
         self.top_rmsd = None
+        self.columns = {}
 
     def run(self, _recalc=False):
         """Run RMSD analysis"""
         PipelineElement._files_must_exist([self.docked_poses])
-        with open(self.docked_poses) as poses_file:
-            in_header = False
-            for line in poses_file.readlines():
-                if '##########' in line and not in_header:
-                    in_header = True
-                if in_header:
-                    if 'HA_RMSDs' in line:
-                        self.top_rmsd_s = self.__parse_value(line)
-                    if 'HA_RMSDh' in line:
-                        self.top_rmsd_h = self.__parse_value(line)
-                    if 'HA_RMSDm' in line:
-                        self.top_rmsd_m = self.__parse_value(line)
-                    if '##########' not in line:
-                        break  # only extracting top pose RMSD at the moment
-
-        # prefer rmsd_h > rmsd_s > rmsd_m
-        self.top_rmsd = self.top_rmsd_h
-        if self.top_rmsd_h < 0 and self.top_rmsd_s < 0:
-            self.top_rmsd = self.top_rmsd_m
-        elif self.top_rmsd_h < 0:
-            self.top_rmsd = self.top_rmsd_s
+        if self.all_poses:
+            self.__read_columns()
+        else:
+            for pose in read_molecules(self.docked_poses, header_only=True):
+                self.top_rmsd_s = pose.value('HA_RMSDs')
+                self.top_rmsd_h = pose.value('HA_RMSDh')
+                self.top_rmsd_m = pose.value('HA_RMSDm')
+                break  # only extracting the top pose RMSD
+
+        self.top_rmsd = RmsdAnalysis.__preferred_rmsd(
+            self.top_rmsd_s, self.top_rmsd_h, self.top_rmsd_m)
         return self
 
+    def __read_columns(self):
+        self.columns = {column: array('d') for column in RmsdAnalysis.COLUMNS}
+        self.columns['pose'] = array('l')
+        self.columns['rmsd'] = array('d')
+        for index, pose in enumerate(read_molecules(self.docked_poses, header_only=True)):
+            self.columns['pose'].append(index)
+            for column, field in RmsdAnalysis.COLUMNS.items():
+                value = pose.value(field)
+                self.columns[column].append(math.nan if value is None else value)
+            self.columns['rmsd'].append(RmsdAnalysis.__preferred_rmsd(
+                self.columns['rmsd_s'][-1], self.columns['rmsd_h'][-1], self.columns['rmsd_m'][-1]
+            ))
+        if self.columns['pose']:
+            self.top_rmsd_s = self.columns['rmsd_s'][0]
+            self.top_rmsd_h = self.columns['rmsd_h'][0]
+            self.top_rmsd_m = self.columns['rmsd_m'][0]
+
     @staticmethod
-    def __parse_value(line):
-        stripped_line = re.sub(r'\s+', ' ', line)
-        _sentinel, _label, value = [x for x in stripped_line.split(' ') if x.strip()]
-        return float(value)
+    def __preferred_rmsd(rmsd_s, rmsd_h, rmsd_m):
+        """Prefer rmsd_h > rmsd_s > rmsd_m, negative values are invalid, None if unknown"""
+        if rmsd_h is None or rmsd_h < 0 and rmsd_s is None:
+            return None
+        if rmsd_h < 0 and rmsd_s < 0:
+            return rmsd_m
+        if rmsd_h < 0:
+            return rmsd_s
+        return rmsd_h
+
+    def __top_n(self, column, n):
+        if not self.columns:
+            raise RuntimeError('Pose queries require an analysis of all poses')
+        return self.columns[column][:n]
+
+    def best_rmsd_in_top_n(self, n):
+        """Lowest RMSD of the top n poses, NaN if there is none"""
+        rmsds = [rmsd for rmsd in self.__top_n('rmsd', n) if not math.isnan(rmsd)]
+        return min(rmsds) if rmsds else math.nan
+
+    def top_n_success(self, n, threshold=2.0):
+        """Whether any of the top n poses is within an RMSD threshold"""
+        return self.best_rmsd_in_top_n(n) <= threshold
+
+    def score_rmsd_correlation(self):
+        """Pearson correlation of grid score and RMSD of all poses"""
+        pairs = [
+            (score, rmsd)
+            for score, rmsd in zip(self.__top_n('grid_score', None), self.__top_n('rmsd', None))
+            if not math.isnan(score) and not math.isnan(rmsd)
+        ]
+        if len(pairs) < 2:
+            return math.nan
+        scores, rmsds = zip(*pairs)
+        try:
+            return statistics.correlation(scores, rmsds)
+        except statistics.StatisticsError:
+            return math.nan
 
     def output_exists(self):
         return all([self.top_rmsd_s, self.top_rmsd_h, self.top_rmsd_m, self.top_rmsd])
+
+    @property
+    def inputs(self):
+        return [self.docked_poses]
@@ -0,0 +1,104 @@
+"""Dependency graph scheduling of pipeline elements"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import contextvars
+import logging
+import os
+
+from pipeline_elements import ResultCache
+from pipeline_elements.manifest import element_status
+from pipeline_elements.resources import step_usage
+from pipeline_elements.work_queue import check_claim
+
+
+class Scheduler:
+    """Dependency graph scheduling of pipeline elements
+
+    A pipeline element depends on every other element that writes one of its
+    inputs. Elements whose dependencies are done run concurrently up to a
+    worker limit. Threads suffice because the work happens in external
+    binaries. Elements are skipped on a result cache hit. Every element run
+    is recorded in the running resource report and in the campaign manifest
+    of the running job. No element is started once the work queue claim of
+    the running job is lost.
+    """
+
+    def __init__(self, workers=1):
+        """Dependency graph scheduling of pipeline elements
+
+        :param workers: maximum number of concurrently running elements
+        """
+        self.workers = max(1, workers)
+        self.__steps = []
+
+    def add(self, element, description, rerun=False):
+        """Add a pipeline element
+
+        :param element: pipeline element
+        :param description: description logged when the element is run
+        :param rerun: run the element even if its cached output is up to date
+        """
+        self.__steps.append((element, description, rerun))
+        return self
+
+    def dependencies(self):
+        """Indices of the steps each step depends on"""
+        producers = {}
+        for index, (element, _description, _rerun) in enumerate(self.__steps):
+            for output in element.outputs:
+                output = os.path.abspath(output)
+                if output in producers:
+                    raise RuntimeError('Multiple pipeline elements write: {}'.format(output))
+                producers[output] = index
+        dependencies = []
+        for index, (element, _description, _rerun) in enumerate(self.__steps):
+            dependencies.append({
+                producers[os.path.abspath(current_input)] for current_input in element.inputs
+                if os.path.abspath(current_input) in producers
+                and producers[os.path.abspath(current_input)] != index
+            })
+        return dependencies
+
+    def run(self, recalc=False):
+        """Run all pipeline elements respecting their dependencies
+
+        :param recalc: recalculate all intermediate results
+        """
+        dependencies = self.dependencies()
+        done = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while len(done) < len(self.__steps):
+                for index, step_dependencies in enumerate(dependencies):
+                    if index in done or index in running.values():
+                        continue
+                    if step_dependencies <= done:
+                        # threads do not inherit the context of the running resource report
+                        running[executor.submit(
+                            contextvars.copy_context().run, self.__run_step, index, recalc
+                        )] = index
+                if not running:
+                    raise RuntimeError('Pipeline elements have cyclic dependencies')
+                finished, _running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = running.pop(future)
+                    future.result()
+                    done.add(index)
+        return self
+
+    def __run_step(self, index, recalc):
+        element, description, rerun = self.__steps[index]
+        # the job of a lost claim is run by another worker by now
+        check_claim()
+        logging.info(description)
+        with step_usage(description, element) as step, \
+                element_status(description, element) as status:
+            fingerprint = ResultCache.fingerprint(element)
+            if not rerun and not recalc and ResultCache.hit(element, fingerprint):
+                logging.debug('up to date: %s', description)
+                if step is not None:
+                    step['cached'] = True
+                if status is not None:
+                    status['cached'] = True
+                return
+            element.run(recalc)
+            ResultCache.store(element, fingerprint)
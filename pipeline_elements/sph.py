@@ -0,0 +1,175 @@
+"""Reader and writer of DOCK sphere files"""
+from array import array
+
+from pipeline_elements.geometry import SpatialHash
+
+SPHERE = '{:5d}{:10.5f}{:10.5f}{:10.5f}{:8.3f}{:5d}{:2d}{:3d}\n'
+CLUSTER = 'cluster{:6d}   number of spheres in cluster{:6d}\n'
+SPHERE_ATOM = 'ATOM  {:5d}  C   SPH  {:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}\n'
+
+
+class SphereSet:
+    """Spheres of a DOCK sphere file
+
+    Every column of the sphere records is kept in a flat array with one
+    entry per sphere, centers as x, y, z triples.
+    """
+
+    def __init__(self):
+        """Spheres of a DOCK sphere file"""
+        self.numbers = array('l')
+        self.centers = array('d')
+        self.radii = array('d')
+        self.surface_atoms = array('l')
+        self.critical_clusters = array('l')
+        self.colors = array('l')
+        self.clusters = array('l')
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def center(self, index):
+        """Center of a sphere by index"""
+        return self.centers[3 * index], self.centers[3 * index + 1], self.centers[3 * index + 2]
+
+    def append(self, number, center, radius, surface_atom=0, critical_cluster=0, color=0,
+               cluster=1):
+        """Append a sphere
+
+        :param number: sphere number
+        :param center: x, y, z of the sphere center
+        :param radius: sphere radius
+        :param surface_atom: receptor surface atom the sphere touches
+        :param critical_cluster: critical cluster of the sphere, 0 for none
+        :param color: color of the sphere, 0 for none
+        :param cluster: cluster the sphere belongs to
+        """
+        self.numbers.append(number)
+        self.centers.extend(center)
+        self.radii.append(radius)
+        self.surface_atoms.append(surface_atom)
+        self.critical_clusters.append(critical_cluster)
+        self.colors.append(color)
+        self.clusters.append(cluster)
+
+    def subset(self, indices, cluster=None):
+        """Spheres at indices in order
+
+        :param indices: indices of the spheres to keep
+        :param cluster: cluster of all kept spheres, keep their clusters if None
+        """
+        spheres = SphereSet()
+        for index in indices:
+            spheres.append(
+                self.numbers[index],
+                self.center(index),
+                self.radii[index],
+                self.surface_atoms[index],
+                self.critical_clusters[index],
+                self.colors[index],
+                self.clusters[index] if cluster is None else cluster
+            )
+        return spheres
+
+
+def read_spheres(path):
+    """Read the spheres of all clusters of a DOCK sphere file
+
+    :param path: sphere file
+    :return: SphereSet
+    """
+    spheres = SphereSet()
+    cluster = None
+    with open(path) as sphere_file:
+        for line in sphere_file:
+            columns = line.split()
+            if not columns:
+                continue
+            if columns[0] == 'cluster':
+                cluster = int(columns[1])
+            elif cluster is not None:
+                if len(columns) < 5:
+                    raise RuntimeError('Invalid sphere record in {}: {}'.format(path, line))
+                extra = [int(column) for column in columns[5:8]] + [0] * (8 - len(columns))
+                spheres.append(
+                    int(columns[0]),
+                    (float(columns[1]), float(columns[2]), float(columns[3])),
+                    float(columns[4]),
+                    *extra,
+                    cluster=cluster
+                )
+    return spheres
+
+
+def write_spheres(spheres, path, title='DOCK spheres'):
+    """Write spheres as a DOCK sphere file with one block per cluster
+
+    :param spheres: SphereSet
+    :param path: sphere file to write
+    :param title: first line of the sphere file
+    """
+    clusters = {}
+    for index, cluster in enumerate(spheres.clusters):
+        clusters.setdefault(cluster, []).append(index)
+    with open(path, 'w') as sphere_file:
+        sphere_file.write(title + '\n')
+        for cluster, indices in clusters.items():
+            sphere_file.write(CLUSTER.format(cluster, len(indices)))
+            for index in indices:
+                sphere_file.write(SPHERE.format(
+                    spheres.numbers[index],
+                    *spheres.center(index),
+                    spheres.radii[index],
+                    spheres.surface_atoms[index],
+                    spheres.critical_clusters[index],
+                    spheres.colors[index]
+                ))
+
+
+def select_spheres(spheres, coordinates, radius):
+    """Spheres within a radius of any atom like the DOCK sphere_selector
+
+    The sphgen summary cluster 0 repeats the spheres of all other clusters
+    and is only used if there are no other clusters. A sphere is selected
+    once even if it is in several clusters. All selected spheres are put in
+    cluster 1.
+
+    :param spheres: SphereSet of all clusters
+    :param coordinates: atom coordinates, for example of the ligand
+    :param radius: maximum distance of a sphere center to an atom
+    :return: SphereSet of the selected spheres
+    """
+    atoms = SpatialHash(coordinates, radius)
+    summary_only = all(cluster == 0 for cluster in spheres.clusters)
+    selected = []
+    numbers = set()
+    for index, cluster in enumerate(spheres.clusters):
+        if cluster == 0 and not summary_only:
+            continue
+        if spheres.numbers[index] in numbers:
+            continue
+        if atoms.any_within(spheres.center(index), radius):
+            numbers.add(spheres.numbers[index])
+            selected.append(index)
+    return spheres.subset(selected, cluster=1)
+
+
+def write_sphere_pdb(spheres, path):
+    """Write spheres as PDB atoms like the DOCK showsphere
+
+    The residue number is the cluster and the B-factor is the radius of the
+    sphere.
+
+    :param spheres: SphereSet
+    :param path: PDB file to write
+    """
+    with open(path, 'w') as pdb_file:
+        for index in range(len(spheres)):
+            pdb_file.write(SPHERE_ATOM.format(
+                index + 1,
+                spheres.clusters[index],
+                *spheres.center(index),
+                1.0,
+                spheres.radii[index]
+            ))
+        pdb_file.write('END\n')
@@ -9,14 +9,18 @@ import logging
 import os
 
 from pipeline_elements import PipelineElement, BASE_DIR
+from pipeline_elements.prepare import read_coordinates
+from pipeline_elements.sph import read_spheres, select_spheres, write_sphere_pdb, write_spheres
 
 
 class SphereGeneration(PipelineElement):
     """Sphere generation for DOCK workflow
 
     Should be compatible with both the fortran as well as cpp sphgen
-    implementations.
+    implementations. Spheres are selected and written as PDB in process.
     """
+    BINARIES = ('dms', 'sphgen')
+    PARAMETERS = ('sphere_radius',)
 
     def __init__(self, active_site, ligand, output, config):
         """Sphere generation for DOCK workflow
@@ -35,6 +39,7 @@ class SphereGeneration(PipelineElement):
         self.config = config
         self.selected_spheres = os.path.join(self.output, 'selected_spheres.sph')
         self.selected_spheres_pdb = os.path.join(self.output, 'selected_spheres.pdb')
+        self.insph_template = os.path.join(BASE_DIR, 'templates', 'INSPH.template')
 
     def run(self, _recalc=False):
         """Run sphere generation"""
@@ -45,12 +50,19 @@ class SphereGeneration(PipelineElement):
         surface = self.__generate_surface()
         sphere_clusters = self.__generate_spheres(surface)
         self.__select_spheres(sphere_clusters)
-        self.__show_spheres()
         return self
 
     def output_exists(self):
         return PipelineElement._files_exist([self.selected_spheres, self.selected_spheres_pdb])
 
+    @property
+    def inputs(self):
+        return [self.active_site, self.ligand, self.insph_template]
+
+    @property
+    def outputs(self):
+        return [self.selected_spheres, self.selected_spheres_pdb]
+
     def __generate_surface(self):
         surface = os.path.join(self.output, 'rec.ms')
         args = [
@@ -61,14 +73,13 @@ class SphereGeneration(PipelineElement):
             '-v',
             '-o', surface
         ]
-        PipelineElement._commandline(args)
+        PipelineElement._commandline(args, log=os.path.join(self.output, 'dms.log'))
         PipelineElement._files_must_exist([surface])
         return surface
 
     def __generate_spheres(self, surface):
         sphere_clusters = os.path.join(self.output, 'rec.sph')
-        insph_template_path = os.path.join(BASE_DIR, 'templates', 'INSPH.template')
-        with open(insph_template_path) as insph_template:
+        with open(self.insph_template) as insph_template:
             insph = insph_template.read()
         # we will be running sphgen in the spheres directory with relative paths
         insph = insph.format(
@@ -83,7 +94,11 @@ class SphereGeneration(PipelineElement):
             os.remove(outsph)
         if os.path.exists(sphere_clusters):
             os.remove(sphere_clusters)
-        PipelineElement._commandline([self.config['Binaries']['sphgen']], self.output)
+        PipelineElement._commandline(
+            [self.config['Binaries']['sphgen']],
+            cwd=self.output,
+            log=os.path.join(self.output, 'sphgen.log')
+        )
         PipelineElement._files_must_exist([sphere_clusters])
         # logging for fortran sphgen is written to OUTSPH, log it to debug if it exists
         if os.path.exists(outsph):
@@ -92,27 +107,14 @@ class SphereGeneration(PipelineElement):
         return sphere_clusters
 
     def __select_spheres(self, sphere_clusters):
-        args = [
-            self.config['Binaries']['sphere_selector'],
-            os.path.relpath(sphere_clusters, self.output),
-            self.ligand,
-            self.config['Parameters']['sphere_radius']
-        ]
-        PipelineElement._commandline(args, cwd=self.output)
-        PipelineElement._files_must_exist([self.selected_spheres])
-
-    def __show_spheres(self):
-        show_spheres_template_path = os.path.join(BASE_DIR, 'templates', 'show_spheres.in.template')
-        with open(show_spheres_template_path) as show_spheres_template:
-            show_spheres = show_spheres_template.read()
-        show_spheres = show_spheres.format(
-            selected_spheres=os.path.relpath(self.selected_spheres, self.output),
-            selected_spheres_pdb=os.path.relpath(self.selected_spheres_pdb, self.output)
-        )
-        logging.debug(show_spheres)
-        PipelineElement._commandline(
-            [self.config['Binaries']['showsphere']],
-            input=bytes(show_spheres, 'utf8'),
-            cwd=self.output
+        sphere_radius = float(self.config['Parameters']['sphere_radius'])
+        selected_spheres = select_spheres(
+            read_spheres(sphere_clusters), read_coordinates(self.ligand), sphere_radius)
+        if not selected_spheres:
+            raise RuntimeError('Found no spheres within {} of the ligand'.format(sphere_radius))
+        write_spheres(
+            selected_spheres,
+            self.selected_spheres,
+            title='DOCK spheres within {:g} ang of ligands'.format(sphere_radius)
         )
-        PipelineElement._files_must_exist([self.selected_spheres_pdb])
+        write_sphere_pdb(selected_spheres, self.selected_spheres_pdb)
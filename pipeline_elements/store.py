@@ -0,0 +1,213 @@
+"""Content addressed directory store with least recently used eviction"""
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+# ioctl to clone a file on copy-on-write filesystems (linux/fs.h)
+FICLONE = 0x40049409
+
+
+class DirectoryStore:
+    """Content addressed directory store with least recently used eviction
+
+    Every entry is a directory named by its key. The entry metadata is kept
+    in a JSON file whose modification time records the last use of the entry.
+    Entries are added atomically by renaming a fully populated temporary
+    directory, so concurrent writers of the same key are safe.
+    """
+    METADATA = 'entry.json'
+
+    def __init__(self, root, budget=None):
+        """Content addressed directory store with least recently used eviction
+
+        :param root: root directory of the store
+        :param budget: disk budget in bytes, unlimited if None
+        """
+        self.root = os.path.abspath(root)
+        self.budget = budget
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(files, parameters=()):
+        """Key from the contents of files and additional parameters
+
+        :param files: files whose contents determine the entry
+        :param parameters: strings that determine the entry
+        """
+        digest = hashlib.sha256()
+        for current_file in files:
+            digest.update(b'\0file\0')
+            with open(current_file, 'rb') as file_handle:
+                for chunk in iter(lambda: file_handle.read(1 << 20), b''):
+                    digest.update(chunk)
+        for parameter in parameters:
+            digest.update(b'\0parameter\0' + str(parameter).encode('utf8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Directory of an entry"""
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Directory of an entry marked as used or None if it does not exist"""
+        metadata = os.path.join(self.path(key), DirectoryStore.METADATA)
+        try:
+            os.utime(metadata)
+        except FileNotFoundError:
+            return None
+        return self.path(key)
+
+    def add(self, key, source, description=''):
+        """Add a copy of a directory as an entry and evict if over budget
+
+        :param key: key of the entry
+        :param source: directory to copy into the store
+        :param description: human readable description of the entry
+        :return: directory of the entry
+        """
+        if self.get(key):
+            return self.path(key)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            copy_tree(source, staging)
+            size = directory_size(staging)
+            with open(os.path.join(staging, DirectoryStore.METADATA), 'w') as metadata:
+                json.dump({
+                    'key': key,
+                    'description': description,
+                    'size': size,
+                    'created': time.time()
+                }, metadata)
+            os.rename(staging, self.path(key))
+        except OSError as error:
+            shutil.rmtree(staging, ignore_errors=True)
+            # another process added the same entry first
+            if error.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+        self.evict(keep=(key,))
+        return self.path(key)
+
+    def entries(self):
+        """Metadata of all entries, least recently used first"""
+        entries = []
+        for key in os.listdir(self.root):
+            metadata_path = os.path.join(self.path(key), DirectoryStore.METADATA)
+            try:
+                with open(metadata_path) as metadata_file:
+                    metadata = json.load(metadata_file)
+                metadata['last_used'] = os.stat(metadata_path).st_mtime
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            entries.append(metadata)
+        return sorted(entries, key=lambda entry: entry['last_used'])
+
+    def remove(self, key):
+        """Remove an entry"""
+        # rename first so readers never see a partially removed entry
+        trash = tempfile.mkdtemp(prefix='.trash-', dir=self.root)
+        try:
+            os.rename(self.path(key), os.path.join(trash, key))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def prune(self, max_age=None, budget=None):
+        """Remove entries unused for longer than max_age, then evict over budget
+
+        :param max_age: maximum time since the last use of an entry in seconds
+        :param budget: disk budget in bytes, defaults to the store budget
+        :return: keys of the removed entries
+        """
+        removed = []
+        if max_age is not None:
+            oldest = time.time() - max_age
+            for entry in self.entries():
+                if entry['last_used'] >= oldest:
+                    break
+                logging.info('pruning store entry: %s', entry['description'] or entry['key'])
+                self.remove(entry['key'])
+                removed.append(entry['key'])
+        return removed + self.evict(budget)
+
+    def evict(self, budget=None, keep=()):
+        """Remove least recently used entries until the store fits the budget
+
+        :param budget: disk budget in bytes, defaults to the store budget
+        :param keep: keys that are never evicted
+        :return: keys of the evicted entries
+        """
+        budget = self.budget if budget is None else budget
+        if budget is None:
+            return []
+        entries = self.entries()
+        total = sum(entry['size'] for entry in entries)
+        evicted = []
+        for entry in entries:
+            if total <= budget:
+                break
+            if entry['key'] in keep:
+                continue
+            logging.info('evicting store entry: %s', entry['description'] or entry['key'])
+            self.remove(entry['key'])
+            total -= entry['size']
+            evicted.append(entry['key'])
+        return evicted
+
+
+def clone_file(source, target):
+    """Copy a file, sharing blocks on copy-on-write filesystems"""
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            shutil.copyfileobj(source_file, target_file, 1 << 20)
+    shutil.copystat(source, target)
+
+
+def link_file(source, target):
+    """Hard link a file, copy it if linking is not possible
+
+    The target is replaced. Hard linked files share their contents, so
+    they must be replaced and never modified in place.
+    """
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        clone_file(source, target)
+
+
+def copy_tree(source, target, ignore=(DirectoryStore.METADATA,)):
+    """Copy a directory tree into an existing or new directory
+
+    :param source: directory to copy
+    :param target: directory to copy to
+    :param ignore: file names in the top level directory that are not copied
+    """
+    for directory, _directories, files in os.walk(source):
+        relative_directory = os.path.relpath(directory, source)
+        target_directory = os.path.normpath(os.path.join(target, relative_directory))
+        os.makedirs(target_directory, exist_ok=True)
+        for current_file in files:
+            if relative_directory == '.' and current_file in ignore:
+                continue
+            clone_file(
+                os.path.join(directory, current_file),
+                os.path.join(target_directory, current_file)
+            )
+
+
+def directory_size(directory):
+    """Size of all files in a directory tree in bytes"""
+    size = 0
+    for current_directory, _directories, files in os.walk(directory):
+        for current_file in files:
+            size += os.path.getsize(os.path.join(current_directory, current_file))
+    return size
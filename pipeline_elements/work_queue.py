@@ -0,0 +1,326 @@
+"""Work queue of workflow jobs in a shared directory"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+STATES = (PENDING, RUNNING, DONE, FAILED)
+SUFFIX = '.json'
+# workflow arguments that are paths, submitted as absolute paths for other nodes
+PATH_ARGUMENTS = (
+    'protein', 'native_ligand', 'docking_ligand', 'template', 'docking_in', 'rmsd_reference',
+    'receptor'
+)
+# heartbeat of the claim of the running job
+_heartbeat = contextvars.ContextVar('queue_heartbeat', default=None)
+
+
+class WorkQueue:
+    """Work queue of workflow jobs in a shared directory
+
+    Every job is a JSON file in one of the pending, running, done and
+    failed subdirectories. Workers on any node sharing the directory, for
+    example over NFS, claim a job by renaming its pending file to a running
+    file named after the claim. Rename is atomic, so exactly one worker wins
+    a job. The owner of a claim heartbeats by touching its running file.
+    Claims whose heartbeat is older than the timeout are returned to
+    pending by any worker, or failed once the job is out of attempts. A
+    worker that lost its claim can not finish the job of the new owner
+    because it only ever renames its own claim file. It stops the job
+    before the next pipeline element, but the element running when the
+    claim was lost may still overlap with the new owner in the output
+    directory.
+
+    Heartbeats are file change times set by the file server, so
+    the timeout has to be well above the heartbeat interval and the clock
+    skew between the nodes and the file server.
+    """
+
+    def __init__(self, directory, timeout=300.0, max_attempts=3):
+        """Work queue of workflow jobs in a shared directory
+
+        :param directory: queue directory, created if it does not exist
+        :param timeout: seconds after the last heartbeat a claim expires
+        :param max_attempts: maximum claims of a job before it fails
+        """
+        self.directory = os.path.abspath(directory)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        for state in STATES:
+            os.makedirs(os.path.join(self.directory, state), exist_ok=True)
+
+    def path(self, state, name):
+        """Path of a job file in a state"""
+        return os.path.join(self.directory, state, name + SUFFIX)
+
+    def submit(self, name, workflow, arguments, output, recalc=False):
+        """Submit a pending job unless a job of the name is queued
+
+        :param name: unique job name, used as file name
+        :param workflow: workflow of the job
+        :param arguments: JSON serializable workflow arguments
+        :param output: output directory of the job
+        :param recalc: recalculate all intermediate results of the job
+        :return: job was submitted
+        """
+        if os.sep in name or name.startswith('.'):
+            raise RuntimeError('Invalid job name: {}'.format(name))
+        if self.state(name) is not None:
+            return False
+        job = {
+            'name': name,
+            'workflow': workflow,
+            'arguments': arguments,
+            'output': output,
+            'recalc': recalc,
+            'attempts': 0,
+            'history': []
+        }
+        temporary = os.path.join(self.directory, '.{}.{}'.format(name, uuid.uuid4().hex))
+        _write_json(temporary, job)
+        os.rename(temporary, self.path(PENDING, name))
+        return True
+
+    def state(self, name):
+        """State of a job or None if it is not queued"""
+        for state in (PENDING, DONE, FAILED):
+            if os.path.exists(self.path(state, name)):
+                return state
+        if any(claim.rsplit('.', 1)[0] == name for claim in self.jobs(RUNNING)):
+            return RUNNING
+        return None
+
+    def jobs(self, state):
+        """Names of the jobs in a state, claim names for running jobs"""
+        return sorted(
+            entry[:-len(SUFFIX)] for entry in os.listdir(os.path.join(self.directory, state))
+            if entry.endswith(SUFFIX) and not entry.startswith('.')
+        )
+
+    def counts(self):
+        """Number of jobs by state"""
+        return {state: len(self.jobs(state)) for state in STATES}
+
+    def claim(self, worker):
+        """Claim the first pending job
+
+        :param worker: worker id recorded in the job
+        :return: claim or None if no job is pending
+        """
+        for name in self.jobs(PENDING):
+            claim = Claim(self, name, '{}.{}'.format(name, uuid.uuid4().hex), worker)
+            try:
+                os.rename(self.path(PENDING, name), claim.path)
+                job = claim.read()
+                job['attempts'] += 1
+                job['history'].append({'worker': worker, 'claimed': time.time()})
+                claim.write(job)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            return claim
+        return None
+
+    def requeue_expired(self):
+        """Return claims without a recent heartbeat to pending, or fail them
+
+        :return: names of the requeued or failed jobs
+        """
+        expired = []
+        for claim_name in self.jobs(RUNNING):
+            path = self.path(RUNNING, claim_name)
+            taken = os.path.join(self.directory, '.expired.' + claim_name)
+            try:
+                # renames, writes and heartbeats all update the change time
+                if time.time() - os.stat(path).st_ctime < self.timeout:
+                    continue
+                os.rename(path, taken)
+            except FileNotFoundError:
+                continue  # finished or requeued by another worker
+            with open(taken) as job_file:
+                job = json.load(job_file)
+            state = PENDING if job['attempts'] < self.max_attempts else FAILED
+            os.rename(taken, self.path(state, job['name']))
+            logging.warning('claim of %s expired, %s', job['name'], state)
+            expired.append(job['name'])
+        return expired
+
+
+class Claim:
+    """Claim of a job by a worker"""
+
+    def __init__(self, work_queue, name, claim_name, worker):
+        """Claim of a job by a worker
+
+        :param work_queue: work queue of the job
+        :param name: job name
+        :param claim_name: name of the running file of the claim
+        :param worker: worker id
+        """
+        self.work_queue = work_queue
+        self.name = name
+        self.claim_name = claim_name
+        self.worker = worker
+        self.path = work_queue.path(RUNNING, claim_name)
+
+    def read(self):
+        """Job of the claim"""
+        with open(self.path) as job_file:
+            return json.load(job_file)
+
+    def write(self, job):
+        """Replace the job of the claim in place, which also counts as heartbeat
+
+        Raises FileNotFoundError if the claim was lost instead of creating
+        the claim file again.
+        """
+        _write_json(self.path, job, mode='r+')
+
+    def heartbeat(self):
+        """Touch the claim file
+
+        :return: claim is still held
+        """
+        try:
+            os.utime(self.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def finish(self, error=None):
+        """Move the claimed job to done, or on an error to failed or back to pending
+
+        :param error: error message of a failed run
+        :return: final state of the job or None if the claim was lost
+        """
+        # taking the claim file out of the running directory ends the claim atomically
+        taken = os.path.join(self.work_queue.directory, '.' + self.claim_name)
+        try:
+            os.rename(self.path, taken)
+        except FileNotFoundError:
+            logging.error('lost claim of %s', self.name)
+            return None
+        with open(taken) as job_file:
+            job = json.load(job_file)
+        job['history'][-1]['finished'] = time.time()
+        if error is None:
+            state = DONE
+        else:
+            job['history'][-1]['error'] = error
+            state = PENDING if job['attempts'] < self.work_queue.max_attempts else FAILED
+        _write_json(taken, job, mode='r+')
+        os.rename(taken, self.work_queue.path(state, self.name))
+        return state
+
+
+class Heartbeat:
+    """Thread touching a claim at an interval while entered
+
+    Once the claim is lost the heartbeat stops and sets lost. Schedulers
+    running within the heartbeat raise before their next pipeline element,
+    see check_claim.
+    """
+
+    def __init__(self, claim, interval=30.0):
+        """Thread touching a claim at an interval while entered
+
+        :param claim: claim to keep alive
+        :param interval: seconds between heartbeats
+        """
+        self.claim = claim
+        self.interval = interval
+        self.lost = threading.Event()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__token = None
+
+    def __enter__(self):
+        self.__token = _heartbeat.set(self)
+        self.__thread = threading.Thread(target=self.__beat, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_exception):
+        self.__stop.set()
+        self.__thread.join()
+        _heartbeat.reset(self.__token)
+
+    def __beat(self):
+        while not self.__stop.wait(self.interval):
+            if not self.claim.heartbeat():
+                logging.error('lost claim of %s', self.claim.name)
+                self.lost.set()
+                return
+
+
+def check_claim():
+    """Raise if the claim of the running job was lost, nothing outside of a heartbeat"""
+    heartbeat = _heartbeat.get()
+    if heartbeat is not None and heartbeat.lost.is_set():
+        raise RuntimeError('Lost claim of: {}'.format(heartbeat.claim.name))
+
+
+def queue_from_config(directory, config):
+    """Work queue with the timeout and attempts of the Execution section
+
+    :param directory: queue directory
+    :param config: config object
+    """
+    return WorkQueue(
+        directory,
+        timeout=config.getfloat('Execution', 'queue_timeout', fallback=300.0),
+        max_attempts=config.getint('Execution', 'queue_max_attempts', fallback=3)
+    )
+
+
+def submit_workflow(queue_dir, config, workflow, arguments, output, recalc=False):
+    """Submit a workflow run to a work queue under the job name of its output directory
+
+    :param queue_dir: queue directory
+    :param config: config object
+    :param workflow: workflow of the job
+    :param arguments: workflow arguments by name, unset arguments are None
+    :param output: output directory of the job
+    :param recalc: recalculate all intermediate results of the job
+    :return: job was submitted, False if a job of the name is queued
+    """
+    output = os.path.abspath(output)
+    arguments = {
+        argument: os.path.abspath(value) if argument in PATH_ARGUMENTS else value
+        for argument, value in arguments.items() if value is not None
+    }
+    name = job_name(output)
+    submitted = queue_from_config(queue_dir, config).submit(
+        name, workflow, arguments, output, recalc=recalc)
+    if not submitted:
+        logging.warning('already queued: %s', output)
+    return submitted
+
+
+def job_name(output):
+    """Job name of an output directory, unique per absolute path"""
+    output = os.path.abspath(output)
+    return '{}_{}'.format(
+        os.path.basename(output), hashlib.sha256(output.encode('utf8')).hexdigest()[:12])
+
+
+def worker_id():
+    """Id of a worker unique across nodes"""
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def _write_json(path, data, mode='w'):
+    """Write JSON and flush it to disk, r+ mode only replaces existing files"""
+    with open(path, mode) as json_file:
+        json_file.truncate()
+        json.dump(data, json_file, indent=2)
+        json_file.flush()
+        os.fsync(json_file.fileno())
@@ -0,0 +1,130 @@
+"""Worker draining a work queue of workflow jobs in a shared directory"""
+import argparse
+import configparser
+import logging
+import os
+import time
+
+from campaign import build_workflow, read_jobs
+from pipeline_elements import BASE_DIR, ResourceReport, set_process_limit
+from pipeline_elements.work_queue import DONE, RUNNING, Heartbeat, check_claim, queue_from_config, \
+    worker_id
+
+
+class QueueWorker:
+    """Worker draining a work queue of workflow jobs in a shared directory
+
+    Any number of workers on any number of nodes sharing the queue
+    directory claim and run one job at a time. While a job runs the worker
+    heartbeats its claim and aborts the job once the claim is lost. Before
+    every claim expired claims of crashed workers are returned to the
+    queue. The worker stops once no job is pending or running, or waits for
+    new jobs.
+    """
+
+    def __init__(self, work_queue, config, wait=False, poll=10.0):
+        """Worker draining a work queue of workflow jobs in a shared directory
+
+        :param work_queue: work queue
+        :param config: config object
+        :param wait: keep polling for jobs when the queue is drained
+        :param poll: seconds between polls while no job is pending
+        """
+        self.work_queue = work_queue
+        self.config = config
+        self.wait = wait
+        self.poll = poll
+        self.heartbeat = config.getfloat('Execution', 'queue_heartbeat', fallback=30.0)
+        self.worker = worker_id()
+        self.finished = []
+
+    def run(self, recalc=False):
+        """Run jobs until the queue is drained
+
+        :param recalc: recalculate all intermediate results
+        """
+        while True:
+            self.work_queue.requeue_expired()
+            claim = self.work_queue.claim(self.worker)
+            if claim is None:
+                if not self.wait and not self.work_queue.jobs(RUNNING):
+                    break
+                time.sleep(self.poll)
+                continue
+            self.finished.append((claim.name, self.__run_claim(claim, recalc)))
+        return self
+
+    def __run_claim(self, claim, recalc):
+        job = claim.read()
+        logging.info('running %s attempt %d', job['name'], job['attempts'])
+        error = None
+        try:
+            os.makedirs(job['output'], exist_ok=True)
+            with Heartbeat(claim, self.heartbeat), ResourceReport() as report:
+                build_workflow(
+                    job['workflow'], job['arguments'], job['output'], self.config
+                ).run(recalc or job.get('recalc', False))
+                check_claim()
+            report.write(os.path.join(job['output'], 'resources.json'))
+        except Exception as exception:
+            logging.error('job %s failed: %s', job['name'], exception)
+            error = str(exception) or type(exception).__name__
+        state = claim.finish(error)
+        if state == DONE:
+            logging.info('done: %s', job['name'])
+        return state
+
+
+def main(args):
+    """Module main to submit jobs to or drain a work queue"""
+    logging.basicConfig(level=logging.INFO)
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    work_queue = queue_from_config(args.queue, config)
+    if args.submit:
+        jobs_tsv, output = args.submit
+        output = os.path.abspath(output)
+        for name, workflow, arguments in read_jobs(jobs_tsv):
+            work_queue.submit(
+                name, workflow, arguments, os.path.join(output, name), recalc=args.recalc)
+    elif not args.status:
+        set_process_limit(config.getint('Execution', 'processes', fallback=0))
+        QueueWorker(work_queue, config, wait=args.wait, poll=args.poll).run(args.recalc)
+    for state, count in work_queue.counts().items():
+        print('{}\t{}'.format(state, count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('queue', type=str, help='queue directory on the shared filesystem')
+    parser.add_argument(
+        '--submit',
+        type=str,
+        nargs=2,
+        metavar=('JOBS', 'OUTPUT'),
+        help='submit the jobs of a campaign TSV with output directories in OUTPUT and exit'
+    )
+    parser.add_argument('--status', action='store_true', help='print the job counts and exit')
+    parser.add_argument(
+        '--wait',
+        action='store_true',
+        help='keep polling for jobs when the queue is drained'
+    )
+    parser.add_argument(
+        '--poll',
+        type=float,
+        default=10.0,
+        help='seconds between polls while no job is pending'
+    )
+    parser.add_argument(
+        '--recalc',
+        action='store_true',
+        help='recalculate all intermediate results, of the submitted jobs with --submit'
+    )
+    parser.add_argument(
+        '--config',
+        type=str,
+        help='path to a config file',
+        default=os.path.join(BASE_DIR, 'config.ini')
+    )
+    main(parser.parse_args())
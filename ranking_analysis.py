@@ -1,6 +1,11 @@
 """Analysis of a ranking run"""
 import argparse
+from array import array
+from bisect import bisect_left
+from collections import Counter
 import csv
+from itertools import groupby
+import math
 import sys
 
 
@@ -12,73 +17,138 @@ class RankingAnalysis:
     def __init__(self, scores, affinities):
         self.scores = scores
         self.affinities = affinities
+        # compound names interned to integer ids
+        self.names = []
+        self.__name_ids = {}
 
     def perform(self):
         """Perform a ranking analysis"""
-        scores = self.get_scores()
-        scores = self.make_hits_unique(scores)
-        hits = []
-        not_found = []
-        for hit in scores:
-            if hit[1]:
-                hits.append(hit)
-            else:
-                not_found.append(hit)
-        affinity_map = self.get_affinities()
+        min_affinities, max_affinities = self.get_affinities()
+        candidates, scores = self.get_unique_scores()
+        for candidate_ids in candidates:
+            for candidate in candidate_ids:
+                if candidate >= len(min_affinities) or math.isnan(min_affinities[candidate]):
+                    raise RuntimeError('No affinity for: {}'.format(self.names[candidate]))
+        hits = [index for index, score in enumerate(scores) if score and not math.isnan(score)]
+        found = set(hits)
+        not_found = [index for index in range(len(scores)) if index not in found]
 
         rank_tuples = []
-        for index, hit in enumerate(hits):
-            for candidate in hit[0]:
-                affinities = affinity_map[candidate]
-                min_affinity = min(affinities)
-                max_affinity = max(affinities)
-                rank_tuples.append((index, candidate, min_affinity, max_affinity))
-                print('result: {}, {}, {}, {}'.format(
-                    candidate, hit[1], min_affinity, max_affinity))
-        for hit in not_found:
-            for candidate in hit[0]:
-                affinities = affinity_map[candidate]
-                min_affinity = min(affinities)
-                max_affinity = max(affinities)
-                rank_tuples.append((len(scores), candidate, min_affinity, max_affinity))
-                print('result: {}, {}, {}, {}'.format(
-                    candidate, None, min_affinity, max_affinity))
+        ranked = [(rank, hit, scores[hit]) for rank, hit in enumerate(hits)]
+        ranked.extend((len(scores), hit, None) for hit in not_found)
+        for rank, hit, score in ranked:
+            for candidate in candidates[hit]:
+                name = self.names[candidate]
+                min_affinity = min_affinities[candidate]
+                max_affinity = max_affinities[candidate]
+                rank_tuples.append((rank, name, min_affinity, max_affinity))
+                print('result: {}, {}, {}, {}'.format(name, score, min_affinity, max_affinity))
         self.compute_significant_differences(rank_tuples)
 
+    def intern(self, name):
+        """Integer id of a compound name"""
+        name_id = self.__name_ids.get(name)
+        if name_id is None:
+            name_id = self.__name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
     @staticmethod
     def approx_equal(first, second):
         """first and second are approximately equal using float epsilon"""
         return abs(first - second) < sys.float_info.epsilon
 
     @staticmethod
-    def compute_significant_differences(rank_tuples):
-        """Count the number of significant differences and whether they were ranked correctly"""
+    def is_significant(lower_affinity, upper_affinity):
+        """lower affinity divided by the significance factor is not below upper affinity"""
+        lower_bound = lower_affinity / RankingAnalysis.SIGNIFICANCE_FACTOR
+        # epsilon scales with multiplication
+        return RankingAnalysis.approx_equal(lower_bound, upper_affinity) \
+            or lower_bound > upper_affinity
+
+    @staticmethod
+    def count_significant_differences(rank_tuples):
+        """Count significant differences, correctly ranked ones and the compounds involved
+
+        A pair is significantly different if the minimum affinity of one is
+        the significance factor above the maximum affinity of the other. Equal
+        rank tuples are never compared. Instead of comparing all pairs the
+        tuples are sorted by affinity bounds and pairs are counted with binary
+        searches and a Fenwick tree over the ranks in O(n log n).
+
+        :param rank_tuples: rank, name, minimum affinity and maximum affinity
+        :return: number of significant differences, correctly ranked ones and involved names
+        """
+        def significant(lower_affinity, upper_affinity):
+            return RankingAnalysis.is_significant(lower_affinity, upper_affinity)
+
+        # NaN affinities are never significantly different, the rest is ordered
+        lower = sorted(
+            (index for index, rank_tuple in enumerate(rank_tuples)
+             if not math.isnan(rank_tuple[2])),
+            key=lambda index: rank_tuples[index][2]
+        )
+        upper = sorted(
+            rank_tuple[3] for rank_tuple in rank_tuples if not math.isnan(rank_tuple[3])
+        )
+        lower_affinities = [rank_tuples[index][2] for index in lower]
+        # equal rank tuples are excluded, which only matters if they would be significant
+        self_significant = {
+            rank_tuple: count for rank_tuple, count in Counter(rank_tuples).items()
+            if significant(rank_tuple[2], rank_tuple[3])
+        }
+
+        # first other tuple the rank tuple is significantly below, -1 if there is none
+        first_above = []
         significant_differences = 0
-        correct_differences = 0
         involved = set()
-        for rank in rank_tuples:
-            for other in rank_tuples:
-                if rank == other:
-                    continue
-                # other affinity is significance factor higher
-                if RankingAnalysis.approx_equal(other[2] / RankingAnalysis.SIGNIFICANCE_FACTOR, rank[3]) \
-                        or other[2] / RankingAnalysis.SIGNIFICANCE_FACTOR > rank[3]:
-                    involved.add(rank[1])
-                    involved.add(other[1])
-                    significant_differences += 1
-                    if other[0] > rank[0]:
-                        correct_differences += 1
-                # other affinity is significance factor lower, epsilon scales with multiplication
-                if RankingAnalysis.approx_equal(rank[2] / RankingAnalysis.SIGNIFICANCE_FACTOR, other[3]) \
-                        or rank[2] / RankingAnalysis.SIGNIFICANCE_FACTOR > other[3]:
-                    involved.add(rank[1])
-                    involved.add(other[1])
-                    significant_differences += 1
-                    if other[0] < rank[0]:
-                        correct_differences += 1
-        # significant differences are symmetrical and counted twice
-        significant_differences /= 2
-        correct_differences /= 2
+        for rank_tuple in rank_tuples:
+            if math.isnan(rank_tuple[3]):
+                first_above.append(-1)
+                continue
+            first = bisect_left(
+                lower_affinities, True,
+                key=lambda lower_affinity: significant(lower_affinity, rank_tuple[3])
+            )
+            first_above.append(first)
+            above = len(lower) - first - self_significant.get(rank_tuple, 0)
+            significant_differences += above
+            if above:
+                involved.add(rank_tuple[1])
+        for rank_tuple in rank_tuples:
+            if rank_tuple[1] in involved or math.isnan(rank_tuple[2]):
+                continue
+            below = bisect_left(
+                upper, True,
+                key=lambda upper_affinity: not significant(rank_tuple[2], upper_affinity)
+            )
+            if below - self_significant.get(rank_tuple, 0) > 0:
+                involved.add(rank_tuple[1])
+
+        # count pairs with the lower tuple ranked before the upper tuple by inserting
+        # tuples by descending rank into a Fenwick tree over the lower affinity order
+        positions = {index: position for position, index in enumerate(lower)}
+        tree = [0] * (len(lower) + 1)
+        correct_differences = 0
+        by_rank = sorted(
+            range(len(rank_tuples)), key=lambda index: rank_tuples[index][0], reverse=True)
+        for _rank, indices in groupby(by_rank, key=lambda index: rank_tuples[index][0]):
+            indices = list(indices)
+            for index in indices:
+                if first_above[index] >= 0:
+                    correct_differences += _fenwick_suffix(tree, first_above[index])
+            for index in indices:
+                if index in positions:
+                    _fenwick_add(tree, positions[index])
+        return significant_differences, correct_differences, involved
+
+    @staticmethod
+    def compute_significant_differences(rank_tuples):
+        """Count the number of significant differences and whether they were ranked correctly"""
+        significant_differences, correct_differences, involved = \
+            RankingAnalysis.count_significant_differences(rank_tuples)
+        significant_differences = float(significant_differences)
+        correct_differences = float(correct_differences)
         print('involved: ' + ', '.join(involved))
         if significant_differences > 0:
             percentage_correct = correct_differences * 100.0 / significant_differences
@@ -87,41 +157,48 @@ class RankingAnalysis:
         else:
             print('result: no significant differences')
 
-    def get_scores(self):
-        """Get scores from file"""
-        scores = []
-        with open(self.scores) as score_file:
-            reader = csv.reader(score_file, delimiter='\t')
-            for line in reader:
-                scores.append((line[0].split('_')[0].split(','), float(line[1]) if line[1] else None))
-        return scores
-
-    @staticmethod
-    def make_hits_unique(hits):
-        """Filters out all duplicates based on candidate names
+    def get_unique_scores(self):
+        """Stream scores from file and filter out duplicates based on candidate names
 
         This is aimed at stereoisomers. The better score duplicate/stereoisomer is
-        used further.
+        used further. Candidates are kept as tuples of compound ids and scores
+        in an array with NaN for missing scores, one entry per unique hit in
+        the order of first occurrence.
+
+        :return: candidate ids and scores of the unique hits
         """
+        candidates = []
+        scores = array('d')
         unique_map = {}
-        for hit in hits:
-            key = ''.join(sorted(hit[0]))
-            if key not in unique_map:
-                unique_map[key] = hit
-            elif hit[1] < unique_map[key][1]:
-                unique_map[key] = hit
-        unique_hits = []
-        for hit in unique_map.values():
-            unique_hits.append(hit)
-        return unique_hits
+        with open(self.scores) as score_file:
+            reader = csv.reader(score_file, delimiter='\t')
+            for line in reader:
+                candidate_ids = tuple(
+                    self.intern(name) for name in line[0].split('_')[0].split(','))
+                score = float(line[1]) if line[1] else math.nan
+                key = tuple(sorted(candidate_ids))
+                index = unique_map.get(key)
+                if index is None:
+                    unique_map[key] = len(candidates)
+                    candidates.append(candidate_ids)
+                    scores.append(score)
+                elif score < scores[index] or math.isnan(scores[index]):
+                    candidates[index] = candidate_ids
+                    scores[index] = score
+        return candidates, scores
 
     def get_affinities(self):
-        """Get affinities for th ranking"""
-        affinity_map = {}
+        """Stream affinities from file into minimum and maximum affinity per compound id
+
+        :return: arrays of the minimum and maximum affinity in nM indexed by compound id,
+            NaN for compounds without affinity
+        """
+        min_affinities = array('d')
+        max_affinities = array('d')
         with open(self.affinities) as affinity_file:
             reader = csv.reader(affinity_file)
             for line in reader:
-                name = line[0]
+                name_id = self.intern(line[0])
                 value = float(line[2])
                 unit = line[3]
                 # change everything to nM
@@ -129,10 +206,37 @@ class RankingAnalysis:
                     value *= 1000
                 elif unit == 'pM':
                     value /= 1000
-                if name not in affinity_map:
-                    affinity_map[name] = []
-                affinity_map[name].append(value)
-        return affinity_map
+                if name_id >= len(min_affinities):
+                    # names interned by the scores have no affinity yet
+                    padding = [math.nan] * (name_id + 1 - len(min_affinities))
+                    min_affinities.extend(padding)
+                    max_affinities.extend(padding)
+                if math.isnan(min_affinities[name_id]) or value < min_affinities[name_id]:
+                    min_affinities[name_id] = value
+                if math.isnan(max_affinities[name_id]) or value > max_affinities[name_id]:
+                    max_affinities[name_id] = value
+        return min_affinities, max_affinities
+
+
+def _fenwick_add(tree, position):
+    """Add one at a position of a Fenwick tree"""
+    position += 1
+    while position < len(tree):
+        tree[position] += 1
+        position += position & -position
+
+
+def _fenwick_suffix(tree, position):
+    """Sum of a Fenwick tree from a position to the end"""
+    total = 0
+    end = len(tree) - 1
+    while end > 0:
+        total += tree[end]
+        end -= end & -end
+    while position > 0:
+        total -= tree[position]
+        position -= position & -position
+    return total
 
 
 def main(args):
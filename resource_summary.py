@@ -0,0 +1,54 @@
+"""Summarize the resource reports of workflow runs"""
+import argparse
+import json
+import os
+
+from pipeline_elements.resources import dominant_step, summarize
+
+REPORT = 'resources.json'
+
+
+def find_reports(paths):
+    """Resource reports in files and directory trees"""
+    reports = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _directories, files in os.walk(path):
+                if REPORT in files:
+                    reports.append(os.path.join(directory, REPORT))
+        else:
+            reports.append(path)
+    return sorted(reports)
+
+
+def main(args):
+    """Module main to print resource usage per step and the dominant step per run"""
+    reports = []
+    for report_path in find_reports(args.reports):
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+        reports.append(report)
+        dominant = dominant_step(report)
+        if dominant:
+            step, wall_time = dominant
+            print('{}\tdominant step: {} ({:.1f} s of {:.1f} s)'.format(
+                report_path, step['description'], wall_time, report['wall_time'] or 0))
+    print('\t'.join([
+        'step', 'count', 'wall_time', 'user_time', 'system_time', 'max_rss', 'bytes_written']))
+    summary = summarize(reports)
+    for description, totals in sorted(
+            summary.items(), key=lambda item: item[1]['wall_time'], reverse=True):
+        print('{}\t{}\t{:.2f}\t{:.2f}\t{:.2f}\t{}\t{}'.format(
+            description, totals['count'], totals['wall_time'], totals['user_time'],
+            totals['system_time'], totals['max_rss'], totals['bytes_written']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'reports',
+        type=str,
+        nargs='+',
+        help='resource reports or output directories containing resources.json'
+    )
+    main(parser.parse_args())
@@ -0,0 +1,58 @@
+"""Ingest docked poses into and query a results store"""
+import argparse
+import logging
+
+from pipeline_elements import ResultsStore
+
+POSE_FIELDS = ('run', 'pose', 'ligand', 'receptor', 'grid_score', 'rmsd_h')
+
+
+def print_poses(poses):
+    """Print poses as TSV with a header"""
+    print('\t'.join(POSE_FIELDS))
+    for pose in poses:
+        print('\t'.join('' if pose[field] is None else str(pose[field]) for field in POSE_FIELDS))
+
+
+def main(args):
+    """Module main to ingest into and query a results store"""
+    logging.basicConfig(level=logging.INFO)
+    store = ResultsStore(args.store)
+    if args.command == 'ingest':
+        for docked in args.docked:
+            run = docked if args.run is None else args.run
+            poses = store.ingest(docked, run, receptor=args.receptor)
+            logging.info('ingested %d poses of %s', poses, run)
+    elif args.command == 'top':
+        print_poses(store.top_hits(args.limit, receptor=args.receptor))
+    elif args.command == 'leaderboard':
+        print_poses(store.leaderboard(args.receptor, args.limit))
+    elif args.command == 'compare':
+        print_poses(store.compare(args.ligand))
+    elif args.command == 'pose':
+        pose = store.pose(args.run, args.pose)
+        if pose is None:
+            raise RuntimeError('Did not find pose {} of run: {}'.format(args.pose, args.run))
+        print(store.pose_text(pose), end='')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store', type=str, help='path to the results store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='ingest docked files')
+    ingest.add_argument('docked', type=str, nargs='+', help='docked MOL2 files')
+    ingest.add_argument('--run', type=str, help='run id, the path of the docked file if omitted')
+    ingest.add_argument('--receptor', type=str, help='receptor the poses were docked into')
+    top = commands.add_parser('top', help='poses with the best grid scores')
+    top.add_argument('--limit', type=int, default=10, help='maximum number of poses')
+    top.add_argument('--receptor', type=str, help='only poses of this receptor')
+    leaderboard = commands.add_parser('leaderboard', help='best pose of every ligand')
+    leaderboard.add_argument('receptor', type=str, help='receptor')
+    leaderboard.add_argument('--limit', type=int, default=10, help='maximum number of ligands')
+    compare = commands.add_parser('compare', help='best pose of a ligand in every run')
+    compare.add_argument('ligand', type=str, help='ligand name')
+    pose = commands.add_parser('pose', help='print a pose from its docked file')
+    pose.add_argument('run', type=str, help='run id')
+    pose.add_argument('pose', type=int, help='pose index in the run')
+    main(parser.parse_args())
@@ -4,7 +4,10 @@ import configparser
 import logging
 import os
 
-from pipeline_elements import BASE_DIR, ReceptorPreparation, DockingRun, RmsdAnalysis
+from pipeline_elements import BASE_DIR, ReceptorPreparation, DockingRun, \
+    RmsdAnalysis, Scheduler, ResourceReport, set_process_limit
+from pipeline_elements.results import add_ingestion
+from pipeline_elements.work_queue import submit_workflow
 
 
 class SelfDocking:
@@ -72,12 +75,11 @@ class SelfDocking:
         if not os.path.exists(self.output):
             os.mkdir(self.output)
 
-        logging.info('receptor preparation')
-        self.__receptor_preparation.run(recalc)
-
-        # docking run is always rerun
-        logging.info('docking')
-        self.__docking_run.run()
+        scheduler = Scheduler(self.config.getint('Execution', 'workers', fallback=1))
+        scheduler.add(self.__receptor_preparation, 'receptor preparation')
+        scheduler.add(self.__docking_run, 'docking')
+        add_ingestion(scheduler, self.config, self.docked, self.output, self.protein)
+        scheduler.run(recalc)
 
         if self.rmsd_reference:
             self.__rmsd_analysis.run()
@@ -94,6 +96,15 @@ def main(args):
     logging.basicConfig(level=logging.DEBUG)
     config = configparser.ConfigParser()
     config.read(args.config)
+    if args.queue:
+        submit_workflow(args.queue, config, 'self_docking', {
+            'protein': args.protein,
+            'native_ligand': args.ligand,
+            'docking_in': args.docking_in,
+            'rmsd_reference': args.rmsd_reference
+        }, args.output, recalc=args.recalc)
+        return
+    set_process_limit(config.getint('Execution', 'processes', fallback=0))
     self_docking = SelfDocking(
         args.protein,
         args.ligand,
@@ -102,7 +113,9 @@ def main(args):
         docking_in=args.docking_in,
         rmsd_reference=args.rmsd_reference
     )
-    self_docking.run(args.recalc)
+    with ResourceReport() as report:
+        self_docking.run(args.recalc)
+    report.write(os.path.join(self_docking.output, 'resources.json'))
     print(self_docking.docked)
 
 
@@ -129,4 +142,9 @@ if __name__ == '__main__':
         type=str,
         help='reference molecule for RMSD calculation'
     )
+    parser.add_argument(
+        '--queue',
+        type=str,
+        help='submit the job to a work queue directory drained by queue_worker.py instead'
+    )
     main(parser.parse_args())
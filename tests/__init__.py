@@ -12,3 +12,21 @@ from .self_docking_test import SelfDockingTest
 from .spheres_test import SphereGenerationTest
 from .anchored_de_novo_test import AnchoredDeNovoTest
 from .anchored_growing_test import AnchoredGrowingTest
+from .batch_cross_docking_test import BatchCrossDockingTest
+from .scheduler_test import SchedulerTest
+from .cache_test import ResultCacheTest
+from .store_test import DirectoryStoreTest
+from .process_test import ProcessTest
+from .geometry_test import SpatialHashTest
+from .mol2_test import Mol2Test
+from .ranking_analysis_test import RankingAnalysisTest
+from .batch_anchored_docking_test import BatchAnchoredDockingTest
+from .dock_grid_test import DockGridTest
+from .sph_test import SphereSetTest
+from .funnel_test import DockingFunnelTest
+from .resources_test import ResourceReportTest
+from .orchestration_benchmark_test import OrchestrationBenchmarkTest
+from .parser_benchmark_test import ParserBenchmarkTest
+from .manifest_test import CampaignManifestTest
+from .results_test import ResultsStoreTest
+from .work_queue_test import WorkQueueTest
@@ -1,9 +1,11 @@
 """Test anchor generator"""
 import os
-from tempfile import NamedTemporaryFile
+import shutil
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from unittest import TestCase
 
-from pipeline_elements import BASE_DIR, AnchorGenerator
+from pipeline_elements import BASE_DIR, AnchorGenerator, BatchAnchorGenerator, ResultCache, \
+    Scheduler
 
 
 class AnchorGeneratorTest(TestCase):
@@ -18,3 +20,84 @@ class AnchorGeneratorTest(TestCase):
         self.assertIn('C2,2', output_file.read().decode('utf8'))
         self.assertTrue(anchor_generator.output_exists())
         output_file.close()
+
+    def test_run_with_tolerance(self):
+        """Test anchor generation with slightly differing coordinates"""
+        prepared_ligand = os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_ligand.mol2')
+        template = os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_core.mol2')
+        with TemporaryDirectory() as tmp_dir:
+            shifted_ligand = os.path.join(tmp_dir, 'shifted_ligand.mol2')
+            write_shifted(prepared_ligand, shifted_ligand, 0.003)
+            output_file = os.path.join(tmp_dir, 'anchored_dock.in')
+            AnchorGenerator(shifted_ligand, template, output_file).run()
+            with open(output_file) as anchored_docking_in:
+                self.assertIn('C2,2', anchored_docking_in.read())
+            with self.assertRaises(RuntimeError):
+                AnchorGenerator(shifted_ligand, template, output_file, tolerance=0.001).run()
+
+    def test_batch_run(self):
+        """Test batch anchor generation against one template"""
+        prepared_ligand = os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_ligand.mol2')
+        other_ligand = os.path.join(BASE_DIR, 'tests', 'test_files', '3ryx_ligand.mol2')
+        template = os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_core.mol2')
+        with TemporaryDirectory() as tmp_dir:
+            ligands = [prepared_ligand, other_ligand, prepared_ligand]
+            output_files = [
+                os.path.join(tmp_dir, 'anchored_dock_{}.in'.format(index)) for index in range(3)
+            ]
+            with open(output_files[1], 'w') as stale_anchored_docking_in:
+                stale_anchored_docking_in.write('atom_in_anchor C1,1\n')
+            batch_anchor_generator = BatchAnchorGenerator(ligands, template, output_files).run()
+            self.assertEqual(batch_anchor_generator.failed, [other_ligand])
+            for output_file in output_files[::2]:
+                with open(output_file) as anchored_docking_in:
+                    self.assertIn('C2,2', anchored_docking_in.read())
+            self.assertFalse(os.path.exists(output_files[1]))
+            self.assertTrue(batch_anchor_generator.output_exists())
+
+    def test_batch_rerun(self):
+        """Test a batch with an unanchorable ligand is cached and only changed ligands rerun"""
+        test_files = os.path.join(BASE_DIR, 'tests', 'test_files')
+        template = os.path.join(test_files, '1cbx_core.mol2')
+        with TemporaryDirectory() as tmp_dir:
+            ligands = [os.path.join(tmp_dir, name) for name in ('a.mol2', 'b.mol2', 'c.mol2')]
+            shutil.copy(os.path.join(test_files, '1cbx_ligand.mol2'), ligands[0])
+            shutil.copy(os.path.join(test_files, '3ryx_ligand.mol2'), ligands[1])
+            shutil.copy(os.path.join(test_files, '1cbx_ligand.mol2'), ligands[2])
+            output_files = [os.path.join(tmp_dir, name + '.in') for name in 'abc']
+
+            def batch_anchor_generator():
+                generator = BatchAnchorGenerator(ligands, template, output_files)
+                Scheduler().add(generator, 'anchoring ligands').run()
+                return generator
+
+            self.assertEqual(batch_anchor_generator().failed, [ligands[1]])
+            cached = BatchAnchorGenerator(ligands, template, output_files)
+            self.assertTrue(ResultCache.hit(cached, ResultCache.fingerprint(cached)))
+            self.assertEqual(cached.failed, [ligands[1]])
+
+            # marks the anchors that are not written again
+            for output_file in output_files[::2]:
+                with open(output_file, 'w') as anchored_docking_in:
+                    anchored_docking_in.write('kept')
+            write_shifted(os.path.join(test_files, '1cbx_ligand.mol2'), ligands[2], 0.003)
+            self.assertEqual(batch_anchor_generator().failed, [ligands[1]])
+            with open(output_files[0]) as anchored_docking_in:
+                self.assertEqual(anchored_docking_in.read(), 'kept')
+            with open(output_files[2]) as anchored_docking_in:
+                self.assertIn('C2,2', anchored_docking_in.read())
+
+
+def write_shifted(mol2_file, shifted_mol2_file, shift):
+    """Copy a mol2 file with atoms shifted along x at three decimals precision"""
+    with open(mol2_file) as mol2, open(shifted_mol2_file, 'w') as shifted_mol2:
+        in_atoms = False
+        for line in mol2:
+            if line.startswith('@<TRIPOS>'):
+                in_atoms = line.startswith('@<TRIPOS>ATOM')
+            elif in_atoms and line.strip():
+                columns = line.split()
+                columns[2] = str(float(columns[2]) + shift)
+                columns[2:5] = ['{:.3f}'.format(float(value)) for value in columns[2:5]]
+                line = ' '.join(columns) + '\n'
+            shifted_mol2.write(line)
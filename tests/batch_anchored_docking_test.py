@@ -0,0 +1,85 @@
+"""Test batch anchored docking"""
+import configparser
+import csv
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR, ResourceReport
+from batch_anchored_docking import BatchAnchoredDocking
+from tests.stubs import write_stub_config, write_stubs
+
+
+class BatchAnchoredDockingTest(TestCase):
+    """Test batch anchored docking"""
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(os.path.join(BASE_DIR, 'config.ini'))
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_run(self):
+        """Test batch anchored docking run with RMSD calculation"""
+        protein = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps.pdb'))
+        native_ligand = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_ligand.sdf'))
+        template = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_core.mol2'))
+        ligands = os.path.join(self.tmp_dir.name, 'ligands')
+        os.mkdir(ligands)
+        shutil.copy(os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_ligand.sdf'), ligands)
+        shutil.copy(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cbx_ligand.sdf'),
+            os.path.join(ligands, '1cbx_analog.sdf')
+        )
+        batch_anchored_docking = BatchAnchoredDocking(
+            protein,
+            native_ligand,
+            ligands,
+            template,
+            os.path.join(self.tmp_dir.name, 'output'),
+            self.config,
+            rmsd=True,
+            workers=2
+        ).run()
+        with open(batch_anchored_docking.results) as results:
+            rows = list(csv.reader(results, delimiter='\t'))
+        self.assertEqual(len(rows), 2)
+        for _name, score, docked, rmsd in rows:
+            self.assertTrue(score)
+            self.assertTrue(os.path.exists(docked))
+            self.assertTrue(rmsd)
+
+    def test_rerun(self):
+        """Test a rerun with an unanchorable ligand does not anchor again"""
+        test_files = os.path.join(BASE_DIR, 'tests', 'test_files')
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'), records=3)
+        config = configparser.ConfigParser()
+        config.read(write_stub_config(os.path.join(self.tmp_dir.name, 'config.ini'), stubs))
+        ligands = os.path.join(self.tmp_dir.name, 'ligands')
+        os.mkdir(ligands)
+        shutil.copy(os.path.join(test_files, '1cbx_ligand.sdf'), ligands)
+        shutil.copy(os.path.join(test_files, '1cps_ligand.sdf'), ligands)
+        cached = []
+        for _run in range(2):
+            with ResourceReport() as report:
+                batch_anchored_docking = BatchAnchoredDocking(
+                    os.path.join(test_files, '1cps.pdb'),
+                    os.path.join(test_files, '1cps_ligand.sdf'),
+                    ligands,
+                    os.path.join(test_files, '1cbx_core.mol2'),
+                    os.path.join(self.tmp_dir.name, 'output'),
+                    config,
+                    workers=1
+                ).run()
+            cached.append({step['description']: step['cached'] for step in report.steps})
+        self.assertFalse(cached[0]['anchoring ligands'])
+        self.assertTrue(cached[1]['anchoring ligands'])
+        with open(batch_anchored_docking.results) as results:
+            rows = list(csv.reader(results, delimiter='\t'))
+        self.assertEqual([row[0] for row in rows], ['1cbx_ligand', '1cps_ligand'])
+        self.assertTrue(rows[0][1])
+        self.assertFalse(rows[1][1])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
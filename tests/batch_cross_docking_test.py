@@ -0,0 +1,71 @@
+"""Test batch cross docking"""
+import configparser
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR
+from batch_cross_docking import BatchCrossDocking, split_ligands
+
+
+class BatchCrossDockingTest(TestCase):
+    """Test batch cross docking"""
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(os.path.join(BASE_DIR, 'config.ini'))
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_run(self):
+        """Test batch cross docking run"""
+        protein = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps.pdb'))
+        native_ligand = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_ligand.sdf'))
+        ligands = os.path.join(self.tmp_dir.name, 'ligands')
+        os.mkdir(ligands)
+        for ligand in ['1cbx_ligand.sdf', '1cps_ligand.sdf']:
+            shutil.copy(os.path.join(BASE_DIR, 'tests', 'test_files', ligand), ligands)
+        batch_cross_docking = BatchCrossDocking(
+            protein,
+            native_ligand,
+            ligands,
+            os.path.join(self.tmp_dir.name, 'output'),
+            self.config,
+            workers=2
+        ).run()
+        with open(batch_cross_docking.results) as results:
+            self.assertEqual(len(results.readlines()), 2)
+
+    def test_split_ligands(self):
+        """Test splitting a multi-molecule SDF file"""
+        multi_ligand = os.path.join(self.tmp_dir.name, 'ligands.sdf')
+        with open(multi_ligand, 'w') as multi_ligand_file:
+            for ligand in ['1cbx_ligand.sdf', '1cps_ligand.sdf']:
+                with open(os.path.join(BASE_DIR, 'tests', 'test_files', ligand)) as ligand_file:
+                    multi_ligand_file.write(ligand_file.read())
+        ligands = split_ligands(multi_ligand, os.path.join(self.tmp_dir.name, 'split'))
+        self.assertEqual(len(ligands), 2)
+        for ligand in ligands:
+            with open(ligand) as ligand_file:
+                self.assertEqual(ligand_file.read().count('$$$$'), 1)
+
+    def test_split_ligands_directory(self):
+        """Test ligand files of a directory must have unique names"""
+        ligands = os.path.join(self.tmp_dir.name, 'ligands')
+        os.mkdir(ligands)
+        test_files = os.path.join(BASE_DIR, 'tests', 'test_files')
+        for ligand in ['1cbx_ligand.sdf', '1cps_ligand.sdf', '1cbx_ligand.mol2']:
+            shutil.copy(os.path.join(test_files, ligand), ligands)
+        with open(os.path.join(ligands, 'notes.txt'), 'w') as notes:
+            notes.write('not a ligand')
+        with self.assertRaisesRegex(RuntimeError, '1cbx_ligand'):
+            split_ligands(ligands, os.path.join(self.tmp_dir.name, 'split'))
+        os.remove(os.path.join(ligands, '1cbx_ligand.mol2'))
+        self.assertEqual(
+            split_ligands(ligands, os.path.join(self.tmp_dir.name, 'split')),
+            [os.path.join(ligands, '1cbx_ligand.sdf'), os.path.join(ligands, '1cps_ligand.sdf')]
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,65 @@
+"""Test result cache"""
+import configparser
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import ResultCache
+from .scheduler_test import FileCopy
+
+
+class ConfiguredFileCopy(FileCopy):
+    """File copy depending on a config parameter"""
+    PARAMETERS = ('sphere_radius',)
+
+    def __init__(self, source, target, config):
+        super().__init__(source, target, [])
+        self.config = config
+
+
+class ResultCacheTest(TestCase):
+    """Test result cache"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.source = os.path.join(self.tmp_dir.name, 'source')
+        self.target = os.path.join(self.tmp_dir.name, 'target')
+        with open(self.source, 'w') as source:
+            source.write('content')
+        self.config = configparser.ConfigParser()
+        self.config.read_dict({'Parameters': {'sphere_radius': '10'}})
+
+    def test_hit(self):
+        """Test a stored fingerprint is a hit"""
+        element = ConfiguredFileCopy(self.source, self.target, self.config)
+        fingerprint = ResultCache.fingerprint(element)
+        self.assertFalse(ResultCache.hit(element, fingerprint))
+        element.run()
+        ResultCache.store(element, fingerprint)
+        self.assertTrue(ResultCache.hit(element, ResultCache.fingerprint(element)))
+
+    def test_input_change(self):
+        """Test changed input contents invalidate the cache"""
+        element = ConfiguredFileCopy(self.source, self.target, self.config).run()
+        ResultCache.store(element, ResultCache.fingerprint(element))
+        with open(self.source, 'w') as source:
+            source.write('changed')
+        self.assertFalse(ResultCache.hit(element, ResultCache.fingerprint(element)))
+
+    def test_parameter_change(self):
+        """Test changed config parameters invalidate the cache"""
+        element = ConfiguredFileCopy(self.source, self.target, self.config).run()
+        ResultCache.store(element, ResultCache.fingerprint(element))
+        self.config['Parameters']['sphere_radius'] = '8'
+        self.assertFalse(ResultCache.hit(element, ResultCache.fingerprint(element)))
+
+    def test_missing_output(self):
+        """Test missing outputs are never a hit"""
+        element = ConfiguredFileCopy(self.source, self.target, self.config).run()
+        fingerprint = ResultCache.fingerprint(element)
+        ResultCache.store(element, fingerprint)
+        os.remove(self.target)
+        self.assertFalse(ResultCache.hit(element, fingerprint))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,178 @@
+"""Test memory mapped DOCK grids"""
+from array import array
+import math
+import os
+import random
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR
+from pipeline_elements.dock_grid import DockGrid, GridScorer, read_header, read_vdw_definitions, \
+    write_dock_grid
+from pipeline_elements.mol2 import read_molecules
+
+VDW_DEFINITIONS = '''name                    C_3
+atom_model              a
+radius                  1.9080
+well_depth              0.1094
+definition              C.*
+
+name                    H
+atom_model              a
+radius                  0.6000
+well_depth              0.0157
+definition              H ( C.* )
+
+name                    O
+atom_model              e
+radius                  1.6612
+well_depth              0.2100
+definition              O.*
+'''
+
+POSE = '''########## Name: pose
+@<TRIPOS>MOLECULE
+pose
+ 2 1 1 0 0
+SMALL
+USER_CHARGES
+
+@<TRIPOS>ATOM
+      1 C1          0.2000    0.5000    0.2500 C.3     1  LIG         0.5000
+      2 O2          0.2500    0.5000    1.0000 O.2     1  LIG        -0.2500
+@<TRIPOS>BOND
+     1     1     2 2
+'''
+
+
+class DockGridTest(TestCase):
+    """Test memory mapped DOCK grids"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp_dir.name, 'grid')
+        self.span = (4, 3, 5)
+        points = [
+            (x, y, z) for z in range(self.span[2]) for y in range(self.span[1])
+            for x in range(self.span[0])
+        ]
+        # linear fields are interpolated exactly
+        write_dock_grid(
+            self.prefix,
+            (-1.0, 0.0, 0.0),
+            0.5,
+            self.span,
+            [x + 2 * y + 3 * z for x, y, z in points],
+            [1.0] * len(points),
+            [z for _x, _y, z in points],
+            bump=[30 if x == 0 else 255 for x, _y, _z in points]
+        )
+
+    def test_read(self):
+        """Test reading grid header and values"""
+        with DockGrid(self.prefix) as grid:
+            self.assertEqual(grid.span, self.span)
+            self.assertEqual(grid.origin, (-1.0, 0.0, 0.0))
+            self.assertEqual(grid.spacing, 0.5)
+            self.assertEqual((grid.attractive_exponent, grid.repulsive_exponent), (6, 12))
+            self.assertEqual(grid.avdw[grid.index(3, 2, 4)], 3 + 4 + 12)
+            self.assertAlmostEqual(grid.interpolate(grid.avdw, (-0.25, 0.75, 1.1)), 1.5 + 3 + 6.6, 5)
+            self.assertIsNone(grid.interpolate(grid.avdw, (0.6, 0.0, 0.0)))
+            self.assertAlmostEqual(grid.interpolate(grid.es, (0.5, 1.0, 2.0)), 4.0)
+            self.assertTrue(grid.bumps((-1.1, 0.5, 0.5), 3.5))
+            self.assertFalse(grid.bumps((-1.1, 0.5, 0.5), 2.5))
+            self.assertFalse(grid.bumps((0.0, 0.5, 0.5), 3.5))
+
+    def test_read_header(self):
+        """Test reading the header of a grid written by DOCK"""
+        size, spacing, _origin_x, _origin_y, _origin_z, span_x, span_y, span_z = read_header(
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'grid.bmp'))
+        self.assertAlmostEqual(spacing, 0.3)
+        self.assertEqual(size, span_x * span_y * span_z)
+
+    def test_score(self):
+        """Test grid score of a pose"""
+        definitions_path = os.path.join(self.tmp_dir.name, 'vdw.defn')
+        with open(definitions_path, 'w') as definitions_file:
+            definitions_file.write(VDW_DEFINITIONS)
+        definitions = read_vdw_definitions(definitions_path)
+        self.assertEqual([pattern for pattern, _radius, _depth in definitions], ['C.*', 'H', 'O.*'])
+        docked = os.path.join(self.tmp_dir.name, 'docked.mol2')
+        with open(docked, 'w') as docked_file:
+            docked_file.write(POSE + POSE.replace('0.2000', '9.0000'))
+        with DockGrid(self.prefix) as grid:
+            scorer = GridScorer(grid, definitions)
+            scores = list(scorer.rescore(docked))
+            self.assertEqual(len(scores), 2)
+            grid_score, vdw, es, bumps = scores[0][1]
+            expected_vdw = 0.0
+            for atom_type, point in (('C.3', (0.2, 0.5, 0.25)), ('O.2', (0.25, 0.5, 1.0))):
+                repulsive, attractive, _radius = scorer.coefficients(atom_type)
+                position = [(coordinate - origin) / 0.5
+                            for coordinate, origin in zip(point, (-1.0, 0.0, 0.0))]
+                expected_vdw += repulsive * (position[0] + 2 * position[1] + 3 * position[2])
+                expected_vdw -= attractive
+            self.assertAlmostEqual(vdw, expected_vdw, 4)
+            self.assertAlmostEqual(es, 0.5 * 0.5 - 0.25 * 2.0)
+            self.assertAlmostEqual(grid_score, vdw + es)
+            self.assertEqual(bumps, 0)
+            self.assertIsNone(scores[1][1])
+            columns = scorer.rescore_columns(docked)
+            self.assertAlmostEqual(columns['grid_score'][0], grid_score)
+            self.assertTrue(math.isnan(columns['grid_score'][1]))
+
+    def test_interpolate_points(self):
+        """Test batch interpolation matches interpolating point by point"""
+        generator = random.Random(5)
+        points = [
+            (generator.uniform(-1.2, 0.7), generator.uniform(-0.2, 1.2),
+             generator.uniform(-0.2, 2.2))
+            for _point in range(100)
+        ]
+        with DockGrid(self.prefix) as grid:
+            values = grid.interpolate_points(*zip(*points))
+            bump = grid.bump_points(*zip(*points))
+            for index, point in enumerate(points):
+                for grid_values, batch_values in zip((grid.avdw, grid.bvdw, grid.es), values):
+                    expected = grid.interpolate(grid_values, point)
+                    if expected is None:
+                        self.assertTrue(math.isnan(batch_values[index]))
+                    else:
+                        self.assertAlmostEqual(batch_values[index], expected, 5)
+                self.assertEqual(bump[index] < 25, grid.bumps(point, 2.5))
+
+    def test_score_docked(self):
+        """Test bumps of poses docked by DOCK on the grid DOCK wrote"""
+        test_files = os.path.join(BASE_DIR, 'tests', 'test_files')
+        size, spacing, origin_x, origin_y, origin_z, span_x, span_y, span_z = read_header(
+            os.path.join(test_files, 'grid.bmp'))
+        # no energy grid is shipped, so only the bumps are compared
+        zero = array('f', bytes(4 * size))
+        write_dock_grid(
+            self.prefix, (origin_x, origin_y, origin_z), spacing, (span_x, span_y, span_z),
+            zero, zero, zero
+        )
+        shutil.copy(os.path.join(test_files, 'grid.bmp'), self.prefix + '.bmp')
+        definitions_path = os.path.join(self.tmp_dir.name, 'vdw.defn')
+        with open(definitions_path, 'w') as definitions_file:
+            definitions_file.write(VDW_DEFINITIONS)
+        docked = os.path.join(test_files, 'docked_scored.mol2')
+        poses = list(read_molecules(docked))
+        with DockGrid(self.prefix) as grid:
+            scorer = GridScorer(grid, read_vdw_definitions(definitions_path))
+            scores = [score for _name, score in scorer.rescore(docked, batch_size=7)]
+            self.assertEqual(len(scores), len(poses))
+            for pose, (grid_score, _vdw, _es, bumps) in zip(poses, scores):
+                self.assertEqual(grid_score, 0.0)
+                self.assertEqual(bumps, sum(
+                    grid.bumps(pose.coordinate(index), scorer.coefficients(atom_type)[2])
+                    for index, atom_type in enumerate(pose.atom_types)
+                ))
+                # DOCK scored clashing poses positive
+                if pose.value('Grid_Score') > 0:
+                    self.assertGreater(bumps, 0)
+            self.assertEqual(scores[0][3], 0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
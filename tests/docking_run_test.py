@@ -75,5 +75,33 @@ class DockingRunTest(TestCase):
             self.assertIn('HA_RMSDh', docked_ligands_data)  # graph matched min RMSD
             self.assertIn('HA_RMSDm', docked_ligands_data)  # greedy min RMSD
 
+    def test_run_with_shards(self):
+        """Test sharded docking run of a ligand library"""
+        ligand = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_h_ligand.mol2'))
+        selected_spheres = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'selected_spheres.sph'))
+        grid_prefix = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', 'grid'))
+        library = os.path.join(self.tmp_dir.name, 'library.mol2')
+        with open(ligand) as ligand_file, open(library, 'w') as library_file:
+            ligand_data = ligand_file.read()
+            library_file.write(ligand_data * 3)
+        docking_run = DockingRun(
+            library,
+            selected_spheres,
+            grid_prefix,
+            os.path.join(self.tmp_dir.name, 'dock'),
+            self.config,
+            shards=2
+        ).run()
+        self.assertTrue(docking_run.output_exists())
+        scores = []
+        with open(docking_run.docked) as docked_ligands:
+            for line in docked_ligands:
+                if line.startswith('##########') and 'Grid_Score:' in line:
+                    scores.append(float(line.split()[-1]))
+        self.assertTrue(scores)
+        self.assertEqual(scores, sorted(scores))
+
     def tearDown(self):
         self.tmp_dir.cleanup()
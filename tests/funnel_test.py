@@ -0,0 +1,100 @@
+"""Test docking funnel"""
+import configparser
+import csv
+import math
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR, DockingFunnel
+from pipeline_elements.funnel import best_grid_scores, select_survivors, write_funnel_results, \
+    write_molecules
+from pipeline_elements.mol2 import read_molecules
+
+POSE = '''##########                                Name:         {name}
+##########                          Grid_Score:          {score}
+@<TRIPOS>MOLECULE
+{name}
+ 1 0 1 0 0
+SMALL
+USER_CHARGES
+
+@<TRIPOS>ATOM
+      1 C1          0.0000    0.0000    0.0000 C.3     1  LIG         0.0000
+'''
+
+
+class DockingFunnelTest(TestCase):
+    """Test docking funnel"""
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(os.path.join(BASE_DIR, 'config.ini'))
+        self.tmp_dir = TemporaryDirectory()
+
+    def write_poses(self, name, poses):
+        """Write a MOL2 file of poses with names and grid scores"""
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w') as mol2_file:
+            for pose_name, score in poses:
+                mol2_file.write(POSE.format(name=pose_name, score=score))
+        return path
+
+    def test_run(self):
+        """Test docking funnel run"""
+        ligand = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_h_ligand.mol2'))
+        selected_spheres = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'selected_spheres.sph'))
+        grid_prefix = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', 'grid'))
+        docking_funnel = DockingFunnel(
+            ligand,
+            selected_spheres,
+            grid_prefix,
+            self.tmp_dir.name,
+            self.config,
+            top_k=1
+        ).run()
+        self.assertTrue(os.path.exists(docking_funnel.prescreen_docked))
+        self.assertTrue(os.path.exists(docking_funnel.docked))
+        self.assertTrue(docking_funnel.output_exists())
+
+    def test_select_survivors(self):
+        """Test selecting the best ligands of the prescreen"""
+        docked = self.write_poses('docked.mol2', [
+            ('a', -10.0), ('b', -30.0), ('a', -20.0), ('c', -5.0), ('d', 'nan_score')
+        ])
+        scores = best_grid_scores(docked)
+        self.assertEqual(list(scores), ['a', 'b', 'c', 'd'])
+        self.assertEqual(scores['a'], -20.0)
+        self.assertEqual(scores['d'], math.inf)
+        self.assertEqual(select_survivors(scores, top_k=2), ['b', 'a'])
+        self.assertEqual(select_survivors(scores, score_threshold=-10.0), ['b', 'a'])
+        self.assertEqual(select_survivors(scores, top_k=1, score_threshold=-10.0), ['b'])
+        self.assertEqual(select_survivors(scores, top_k=10), ['b', 'a', 'c'])
+
+    def test_write_survivors_and_results(self):
+        """Test writing survivors and the scores of both stages"""
+        ligands = self.write_poses('ligands.mol2', [('a', 0), ('b', 0), ('c', 0)])
+        survivors = os.path.join(self.tmp_dir.name, 'survivors.mol2')
+        write_molecules(ligands, ['c', 'a'], survivors)
+        self.assertEqual(
+            [molecule.name for molecule in read_molecules(survivors)], ['a', 'c'])
+        results = os.path.join(self.tmp_dir.name, 'funnel.tsv')
+        write_funnel_results(results, {'a': -2.0, 'b': math.inf, 'c': -1.0}, {'a': -4.0})
+        with open(results) as results_file:
+            rows = list(csv.reader(results_file, delimiter='\t'))
+        self.assertEqual(rows, [
+            ['name', 'prescreen_grid_score', 'full_grid_score'],
+            ['a', '-2.0', '-4.0'],
+            ['b', '', ''],
+            ['c', '-1.0', '']
+        ])
+
+    def test_requires_criterion(self):
+        """Test a funnel without a survivor criterion is rejected"""
+        with self.assertRaises(RuntimeError):
+            DockingFunnel('ligand.mol2', 'spheres.sph', 'grid', self.tmp_dir.name, self.config)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
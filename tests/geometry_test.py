@@ -0,0 +1,26 @@
+"""Test spatial lookups"""
+import random
+from unittest import TestCase
+
+from pipeline_elements.geometry import SpatialHash, squared_distance
+
+
+class SpatialHashTest(TestCase):
+    """Test spatial hash"""
+
+    def test_neighbours(self):
+        """Test neighbours match a brute force search"""
+        generator = random.Random(7)
+        points = [
+            tuple(generator.uniform(-20, 20) for _coordinate in range(3)) for _point in range(500)
+        ]
+        spatial_hash = SpatialHash(points, 4.0)
+        for _query in range(50):
+            query = tuple(generator.uniform(-25, 25) for _coordinate in range(3))
+            for radius in (1.0, 4.0, 9.5):
+                expected = [
+                    index for index, point in enumerate(points)
+                    if squared_distance(query, point) < radius * radius
+                ]
+                self.assertEqual(sorted(spatial_hash.neighbours(query, radius)), expected)
+                self.assertEqual(spatial_hash.any_within(query, radius), bool(expected))
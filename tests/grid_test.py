@@ -4,7 +4,9 @@ import os
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 
-from pipeline_elements import BASE_DIR, GridGeneration
+from pipeline_elements import BASE_DIR, DirectoryStore, GridGeneration
+from pipeline_elements.grid import grid_key, grid_points, sphere_box, write_box_pdb
+from pipeline_elements.sph import SphereSet
 
 
 class GridGenerationTest(TestCase):
@@ -31,5 +33,75 @@ class GridGenerationTest(TestCase):
         self.assertTrue(os.path.exists(grid_generation.bump_grid))
         self.assertTrue(grid_generation.output_exists())
 
+    def test_box(self):
+        """Test building the box around spheres"""
+        spheres = SphereSet()
+        spheres.append(1, (0.0, 0.0, 0.0), 1.0)
+        spheres.append(2, (4.0, 2.0, -2.0), 2.0)
+        center, dimensions = sphere_box(spheres, margin=5.0)
+        self.assertEqual(center, (2.5, 1.5, -1.5))
+        self.assertEqual(dimensions, (17.0, 15.0, 15.0))
+        self.assertEqual(grid_points((3.0, 3.1, 0.0), 0.3), 11 * 12 * 1)
+        box = os.path.join(self.tmp_dir.name, 'box.pdb')
+        write_box_pdb(center, dimensions, box)
+        with open(box) as box_file:
+            lines = box_file.readlines()
+        corners = [line for line in lines if line.startswith('ATOM')]
+        self.assertEqual(len(corners), 8)
+        self.assertEqual(
+            [float(value) for value in corners[0][30:54].split()], [-6.0, -6.0, -9.0])
+        self.assertEqual(
+            [float(value) for value in corners[6][30:54].split()], [11.0, 9.0, 6.0])
+        self.assertEqual(len([line for line in lines if line.startswith('CONECT')]), 8)
+
+    def test_max_grid_points(self):
+        """Test the grid point budget is enforced before running grid"""
+        self.config['Execution']['max_grid_points'] = '1000'
+        grid_generation = GridGeneration(
+            os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_h_active_site.mol2'),
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'selected_spheres.sph'),
+            self.tmp_dir.name,
+            self.config
+        )
+        with self.assertRaisesRegex(RuntimeError, 'max_grid_points'):
+            grid_generation.run()
+        self.assertGreater(grid_generation.grid_points, 1000)
+        self.assertTrue(os.path.exists(grid_generation.box))
+
+    def test_grid_store(self):
+        """Test stored grids are linked instead of generated"""
+        vdw = os.path.join(self.tmp_dir.name, 'vdw.defn')
+        with open(vdw, 'w') as vdw_file:
+            vdw_file.write('definitions')
+        self.config['Parameters']['vdw'] = vdw
+        self.config['Execution']['grid_store'] = os.path.join(self.tmp_dir.name, 'store')
+        active_site = os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_h_active_site.mol2')
+        grid_generation = GridGeneration(
+            active_site,
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'selected_spheres.sph'),
+            os.path.join(self.tmp_dir.name, 'grid'),
+            self.config
+        )
+        # stop before grid runs to write the box only
+        self.config['Execution']['max_grid_points'] = '1'
+        with self.assertRaises(RuntimeError):
+            grid_generation.run()
+        self.config['Execution']['max_grid_points'] = '0'
+
+        stored = os.path.join(self.tmp_dir.name, 'stored')
+        os.mkdir(stored)
+        for grid in ('grid.nrg', 'grid.bmp'):
+            with open(os.path.join(stored, grid), 'w') as grid_file:
+                grid_file.write(grid)
+        store = DirectoryStore(self.config['Execution']['grid_store'])
+        entry = store.add(
+            grid_key(active_site, grid_generation.box, grid_generation.grid_template, self.config),
+            stored
+        )
+        grid_generation.run()
+        self.assertTrue(os.path.samefile(
+            os.path.join(entry, 'grid.nrg'), grid_generation.energy_grid))
+        self.assertTrue(grid_generation.output_exists())
+
     def tearDown(self):
         self.tmp_dir.cleanup()
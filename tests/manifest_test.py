@@ -0,0 +1,106 @@
+"""Test the campaign manifest"""
+import configparser
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from campaign import Campaign
+from pipeline_elements import BASE_DIR, CampaignManifest, Scheduler
+from pipeline_elements.manifest import DONE, FAILED, PENDING, RUNNING, job_status
+from tests.scheduler_test import FileCopy
+from tests.stubs import write_stub_config, write_stubs
+
+TEST_FILES = os.path.join(BASE_DIR, 'tests', 'test_files')
+
+
+class CampaignManifestTest(TestCase):
+    """Test the campaign manifest"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.manifest = CampaignManifest(os.path.join(self.tmp_dir.name, 'campaign.sqlite'))
+
+    def test_transitions(self):
+        """Test jobs move through their statuses and count their attempts"""
+        self.assertTrue(self.manifest.add_job('a', 'self_docking', {'protein': 'p'}, 'out/a'))
+        self.assertFalse(self.manifest.add_job('a', 'self_docking', {}, 'out/a'))
+        self.manifest.add_job('b', 'cross_docking', {}, 'out/b')
+        self.assertEqual(self.manifest.unfinished(), ['a', 'b'])
+
+        self.assertTrue(self.manifest.start_job('a'))
+        self.assertFalse(self.manifest.start_job('a'))
+        self.assertEqual(self.manifest.job('a')['status'], RUNNING)
+        self.manifest.finish_job('a')
+        self.assertFalse(self.manifest.start_job('a'))
+
+        self.manifest.start_job('b')
+        self.manifest.finish_job('b', error='docking failed')
+        job = self.manifest.job('b')
+        self.assertEqual(job['status'], FAILED)
+        self.assertEqual(job['error'], 'docking failed')
+        self.assertEqual(self.manifest.unfinished(), [])
+        self.assertEqual(self.manifest.unfinished(max_attempts=2), ['b'])
+        self.assertTrue(self.manifest.start_job('b'))
+        self.assertEqual(self.manifest.job('b')['attempts'], 2)
+        self.assertEqual(self.manifest.job('a')['arguments'], {'protein': 'p'})
+        self.assertEqual(self.manifest.counts()[DONE], 1)
+
+    def test_recover(self):
+        """Test jobs and elements left running by a crash are pending again"""
+        self.manifest.add_job('a', 'self_docking', {}, 'out/a')
+        self.manifest.start_job('a')
+        self.manifest.start_element('a', 'docking', 'DockingRun', ['out/a/dock'])
+        reopened = CampaignManifest(self.manifest.path)
+        self.assertEqual(reopened.recover(), 1)
+        self.assertEqual(reopened.job('a')['status'], PENDING)
+        self.assertEqual(reopened.elements('a')[0]['status'], PENDING)
+        self.assertEqual(reopened.unfinished(), ['a'])
+
+    def test_elements(self):
+        """Test scheduler steps of a running job are recorded"""
+        source = os.path.join(self.tmp_dir.name, 'source')
+        with open(source, 'w') as source_file:
+            source_file.write('content')
+        target = os.path.join(self.tmp_dir.name, 'target')
+        self.manifest.add_job('a', 'self_docking', {}, self.tmp_dir.name)
+        with job_status(self.manifest, 'a'):
+            Scheduler().add(FileCopy(source, target, []), 'copy').run()
+            Scheduler().add(FileCopy(source, target, []), 'copy again').run()
+        with self.assertRaises(RuntimeError):
+            with job_status(self.manifest, 'a'):
+                pass
+        elements = {element['description']: element for element in self.manifest.elements('a')}
+        self.assertEqual(elements['copy']['status'], DONE)
+        self.assertEqual(elements['copy']['outputs'], [target])
+        self.assertFalse(elements['copy']['cached'])
+        self.assertTrue(elements['copy again']['cached'])
+        self.assertEqual(self.manifest.job('a')['status'], DONE)
+
+    def test_campaign_resume(self):
+        """Test a restarted campaign only runs the unfinished jobs"""
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'), records=3)
+        config = configparser.ConfigParser()
+        config.read(write_stub_config(os.path.join(self.tmp_dir.name, 'config.ini'), stubs))
+        jobs_tsv = os.path.join(self.tmp_dir.name, 'jobs.tsv')
+        with open(jobs_tsv, 'w') as jobs_file:
+            jobs_file.write('name\tworkflow\tprotein\tnative_ligand\tdocking_ligand\n')
+            for name, ligand in (('good', '1cbx_ligand.sdf'), ('bad', 'missing.sdf')):
+                jobs_file.write('{}\tcross_docking\t{}\t{}\t{}\n'.format(
+                    name, os.path.join(TEST_FILES, '1cps.pdb'),
+                    os.path.join(TEST_FILES, '1cps_ligand.sdf'), os.path.join(TEST_FILES, ligand)))
+        output = os.path.join(self.tmp_dir.name, 'campaign')
+
+        campaign = Campaign(jobs_tsv, output, config, max_attempts=2).run()
+        manifest = CampaignManifest(campaign.manifest_path)
+        self.assertEqual(manifest.job('good')['status'], DONE)
+        self.assertEqual(manifest.job('bad')['status'], FAILED)
+        self.assertTrue(os.path.exists(os.path.join(output, 'good', 'dock', 'docked_scored.mol2')))
+        self.assertIn('docking', [
+            element['description'] for element in manifest.elements('good')])
+
+        Campaign(jobs_tsv, output, config, max_attempts=2).run()
+        self.assertEqual(manifest.job('good')['attempts'], 1)
+        self.assertEqual(manifest.job('bad')['attempts'], 2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,58 @@
+"""Test MOL2 reader and writer"""
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR
+from pipeline_elements.mol2 import Mol2Writer, read_molecules
+
+
+class Mol2Test(TestCase):
+    """Test MOL2 reader and writer"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.docked = os.path.join(BASE_DIR, 'tests', 'test_files', 'docked_scored.mol2')
+
+    def test_read_molecules(self):
+        """Test reading headers, atoms and bonds"""
+        molecules = list(read_molecules(self.docked))
+        self.assertGreater(len(molecules), 1)
+        top_pose = molecules[0]
+        self.assertEqual(top_pose.name, '1cbx_ligand')
+        self.assertEqual(top_pose.title, '1cbx_ligand')
+        self.assertAlmostEqual(top_pose.value('Grid_Score'), -27.732277)
+        self.assertAlmostEqual(top_pose.value('HA_RMSDh'), 2.4152)
+        self.assertIsNone(top_pose.value('Missing_Score'))
+        self.assertEqual(len(top_pose), 25)
+        self.assertEqual(len(top_pose.bond_types), 25)
+        self.assertEqual(top_pose.atom_names[0], 'C1')
+        self.assertEqual(top_pose.atom_types[0], 'C.2')
+        self.assertEqual(top_pose.coordinate(0), (-0.7131, 29.1198, -8.0239))
+        self.assertIn('##########', top_pose.text.splitlines()[1])
+
+    def test_header_only(self):
+        """Test header only reading keeps positions but not the text"""
+        molecules = list(read_molecules(self.docked))
+        headers = list(read_molecules(self.docked, header_only=True))
+        self.assertEqual(len(molecules), len(headers))
+        with open(self.docked, 'rb') as docked_file:
+            for molecule, header in zip(molecules, headers):
+                self.assertIsNone(header.text)
+                self.assertEqual(molecule.headers, header.headers)
+                docked_file.seek(header.offset)
+                self.assertEqual(
+                    docked_file.read(header.length).decode('utf8'), molecule.text)
+
+    def test_write(self):
+        """Test writing molecules from text and from their source reproduces the file"""
+        for header_only in (False, True):
+            written = os.path.join(self.tmp_dir.name, 'written.mol2')
+            with Mol2Writer(written) as writer:
+                for molecule in read_molecules(self.docked, header_only=header_only):
+                    writer.write(molecule)
+            with open(self.docked, 'rb') as docked_file, open(written, 'rb') as written_file:
+                self.assertEqual(docked_file.read(), written_file.read())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,31 @@
+"""Test the orchestration benchmark with stand-in binaries"""
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+# a module import, the benchmark imports its stand-ins from the tests package
+from benchmarks import orchestration
+from tests.stubs import write_stub_config, write_stubs
+
+
+class OrchestrationBenchmarkTest(TestCase):
+    """Test the orchestration benchmark with stand-in binaries"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'), records=3)
+        self.config_path = write_stub_config(
+            os.path.join(self.tmp_dir.name, 'config.ini'), stubs)
+
+    def test_benchmark(self):
+        """Test every workflow runs against the stand-in binaries"""
+        for workflow in orchestration.WORKFLOWS:
+            result = orchestration.benchmark(workflow, 1, 1, self.tmp_dir.name, self.config_path)
+            self.assertEqual(result['jobs'], 1)
+            self.assertGreater(result['jobs_per_second'], 0)
+            self.assertGreater(result['binary_time_per_job'], 0)
+            docked = os.path.join(self.tmp_dir.name, workflow + '_0', 'dock', 'docked_scored.mol2')
+            self.assertTrue(os.path.exists(docked))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
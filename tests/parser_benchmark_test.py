@@ -0,0 +1,57 @@
+"""Test the parser benchmark and its synthetic inputs"""
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from benchmarks.generators import write_docked_poses, write_template
+from benchmarks.parsers import PARSERS, benchmark, scaling_exponent
+from pipeline_elements.anchor import AnchorGenerator
+from pipeline_elements.rmsd_analysis import RmsdAnalysis
+
+
+class ParserBenchmarkTest(TestCase):
+    """Test the parser benchmark and its synthetic inputs"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_docked_poses(self):
+        """Test generated poses are parsed with all header fields"""
+        docked = os.path.join(self.tmp_dir.name, 'docked.mol2')
+        write_docked_poses(docked, 50, atoms=10)
+        rmsd_analysis = RmsdAnalysis(docked, all_poses=True).run()
+        self.assertEqual(len(rmsd_analysis.columns['pose']), 50)
+        self.assertIsNotNone(rmsd_analysis.top_rmsd)
+        grid_scores = list(rmsd_analysis.columns['grid_score'])
+        self.assertEqual(grid_scores, sorted(grid_scores))
+
+    def test_template(self):
+        """Test the anchor of a generated template is found in the ligand"""
+        template = os.path.join(self.tmp_dir.name, 'template.mol2')
+        ligand = os.path.join(self.tmp_dir.name, 'ligand.mol2')
+        output = os.path.join(self.tmp_dir.name, 'anchored.in')
+        anchor = write_template(template, ligand, 200)
+        AnchorGenerator(ligand, template, output).run()
+        with open(output) as anchored_docking_in:
+            self.assertIn('C{0},{0}'.format(anchor), anchored_docking_in.read())
+
+    def test_scaling_exponent(self):
+        """Test the scaling exponent of linear and quadratic measurements"""
+        sizes = [10, 100, 1000]
+        self.assertAlmostEqual(scaling_exponent(sizes, [2 * size for size in sizes]), 1.0)
+        self.assertAlmostEqual(scaling_exponent(sizes, [size * size for size in sizes]), 2.0)
+        with self.assertRaises(RuntimeError):
+            scaling_exponent([10], [1.0])
+
+    def test_benchmark(self):
+        """Test every parser is measured at every size"""
+        for parser in PARSERS:
+            results = benchmark(parser, [20, 40], self.tmp_dir.name, repeats=1)
+            self.assertEqual([result['size'] for result in results], [20, 40])
+            for result in results:
+                self.assertGreater(result['time'], 0)
+                self.assertGreater(result['peak_memory'], 0)
+            self.assertLess(results[0]['input_bytes'], results[1]['input_bytes'])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -29,5 +29,24 @@ class ReceptorPreparationTest(TestCase):
         self.assertTrue(os.path.exists(receptor_preparation.selected_spheres))
         self.assertTrue(receptor_preparation.output_exists())
 
+    def test_run_with_receptor_store(self):
+        """Test receptor preparation reusing a stored receptor"""
+        protein = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps.pdb'))
+        ligand = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_ligand.sdf'))
+        self.config['Execution']['receptor_store'] = os.path.join(self.tmp_dir.name, 'store')
+        ReceptorPreparation(
+            protein,
+            ligand,
+            os.path.join(self.tmp_dir.name, 'first'),
+            self.config
+        ).run()
+        receptor_preparation = ReceptorPreparation(
+            protein,
+            ligand,
+            os.path.join(self.tmp_dir.name, 'second'),
+            self.config
+        ).run()
+        self.assertTrue(receptor_preparation.output_exists())
+
     def tearDown(self):
         self.tmp_dir.cleanup()
@@ -1,10 +1,13 @@
 """Test preparation"""
 import configparser
 import os
+import shutil
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 
-from pipeline_elements import BASE_DIR, Preparation
+from pipeline_elements import BASE_DIR, Preparation, BatchPreparation
+from pipeline_elements.prepare import write_active_site
+from tests.stubs import write_stub_config, write_stubs
 
 
 class PreparationTest(TestCase):
@@ -37,5 +40,79 @@ class PreparationTest(TestCase):
         self.assertTrue(os.path.exists(preparation.converted_ligand))
         self.assertTrue(preparation.output_exists())
 
+    def test_write_active_site(self):
+        """Test active site selection of whole residues without water"""
+        protein = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps.pdb'))
+        ligand = os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', '1cps_ligand.sdf'))
+        active_site_pdb = os.path.join(self.tmp_dir.name, 'active_site.pdb')
+        write_active_site(protein, ligand, 15.0, active_site_pdb)
+        with open(active_site_pdb) as active_site_file:
+            records = [line for line in active_site_file if line.startswith(('ATOM', 'HETATM'))]
+        residues = {(line[21], line[22:27]) for line in records}
+        self.assertEqual(len(residues), 159)
+        self.assertFalse([line for line in records if line[17:20] == 'HOH'])
+        with open(protein) as protein_file:
+            residue_sizes = {}
+            for line in protein_file:
+                if line.startswith(('ATOM', 'HETATM')):
+                    residue = (line[21], line[22:27])
+                    residue_sizes[residue] = residue_sizes.get(residue, 0) + 1
+        self.assertEqual(len(records), sum(residue_sizes[residue] for residue in residues))
+
+    def test_batch_run(self):
+        """Test batch ligand preparation with a failing ligand"""
+        ligands = [
+            os.path.abspath(os.path.join(BASE_DIR, 'tests', 'test_files', ligand))
+            for ligand in ['1cbx_ligand.sdf', '1cps_ligand.sdf']
+        ]
+        broken_ligand = os.path.join(self.tmp_dir.name, 'broken.sdf')
+        with open(broken_ligand, 'w') as broken_ligand_file:
+            broken_ligand_file.write('not a molecule\n')
+        batch_preparation = BatchPreparation(
+            ligands + [broken_ligand],
+            os.path.join(self.tmp_dir.name, 'batch'),
+            self.config
+        ).run()
+        self.assertEqual(batch_preparation.failed, [broken_ligand])
+        for converted_ligand in batch_preparation.converted_ligands[:2]:
+            self.assertTrue(os.path.exists(converted_ligand))
+        self.assertTrue(batch_preparation.output_exists())
+
+    def test_batch_rerun(self):
+        """Test a batch rerun only converts changed ligands and keeps recorded failures"""
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'))
+        config = configparser.ConfigParser()
+        config.read(write_stub_config(os.path.join(self.tmp_dir.name, 'config.ini'), stubs))
+        ligands = []
+        for ligand in ['1cbx_ligand.sdf', '1cps_ligand.sdf']:
+            ligands.append(os.path.join(self.tmp_dir.name, ligand))
+            shutil.copy(os.path.join(BASE_DIR, 'tests', 'test_files', ligand), ligands[-1])
+        broken_ligand = os.path.join(self.tmp_dir.name, 'broken.sdf')
+        with open(broken_ligand, 'w') as broken_ligand_file:
+            broken_ligand_file.write('not a molecule\n')
+        output = os.path.join(self.tmp_dir.name, 'batch')
+        batch_preparation = BatchPreparation(ligands + [broken_ligand], output, config)
+        self.assertFalse(batch_preparation.output_exists())
+        batch_preparation.run()
+        self.assertEqual(batch_preparation.failed, [broken_ligand])
+        self.assertTrue(batch_preparation.output_exists())
+
+        script = os.path.join(output, 'write_converted_ligand.py')
+        os.remove(script)
+        batch_preparation.run()
+        self.assertFalse(os.path.exists(script))
+        self.assertEqual(batch_preparation.failed, [broken_ligand])
+
+        with open(ligands[1], 'a') as ligand_file:
+            ligand_file.write('\n')
+        batch_preparation.run()
+        with open(script) as script_file:
+            script = script_file.read()
+        self.assertIn(ligands[1], script)
+        self.assertNotIn(ligands[0], script)
+        self.assertNotIn(broken_ligand, script)
+        for converted_ligand in batch_preparation.converted_ligands[:2]:
+            self.assertTrue(os.path.exists(converted_ligand))
+
     def tearDown(self):
         self.tmp_dir.cleanup()
@@ -0,0 +1,62 @@
+"""Test process execution"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import set_process_limit
+from pipeline_elements.process import run_process, run_process_async
+
+
+class ProcessTest(TestCase):
+    """Test process execution"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.log = os.path.join(self.tmp_dir.name, 'step.log')
+
+    def test_run_process(self):
+        """Test output is streamed to the log file"""
+        run_process(
+            [sys.executable, '-c', 'for i in range(3): print(i)'],
+            log=self.log
+        )
+        with open(self.log) as log:
+            self.assertEqual(log.read().split(), ['0', '1', '2'])
+
+    def test_run_process_with_input(self):
+        """Test input is passed to the standard input"""
+        run_process(
+            [sys.executable, '-c', 'import sys; print(sys.stdin.read().upper())'],
+            input=b'spheres',
+            log=self.log
+        )
+        with open(self.log) as log:
+            self.assertEqual(log.read().strip(), 'SPHERES')
+
+    def test_run_process_failure(self):
+        """Test failing binaries raise"""
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_process([sys.executable, '-c', 'import sys; sys.exit(3)'], log=self.log)
+
+    def test_process_limit(self):
+        """Test the process limit applies to awaitable runs"""
+        async def run_all():
+            await asyncio.gather(*[
+                run_process_async([sys.executable, '-c', 'import time; time.sleep(0.3)'])
+                for _index in range(2)
+            ])
+
+        set_process_limit(1)
+        try:
+            start = time.time()
+            asyncio.run(run_all())
+            self.assertGreater(time.time() - start, 0.6)
+        finally:
+            set_process_limit(0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,120 @@
+"""Test ranking analysis"""
+import math
+import os
+import random
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from ranking_analysis import RankingAnalysis
+
+
+def count_all_pairs(rank_tuples):
+    """Reference count comparing every pair of rank tuples"""
+    significant_differences = 0
+    correct_differences = 0
+    involved = set()
+    for rank in rank_tuples:
+        for other in rank_tuples:
+            if rank == other:
+                continue
+            if RankingAnalysis.is_significant(other[2], rank[3]):
+                involved.add(rank[1])
+                involved.add(other[1])
+                significant_differences += 1
+                if other[0] > rank[0]:
+                    correct_differences += 1
+            if RankingAnalysis.is_significant(rank[2], other[3]):
+                involved.add(rank[1])
+                involved.add(other[1])
+                significant_differences += 1
+                if other[0] < rank[0]:
+                    correct_differences += 1
+    return significant_differences / 2, correct_differences / 2, involved
+
+
+class RankingAnalysisTest(TestCase):
+    """Test ranking analysis"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_ingestion(self):
+        """Test streaming scores and affinities into interned compound ids"""
+        scores = os.path.join(self.tmp_dir.name, 'scores.tsv')
+        with open(scores, 'w') as scores_file:
+            scores_file.write('a,b_1\t-10.5\nc_1\t\nb,a_2\t-12.0\nd_1\t-3.0\nb,a_3\t-11.0\n')
+        affinities = os.path.join(self.tmp_dir.name, 'affinities.csv')
+        with open(affinities, 'w') as affinities_file:
+            affinities_file.write('a,,1,uM\na,,300,nM\nb,,5,pM\nc,,2,nM\nd,,1,nM\n')
+        ranking_analysis = RankingAnalysis(scores, affinities)
+        min_affinities, max_affinities = ranking_analysis.get_affinities()
+        candidates, unique_scores = ranking_analysis.get_unique_scores()
+        self.assertEqual(ranking_analysis.names, ['a', 'b', 'c', 'd'])
+        self.assertEqual(list(min_affinities), [300.0, 0.005, 2.0, 1.0])
+        self.assertEqual(list(max_affinities), [1000.0, 0.005, 2.0, 1.0])
+        # the better scored stereoisomer replaces the first one in place
+        self.assertEqual(candidates, [(1, 0), (2,), (3,)])
+        self.assertEqual(unique_scores[0], -12.0)
+        self.assertTrue(math.isnan(unique_scores[1]))
+        self.assertEqual(unique_scores[2], -3.0)
+
+    def test_ingestion_order(self):
+        """Test affinities are keyed by compound id whatever order names are interned in"""
+        scores = os.path.join(self.tmp_dir.name, 'scores.tsv')
+        with open(scores, 'w') as scores_file:
+            scores_file.write('c_1\t-9.0\nb_1\t-8.0\na_1\t-7.0\n')
+        affinities = os.path.join(self.tmp_dir.name, 'affinities.csv')
+        with open(affinities, 'w') as affinities_file:
+            affinities_file.write('a,,10,nM\nb,,1,nM\nb,,3,nM\nb,,2,nM\n')
+        ranking_analysis = RankingAnalysis(scores, affinities)
+        candidates, _unique_scores = ranking_analysis.get_unique_scores()
+        min_affinities, max_affinities = ranking_analysis.get_affinities()
+        self.assertEqual(ranking_analysis.names, ['c', 'b', 'a'])
+        self.assertEqual(candidates, [(0,), (1,), (2,)])
+        self.assertTrue(math.isnan(min_affinities[0]))
+        self.assertTrue(math.isnan(max_affinities[0]))
+        self.assertEqual(list(min_affinities[1:]), [1.0, 10.0])
+        self.assertEqual(list(max_affinities[1:]), [3.0, 10.0])
+        with self.assertRaisesRegex(RuntimeError, 'No affinity for: c'):
+            ranking_analysis.perform()
+
+    def test_count_significant_differences(self):
+        """Test counting significant differences matches comparing all pairs"""
+        generator = random.Random(11)
+        for _sample in range(200):
+            rank_tuples = []
+            size = generator.randint(0, 40)
+            for index in range(size):
+                min_affinity = generator.choice([
+                    0.0, 1.0, 10.0, 100.0, 1000.0,
+                    10 ** generator.uniform(-2, 5),
+                    float('nan')
+                ])
+                max_affinity = min_affinity * generator.choice([1, 1, 2, 10, 30])
+                rank_tuples.append((
+                    generator.randint(0, size // 2 + 1),
+                    'compound{}'.format(generator.randint(0, size)),
+                    min_affinity,
+                    max_affinity
+                ))
+            # identical tuples are never compared
+            rank_tuples.extend(generator.sample(rank_tuples, min(3, len(rank_tuples))))
+            self.assertEqual(
+                RankingAnalysis.count_significant_differences(rank_tuples),
+                count_all_pairs(rank_tuples)
+            )
+
+    def test_epsilon(self):
+        """Test affinities exactly the significance factor apart are significant"""
+        rank_tuples = [(0, 'strong', 1.0, 1.0), (1, 'weak', 10.0, 10.0), (2, 'zero', 0.0, 0.0)]
+        self.assertEqual(
+            RankingAnalysis.count_significant_differences(rank_tuples),
+            count_all_pairs(rank_tuples)
+        )
+        self.assertEqual(
+            RankingAnalysis.count_significant_differences(rank_tuples[:2]),
+            (1, 1, {'strong', 'weak'})
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,152 @@
+"""Test resource accounting"""
+import os
+import sys
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import PipelineElement, ResourceReport, Scheduler
+from pipeline_elements.resources import dominant_step, output_directories, self_wall_times, \
+    summarize
+
+
+class WriteFile(PipelineElement):
+    """Minimal pipeline element writing a file from an external process"""
+
+    def __init__(self, target, size):
+        self.target = target
+        self.size = size
+
+    def run(self, _recalc=False):
+        PipelineElement._commandline([
+            sys.executable, '-c',
+            'open({!r}, "wb").write(b"x" * {})'.format(self.target, self.size)
+        ])
+        return self
+
+    def output_exists(self):
+        return PipelineElement._files_exist([self.target])
+
+    @property
+    def outputs(self):
+        return [self.target]
+
+
+class NestedWrites(PipelineElement):
+    """Minimal pipeline element running its own scheduler of two file writes"""
+
+    def __init__(self, directory, delays):
+        self.directory = directory
+        self.delays = delays
+
+    def run(self, _recalc=False):
+        scheduler = Scheduler()
+        for index, delay in enumerate(self.delays):
+            target = os.path.join(self.directory, str(index))
+            scheduler.add(SlowWrite(target, delay), 'write {}'.format(index))
+        scheduler.run()
+        return self
+
+    def output_exists(self):
+        return False
+
+    @property
+    def outputs(self):
+        return [os.path.join(self.directory, 'nested')]
+
+
+class SlowWrite(WriteFile):
+    """Minimal pipeline element writing a file after a delay"""
+
+    def __init__(self, target, delay):
+        super().__init__(target, 10)
+        self.delay = delay
+
+    def run(self, _recalc=False):
+        time.sleep(self.delay)
+        return super().run()
+
+
+class ResourceReportTest(TestCase):
+    """Test resource accounting"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_scheduler_steps(self):
+        """Test steps and their binaries are recorded across scheduler threads"""
+        first = os.path.join(self.tmp_dir.name, 'first', 'data')
+        second = os.path.join(self.tmp_dir.name, 'second', 'data')
+        os.mkdir(os.path.dirname(first))
+        os.mkdir(os.path.dirname(second))
+        with ResourceReport() as report:
+            Scheduler(2) \
+                .add(WriteFile(first, 1000), 'first') \
+                .add(WriteFile(second, 3000), 'second') \
+                .run()
+            Scheduler().add(WriteFile(first, 1000), 'first again').run()
+        report_dict = report.to_dict()
+        steps = {step['description']: step for step in report_dict['steps']}
+        self.assertEqual(len(report_dict['processes']), 2)
+        self.assertEqual(steps['first']['processes'], 1)
+        self.assertGreaterEqual(steps['second']['bytes_written'], 3000)
+        self.assertGreater(steps['second']['max_rss'], 0)
+        self.assertGreater(
+            steps['second']['user_time'] + steps['second']['system_time'], 0)
+        self.assertTrue(steps['first again']['cached'])
+        self.assertEqual(steps['first again']['processes'], 0)
+        self.assertGreater(report_dict['wall_time'], 0)
+        report.write(os.path.join(self.tmp_dir.name, 'resources.json'))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'resources.json')))
+
+    def test_no_report(self):
+        """Test binaries and steps run without a report"""
+        target = os.path.join(self.tmp_dir.name, 'data')
+        Scheduler().add(WriteFile(target, 10), 'write').run()
+        self.assertTrue(os.path.exists(target))
+
+    def test_merge_and_summarize(self):
+        """Test merging worker reports and summing steps over reports"""
+        target = os.path.join(self.tmp_dir.name, 'data')
+        with ResourceReport() as worker_report:
+            Scheduler().add(WriteFile(target, 10), 'write').run()
+        with ResourceReport() as report:
+            PipelineElement._commandline([sys.executable, '-c', 'pass'])
+        report.merge(worker_report.to_dict())
+        report.merge(worker_report.to_dict())
+        report_dict = report.to_dict()
+        self.assertEqual(len(report_dict['steps']), 2)
+        self.assertEqual(len(report_dict['processes']), 3)
+        self.assertEqual([step['processes'] for step in report_dict['steps']], [1, 1])
+        summary = summarize([report_dict, worker_report.to_dict()])
+        self.assertEqual(summary['write']['count'], 3)
+        self.assertGreaterEqual(summary['write']['bytes_written'], 30)
+
+    def test_nested_steps(self):
+        """Test parent steps only count their own wall time"""
+        with ResourceReport() as report:
+            Scheduler().add(NestedWrites(self.tmp_dir.name, [0.3, 0.1]), 'nested').run()
+        report_dict = report.to_dict()
+        steps = {step['description']: step for step in report_dict['steps']}
+        self.assertEqual(steps['write 0']['parent'], report_dict['steps'].index(steps['nested']))
+        wall_times = self_wall_times(report_dict['steps'])
+        self.assertAlmostEqual(sum(wall_times), steps['nested']['wall_time'])
+        self.assertLess(wall_times[report_dict['steps'].index(steps['nested'])], 0.1)
+        step, wall_time = dominant_step(report_dict)
+        self.assertEqual(step['description'], 'write 0')
+        self.assertEqual(wall_time, step['wall_time'])
+        summary = summarize([report_dict])
+        self.assertAlmostEqual(
+            sum(totals['wall_time'] for totals in summary.values()), steps['nested']['wall_time'])
+        self.assertLessEqual(
+            sum(totals['wall_time'] for totals in summary.values()), report_dict['wall_time'])
+
+    def test_output_directories(self):
+        """Test nested output directories are only counted once"""
+        self.assertEqual(
+            output_directories(['/a/b/c.txt', '/a/b/d/e.txt', '/a/bc/f.txt', '/g/h.txt']),
+            ['/a/b', '/a/bc', '/g']
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
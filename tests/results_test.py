@@ -0,0 +1,96 @@
+"""Test the results store"""
+import configparser
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from benchmarks.generators import write_docked_poses
+from cross_docking import CrossDocking
+from pipeline_elements import BASE_DIR, ResultsIngestion, ResultsStore
+from tests.stubs import write_stub_config, write_stubs
+
+TEST_FILES = os.path.join(BASE_DIR, 'tests', 'test_files')
+
+
+class ResultsStoreTest(TestCase):
+    """Test the results store"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.store = ResultsStore(os.path.join(self.tmp_dir.name, 'results.sqlite'))
+        self.docked = os.path.join(self.tmp_dir.name, 'docked_scored.mol2')
+        shutil.copy(os.path.join(TEST_FILES, 'docked_scored.mol2'), self.docked)
+
+    def test_ingest(self):
+        """Test poses are ingested with their headers and offsets"""
+        self.assertEqual(self.store.ingest(self.docked, 'run_a', receptor='1cps'), 39)
+        top = self.store.top_hits(1)[0]
+        self.assertEqual(top['ligand'], '1cbx_ligand')
+        self.assertEqual(top['pose'], 0)
+        self.assertAlmostEqual(top['grid_score'], -27.732277)
+        self.assertAlmostEqual(top['rmsd_h'], 2.4152)
+        text = self.store.pose_text(top)
+        self.assertTrue(text.lstrip().startswith('##########                                Name:'))
+        self.assertEqual(text.count('@<TRIPOS>MOLECULE'), 1)
+        self.assertIn('-27.732277', text)
+
+        self.assertEqual(self.store.ingest(self.docked, 'run_a', receptor='1cps'), 39)
+        self.assertEqual(len(self.store.top_hits(100)), 39)
+        self.assertEqual(self.store.runs()[0]['poses'], 39)
+        self.assertTrue(self.store.is_ingested(self.docked, 'run_a'))
+        with open(self.docked, 'a') as docked_file:
+            docked_file.write('\n')
+        self.assertFalse(self.store.is_ingested(self.docked, 'run_a'))
+
+    def test_queries(self):
+        """Test leaderboards and comparisons across runs"""
+        generated = os.path.join(self.tmp_dir.name, 'generated.mol2')
+        write_docked_poses(generated, 20, atoms=5)
+        self.store.ingest(self.docked, 'run_a', receptor='1cps')
+        self.store.ingest(generated, 'run_b', receptor='1cps')
+        self.store.ingest(self.docked, 'run_c', receptor='3ryx')
+
+        leaderboard = self.store.leaderboard('1cps', limit=100)
+        self.assertEqual(len(leaderboard), 21)
+        scores = [pose['grid_score'] for pose in leaderboard]
+        self.assertEqual(scores, sorted(scores))
+        self.assertEqual(leaderboard[0]['ligand'], 'ligand_0')
+        self.assertEqual(len(self.store.top_hits(100, receptor='3ryx')), 39)
+
+        comparison = self.store.compare('1cbx_ligand')
+        self.assertEqual([pose['run'] for pose in comparison], ['run_a', 'run_c'])
+        self.assertEqual(self.store.compare('missing'), [])
+        pose = self.store.pose('run_b', 3)
+        self.assertEqual(pose['ligand'], 'ligand_3')
+        self.assertIn('ligand_3', self.store.pose_text(pose))
+
+    def test_ingestion(self):
+        """Test ingestion is skipped while the docked file is unchanged"""
+        ingestion = ResultsIngestion(self.docked, self.store.path, 'run_a', receptor='1cps')
+        self.assertFalse(ingestion.output_exists())
+        self.assertEqual(ingestion.run().poses, 39)
+        self.assertTrue(ingestion.output_exists())
+        self.assertIsNone(ResultsIngestion(self.docked, self.store.path, 'run_a').run().poses)
+
+    def test_workflow(self):
+        """Test a workflow ingests its docked poses into the configured store"""
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'), records=3)
+        config = configparser.ConfigParser()
+        config.read(write_stub_config(os.path.join(self.tmp_dir.name, 'config.ini'), stubs))
+        config['Execution']['results_store'] = self.store.path
+        output = os.path.join(self.tmp_dir.name, 'cross_docking')
+        CrossDocking(
+            os.path.join(TEST_FILES, '1cps.pdb'),
+            os.path.join(TEST_FILES, '1cps_ligand.sdf'),
+            os.path.join(TEST_FILES, '1cbx_ligand.sdf'),
+            output,
+            config
+        ).run()
+        runs = self.store.runs()
+        self.assertEqual([run['run'] for run in runs], [output])
+        self.assertEqual(runs[0]['receptor'], '1cps')
+        self.assertEqual(runs[0]['poses'], 3)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
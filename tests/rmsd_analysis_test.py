@@ -1,5 +1,7 @@
 """Test rmsd analysis"""
+import math
 import os
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 from pipeline_elements import BASE_DIR, RmsdAnalysis
@@ -18,3 +20,39 @@ class RmsdAnalysisTest(TestCase):
         self.assertIsNotNone(rmsd_analysis.top_rmsd_m)
         self.assertIsNotNone(rmsd_analysis.top_rmsd)
         self.assertTrue(rmsd_analysis.output_exists())
+
+    def test_run_with_all_poses(self):
+        """Test rmsd analysis of all poses"""
+        docked_poses = os.path.abspath(
+            os.path.join(BASE_DIR, 'tests', 'test_files', 'docked_scored.mol2'))
+        top_pose_analysis = RmsdAnalysis(docked_poses).run()
+        rmsd_analysis = RmsdAnalysis(docked_poses, all_poses=True).run()
+        self.assertEqual(rmsd_analysis.top_rmsd, top_pose_analysis.top_rmsd)
+        self.assertEqual(len(rmsd_analysis.columns['pose']), 39)
+        self.assertAlmostEqual(rmsd_analysis.columns['grid_score'][0], -27.732277)
+        self.assertAlmostEqual(rmsd_analysis.columns['internal_energy'][0], 6.477601)
+        self.assertEqual(rmsd_analysis.best_rmsd_in_top_n(1), rmsd_analysis.top_rmsd)
+        best_rmsd = min(rmsd_analysis.columns['rmsd'])
+        self.assertEqual(rmsd_analysis.best_rmsd_in_top_n(39), best_rmsd)
+        self.assertTrue(rmsd_analysis.top_n_success(39, threshold=best_rmsd))
+        self.assertFalse(rmsd_analysis.top_n_success(39, threshold=best_rmsd - 0.01))
+        self.assertTrue(-1 <= rmsd_analysis.score_rmsd_correlation() <= 1)
+
+    def test_run_without_valid_rmsd(self):
+        """Test an invalid rmsd_h without rmsd_s has no rmsd"""
+        with TemporaryDirectory() as tmp_dir:
+            docked_poses = os.path.join(tmp_dir, 'docked.mol2')
+            test_files = os.path.join(BASE_DIR, 'tests', 'test_files')
+            with open(os.path.join(test_files, 'docked_scored.mol2')) as docked:
+                text = docked.read()
+            with open(docked_poses, 'w') as docked:
+                docked.write(''.join(
+                    line.replace('2.4152', '-1.0000') for line in text.splitlines(True)
+                    if 'HA_RMSDs' not in line
+                ))
+            rmsd_analysis = RmsdAnalysis(docked_poses).run()
+            self.assertEqual(rmsd_analysis.top_rmsd_h, -1.0)
+            self.assertIsNone(rmsd_analysis.top_rmsd_s)
+            self.assertIsNone(rmsd_analysis.top_rmsd)
+            rmsd_analysis = RmsdAnalysis(docked_poses, all_poses=True).run()
+            self.assertTrue(math.isnan(rmsd_analysis.columns['rmsd'][0]))
@@ -0,0 +1,115 @@
+"""Test scheduler"""
+import os
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import PipelineElement, Scheduler
+
+
+class FileCopy(PipelineElement):
+    """Minimal pipeline element copying one file to another"""
+
+    def __init__(self, source, target, log, delay=0.0):
+        self.source = source
+        self.target = target
+        self.log = log
+        self.delay = delay
+
+    def run(self, _recalc=False):
+        PipelineElement._files_must_exist([self.source])
+        self.log.append(('start', self.target))
+        time.sleep(self.delay)
+        with open(self.source) as source, open(self.target, 'w') as target:
+            target.write(source.read())
+        self.log.append(('end', self.target))
+        return self
+
+    def output_exists(self):
+        return PipelineElement._files_exist([self.target])
+
+    @property
+    def inputs(self):
+        return [self.source]
+
+    @property
+    def outputs(self):
+        return [self.target]
+
+
+class SchedulerTest(TestCase):
+    """Test scheduler"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.source = os.path.join(self.tmp_dir.name, 'source')
+        with open(self.source, 'w') as source:
+            source.write('content')
+
+    def path(self, name):
+        """Path in the temporary directory"""
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_dependencies(self):
+        """Test dependencies are derived from inputs and outputs"""
+        log = []
+        scheduler = Scheduler()
+        scheduler.add(FileCopy(self.path('a'), self.path('b'), log), 'b')
+        scheduler.add(FileCopy(self.source, self.path('a'), log), 'a')
+        scheduler.add(FileCopy(self.source, self.path('c'), log), 'c')
+        self.assertEqual(scheduler.dependencies(), [{1}, set(), set()])
+
+    def test_run(self):
+        """Test elements run after their dependencies"""
+        log = []
+        scheduler = Scheduler(workers=4)
+        scheduler.add(FileCopy(self.path('a'), self.path('b'), log), 'b')
+        scheduler.add(FileCopy(self.source, self.path('a'), log, delay=0.1), 'a')
+        scheduler.run()
+        self.assertEqual(
+            log,
+            [('start', self.path('a')), ('end', self.path('a')),
+             ('start', self.path('b')), ('end', self.path('b'))]
+        )
+
+    def test_run_concurrently(self):
+        """Test independent elements run concurrently"""
+        log = []
+        scheduler = Scheduler(workers=2)
+        scheduler.add(FileCopy(self.source, self.path('a'), log, delay=0.2), 'a')
+        scheduler.add(FileCopy(self.source, self.path('b'), log, delay=0.2), 'b')
+        start = time.time()
+        scheduler.run()
+        self.assertLess(time.time() - start, 0.35)
+        self.assertEqual([event for event, _target in log[:2]], ['start', 'start'])
+
+    def test_skip_existing(self):
+        """Test elements with existing output are skipped unless rerun"""
+        log = []
+        Scheduler().add(FileCopy(self.source, self.path('a'), log), 'a').run()
+        Scheduler().add(FileCopy(self.source, self.path('a'), log), 'a').run()
+        self.assertEqual(len(log), 2)
+        Scheduler().add(FileCopy(self.source, self.path('a'), log), 'a', rerun=True).run()
+        self.assertEqual(len(log), 4)
+
+    def test_cycle(self):
+        """Test cyclic dependencies are detected"""
+        log = []
+        scheduler = Scheduler()
+        scheduler.add(FileCopy(self.path('a'), self.path('b'), log), 'b')
+        scheduler.add(FileCopy(self.path('b'), self.path('a'), log), 'a')
+        with self.assertRaises(RuntimeError):
+            scheduler.run()
+
+    def test_failure(self):
+        """Test failing elements stop the run"""
+        log = []
+        scheduler = Scheduler()
+        scheduler.add(FileCopy(self.path('missing'), self.path('a'), log), 'a')
+        scheduler.add(FileCopy(self.path('a'), self.path('b'), log), 'b')
+        with self.assertRaises(RuntimeError):
+            scheduler.run()
+        self.assertFalse(os.path.exists(self.path('b')))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
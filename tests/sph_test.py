@@ -0,0 +1,71 @@
+"""Test reading, selecting and writing DOCK spheres"""
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR
+from pipeline_elements.geometry import squared_distance
+from pipeline_elements.sph import SphereSet, read_spheres, select_spheres, write_sphere_pdb, \
+    write_spheres
+
+SPHERES = os.path.join(BASE_DIR, 'tests', 'test_files', 'selected_spheres.sph')
+
+
+class SphereSetTest(TestCase):
+    """Test reading, selecting and writing DOCK spheres"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+
+    def test_read_write(self):
+        """Test writing read spheres reproduces the sphere file"""
+        spheres = read_spheres(SPHERES)
+        self.assertEqual(len(spheres), 75)
+        self.assertEqual(spheres.numbers[0], 71)
+        self.assertEqual(spheres.center(0), (-2.18935, 29.50677, -5.68696))
+        self.assertEqual(spheres.radii[0], 2.556)
+        self.assertEqual(spheres.surface_atoms[0], 1100)
+        self.assertEqual(set(spheres.clusters), {1})
+        written = os.path.join(self.tmp_dir.name, 'spheres.sph')
+        write_spheres(spheres, written, title='DOCK spheres within 10 ang of ligands')
+        with open(SPHERES) as expected, open(written) as actual:
+            self.assertEqual(actual.read(), expected.read())
+
+    def test_select(self):
+        """Test selecting spheres close to atoms"""
+        spheres = SphereSet()
+        spheres.append(1, (0.0, 0.0, 0.0), 1.5, cluster=1)
+        spheres.append(2, (5.0, 0.0, 0.0), 1.5, cluster=1)
+        spheres.append(3, (0.0, 9.0, 0.0), 1.5, cluster=2)
+        spheres.append(4, (0.0, 0.0, 20.0), 1.5, cluster=2)
+        for number in range(1, 5):  # sphgen summary cluster
+            spheres.append(number, spheres.center(number - 1), 1.5, cluster=0)
+        atoms = [(1.0, 1.0, 0.0), (0.0, 6.0, 0.0)]
+        selected = select_spheres(spheres, atoms, 4.5)
+        self.assertEqual(list(selected.numbers), [1, 2, 3])
+        self.assertEqual(set(selected.clusters), {1})
+
+        all_spheres = read_spheres(SPHERES)
+        atoms = [(0.0, 30.0, -5.0), (3.0, 25.0, 0.0)]
+        selected = select_spheres(all_spheres, atoms, 4.0)
+        expected = [
+            all_spheres.numbers[index] for index in range(len(all_spheres))
+            if any(squared_distance(all_spheres.center(index), atom) < 16.0 for atom in atoms)
+        ]
+        self.assertTrue(expected)
+        self.assertEqual(list(selected.numbers), expected)
+
+    def test_write_pdb(self):
+        """Test writing spheres as PDB"""
+        spheres = read_spheres(SPHERES)
+        pdb = os.path.join(self.tmp_dir.name, 'spheres.pdb')
+        write_sphere_pdb(spheres, pdb)
+        with open(pdb) as pdb_file:
+            atoms = [line for line in pdb_file if line.startswith('ATOM')]
+        self.assertEqual(len(atoms), 75)
+        self.assertEqual(float(atoms[0][30:38]), -2.189)
+        self.assertEqual(float(atoms[0][60:66]), 2.56)
+        self.assertEqual(atoms[0][17:20], 'SPH')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,77 @@
+"""Test directory store"""
+import os
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import DirectoryStore
+from pipeline_elements.store import link_file
+
+
+class DirectoryStoreTest(TestCase):
+    """Test directory store"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.store = DirectoryStore(os.path.join(self.tmp_dir.name, 'store'))
+
+    def make_directory(self, name, size):
+        """Directory containing a single file of a given size"""
+        directory = os.path.join(self.tmp_dir.name, name)
+        os.makedirs(os.path.join(directory, 'sub'))
+        with open(os.path.join(directory, 'sub', 'data'), 'wb') as data:
+            data.write(b'x' * size)
+        return directory
+
+    def test_add_and_get(self):
+        """Test adding and retrieving an entry"""
+        self.assertIsNone(self.store.get('key'))
+        self.store.add('key', self.make_directory('source', 10), description='source')
+        entry = self.store.get('key')
+        self.assertTrue(os.path.exists(os.path.join(entry, 'sub', 'data')))
+        self.assertEqual(self.store.entries()[0]['size'], 10)
+        self.assertEqual(self.store.entries()[0]['description'], 'source')
+
+    def test_key(self):
+        """Test keys depend on file contents and parameters"""
+        source = os.path.join(self.make_directory('source', 10), 'sub', 'data')
+        key = DirectoryStore.key([source], ['radius=10'])
+        self.assertEqual(key, DirectoryStore.key([source], ['radius=10']))
+        self.assertNotEqual(key, DirectoryStore.key([source], ['radius=8']))
+
+    def test_evict_least_recently_used(self):
+        """Test least recently used entries are evicted over budget"""
+        self.store.budget = 25
+        self.store.add('first', self.make_directory('first', 10))
+        time.sleep(0.01)
+        self.store.add('second', self.make_directory('second', 10))
+        # entry use is recorded in modification times
+        time.sleep(0.01)
+        self.store.get('first')
+        self.store.add('third', self.make_directory('third', 10))
+        self.assertIsNotNone(self.store.get('first'))
+        self.assertIsNone(self.store.get('second'))
+        self.assertIsNotNone(self.store.get('third'))
+
+    def test_prune(self):
+        """Test entries unused for too long are pruned"""
+        self.store.add('old', self.make_directory('old', 10))
+        self.store.add('new', self.make_directory('new', 10))
+        metadata = os.path.join(self.store.path('old'), DirectoryStore.METADATA)
+        os.utime(metadata, (time.time() - 3600, time.time() - 3600))
+        self.assertEqual(self.store.prune(max_age=60), ['old'])
+        self.assertIsNone(self.store.get('old'))
+        self.assertIsNotNone(self.store.get('new'))
+        self.assertEqual(self.store.prune(budget=0), ['new'])
+
+    def test_link_file(self):
+        """Test linked files share their contents and replace the target"""
+        source = os.path.join(self.make_directory('source', 10), 'sub', 'data')
+        target = os.path.join(self.tmp_dir.name, 'target')
+        with open(target, 'w') as target_file:
+            target_file.write('old')
+        link_file(source, target)
+        self.assertTrue(os.path.samefile(source, target))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -0,0 +1,211 @@
+"""Stand-in for the external binaries of the DOCK workflow
+
+Every stand-in parses the commandline of the binary it replaces, sleeps
+for a configurable time and writes outputs the pipeline elements accept.
+The number of records written (poses per ligand, spheres, grid points per
+edge) is configurable, so the output size can be tuned.
+
+    STUB_SLEEP=0.1 STUB_RECORDS=10 PYTHONPATH=. python tests/stub_binary.py dock -i dock.in
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+
+from pipeline_elements.dock_grid import write_dock_grid
+from pipeline_elements.mol2 import read_molecules
+from pipeline_elements.prepare import read_coordinates
+
+BINARIES = ('protoss', 'clean_binding_site', 'chimera', 'dms', 'sphgen', 'grid', 'dock')
+MOL2_ATOM = '{:7d} {:<8}{:10.4f}{:10.4f}{:10.4f} {:<8}{:>3}  {:<8}{:10.4f}\n'
+SYBYL_TYPES = {'C': 'C.3', 'N': 'N.3', 'O': 'O.3', 'S': 'S.3', 'P': 'P.3'}
+SDF_BOND_TYPES = {'1': '1', '2': '2', '3': '3', '4': 'ar'}
+
+
+def protoss(args, _records):
+    """Copy the protein and ligand as protonated protein and ligand"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i')
+    parser.add_argument('-o')
+    parser.add_argument('--ligand_input')
+    parser.add_argument('--ligand_output')
+    args = parser.parse_args(args)
+    copy(args.i, args.o)
+    if args.ligand_input:
+        copy(args.ligand_input, args.ligand_output)
+
+
+def clean_binding_site(args, _records):
+    """Copy the protein to the cleaned protein"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p')
+    parser.add_argument('-l')
+    parser.add_argument('-c')
+    args = parser.parse_args(args)
+    if os.path.abspath(args.p) != os.path.abspath(args.c):
+        copy(args.p, args.c)
+
+
+def chimera(args, _records):
+    """Convert the ligands of a conversion script to MOL2"""
+    script = [arg for arg in args if not arg.startswith('--')][0]
+    with open(script) as script_file:
+        for line in script_file:
+            if line.startswith('for ligand, converted_ligand in '):
+                conversions = ast.literal_eval(
+                    line[len('for ligand, converted_ligand in '):].strip().rstrip(':'))
+                break
+        else:
+            raise RuntimeError('Did not find conversions in: {}'.format(script))
+    for ligand, converted_ligand in conversions:
+        try:
+            convert(ligand, converted_ligand)
+        except (OSError, ValueError, IndexError) as error:
+            print('conversion failed: ' + ligand + ': ' + str(error))
+
+
+def dms(args, _records):
+    """Write the atoms of the active site as surface points"""
+    output = args[args.index('-o') + 1]
+    with open(output, 'w') as surface:
+        for x, y, z in read_coordinates(args[0]):
+            surface.write('SUR {:8.3f} {:8.3f} {:8.3f} SA\n'.format(x, y, z))
+
+
+def sphgen(_args, records):
+    """Write one cluster of spheres on the surface points of INSPH"""
+    with open('INSPH') as insph:
+        lines = [line.strip() for line in insph]
+    surface, spheres = lines[0], lines[6]
+    points = []
+    with open(surface) as surface_file:
+        for line in surface_file:
+            columns = line.split()
+            points.append((float(columns[1]), float(columns[2]), float(columns[3])))
+    step = max(1, len(points) // max(1, records))
+    points = points[::step]
+    with open(spheres, 'w') as sphere_file:
+        sphere_file.write('DOCK spheres generated from surface\n')
+        sphere_file.write('cluster     1   number of spheres in cluster{:6d}\n'.format(len(points)))
+        for number, (x, y, z) in enumerate(points, start=1):
+            sphere_file.write('{:5d}{:10.5f}{:10.5f}{:10.5f}{:8.3f}{:5d}{:2d}{:3d}\n'.format(
+                number, x, y, z, 1.5, number, 0, 0))
+
+
+def grid(args, records):
+    """Write an energy and a bump grid of records points per edge into the box"""
+    parameters = read_parameters(args[args.index('-i') + 1])
+    with open(parameters['box_file']) as box:
+        corners = [
+            (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+            for line in box if line.startswith('ATOM')
+        ]
+    origin = tuple(min(corner[dimension] for corner in corners) for dimension in range(3))
+    span = (max(2, records),) * 3
+    size = span[0] * span[1] * span[2]
+    write_dock_grid(
+        parameters['score_grid_prefix'],
+        origin,
+        float(parameters['grid_spacing']),
+        span,
+        [0.0] * size,
+        [0.0] * size,
+        [0.0] * size,
+        bump=[255] * size
+    )
+
+
+def dock(args, records):
+    """Write records scored poses of every ligand"""
+    parameters = read_parameters(args[args.index('-i') + 1])
+    rmsd = parameters.get('calculate_rmsd') == 'yes'
+    with open(parameters['ligand_outfile_prefix'] + '_scored.mol2', 'w') as docked:
+        for ligand in read_molecules(parameters['ligand_atom_file']):
+            for pose in range(records):
+                headers = [
+                    ('Name', ligand.name),
+                    ('Grid_Score', -40.0 + pose),
+                    ('Grid_vdw_energy', -35.0 + pose),
+                    ('Grid_es_energy', -5.0),
+                    ('Internal_energy_repulsive', 2.0)
+                ]
+                if rmsd:
+                    headers.extend([('HA_RMSDs', 0.5 * pose), ('HA_RMSDh', 0.5 * pose),
+                                    ('HA_RMSDm', 0.5 * pose)])
+                for field, value in headers:
+                    docked.write('##########{:>36}:{:>20}\n'.format(field, value))
+                docked.write(ligand.text.lstrip('\n'))
+                docked.write('\n')
+
+
+def read_parameters(path):
+    """Parameters of a DOCK input file"""
+    parameters = {}
+    with open(path) as parameter_file:
+        for line in parameter_file:
+            columns = line.split()
+            if len(columns) > 1:
+                parameters[columns[0]] = columns[1]
+    return parameters
+
+
+def copy(source, target):
+    """Copy a file"""
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        target_file.write(source_file.read())
+
+
+def convert(ligand, converted_ligand):
+    """Convert an SDF, PDB or MOL2 file to MOL2 without typing"""
+    extension = os.path.splitext(ligand)[1].lower()
+    if extension == '.mol2':
+        copy(ligand, converted_ligand)
+        return
+    name = os.path.splitext(os.path.basename(ligand))[0]
+    if extension == '.pdb':
+        with open(ligand) as pdb:
+            atoms = [
+                (line[12:16].strip(), (float(line[30:38]), float(line[38:46]),
+                                       float(line[46:54])),
+                 (line[76:78].strip() or line[12:16].strip()[0]).capitalize(), line[17:20])
+                for line in pdb if line.startswith(('ATOM', 'HETATM'))
+            ]
+        bonds = []
+    else:
+        with open(ligand) as sdf:
+            lines = sdf.read().splitlines()
+        name = lines[0].strip() or name
+        atom_count, bond_count = int(lines[3][0:3]), int(lines[3][3:6])
+        atoms = []
+        for index, line in enumerate(lines[4:4 + atom_count], start=1):
+            element = line[31:34].strip()
+            atoms.append((element + str(index),
+                          (float(line[0:10]), float(line[10:20]), float(line[20:30])),
+                          element, 'LIG'))
+        bonds = [
+            (int(line[0:3]), int(line[3:6]), SDF_BOND_TYPES.get(line[6:9].strip(), '1'))
+            for line in lines[4 + atom_count:4 + atom_count + bond_count]
+        ]
+    with open(converted_ligand, 'w') as mol2:
+        mol2.write('@<TRIPOS>MOLECULE\n{}\n{:5d}{:6d}\nSMALL\nNO_CHARGES\n\n'.format(
+            name, len(atoms), len(bonds)))
+        mol2.write('@<TRIPOS>ATOM\n')
+        for atom_id, (atom_name, (x, y, z), element, residue) in enumerate(atoms, start=1):
+            mol2.write(MOL2_ATOM.format(
+                atom_id, atom_name, x, y, z, SYBYL_TYPES.get(element, element), 1, residue, 0.0))
+        mol2.write('@<TRIPOS>BOND\n')
+        for bond_id, (origin, target, bond_type) in enumerate(bonds, start=1):
+            mol2.write('{:6d}{:6d}{:6d} {}\n'.format(bond_id, origin, target, bond_type))
+
+
+def main(binary, args):
+    """Module main to stand in for a binary"""
+    if binary not in BINARIES:
+        raise RuntimeError('Unknown binary: {}'.format(binary))
+    time.sleep(float(os.environ.get('STUB_SLEEP', 0)))
+    globals()[binary](args, int(os.environ.get('STUB_RECORDS', 10)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], sys.argv[2:])
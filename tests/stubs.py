@@ -0,0 +1,54 @@
+"""Stand-in binaries for tests of complete workflows"""
+import configparser
+import os
+import stat
+import sys
+
+from pipeline_elements import BASE_DIR
+
+STUB = '''#!/bin/sh
+STUB_SLEEP={sleep} STUB_RECORDS={records} PYTHONPATH={base_dir} exec {python} {stub} {binary} "$@"
+'''
+
+
+def write_stubs(directory, sleep=0.0, records=10):
+    """Write an executable stand-in for every binary
+
+    :param directory: directory to write the stand-ins to
+    :param sleep: seconds every stand-in sleeps
+    :param records: number of records every stand-in writes
+    :return: path of the stand-in by binary
+    """
+    os.makedirs(directory, exist_ok=True)
+    stubs = {}
+    for binary in ('protoss', 'clean_binding_site', 'chimera', 'dms', 'sphgen', 'grid', 'dock'):
+        stubs[binary] = os.path.join(directory, binary)
+        with open(stubs[binary], 'w') as stub_file:
+            stub_file.write(STUB.format(
+                sleep=sleep,
+                records=records,
+                base_dir=BASE_DIR,
+                python=sys.executable,
+                stub=os.path.join(BASE_DIR, 'tests', 'stub_binary.py'),
+                binary=binary
+            ))
+        os.chmod(stubs[binary], os.stat(stubs[binary]).st_mode | stat.S_IEXEC)
+    return stubs
+
+
+def write_stub_config(path, stubs):
+    """Write a config using the stand-in binaries without stores
+
+    :param path: config file to write
+    :param stubs: path of the stand-in by binary
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(BASE_DIR, 'config.ini'))
+    for binary, stub in stubs.items():
+        config['Binaries'][binary] = stub
+    config['Execution']['workers'] = '1'
+    config['Execution']['receptor_store'] = ''
+    config['Execution']['grid_store'] = ''
+    with open(path, 'w') as config_file:
+        config.write(config_file)
+    return path
@@ -0,0 +1,172 @@
+"""Test the work queue"""
+import configparser
+import json
+import os
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pipeline_elements import BASE_DIR, Scheduler
+from pipeline_elements.work_queue import DONE, FAILED, PENDING, RUNNING, Heartbeat, WorkQueue, \
+    job_name, submit_workflow
+from tests.scheduler_test import FileCopy
+from tests.stubs import write_stub_config, write_stubs
+
+TEST_FILES = os.path.join(BASE_DIR, 'tests', 'test_files')
+
+
+class WorkQueueTest(TestCase):
+    """Test the work queue"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.queue_dir = os.path.join(self.tmp_dir.name, 'queue')
+
+    def test_claim(self):
+        """Test jobs are claimed once and retried until out of attempts"""
+        work_queue = WorkQueue(self.queue_dir, max_attempts=2)
+        self.assertTrue(work_queue.submit('a', 'self_docking', {}, 'out/a'))
+        self.assertTrue(work_queue.submit('b', 'self_docking', {}, 'out/b'))
+        self.assertFalse(work_queue.submit('a', 'self_docking', {}, 'out/a'))
+        first = work_queue.claim('worker_1')
+        second = work_queue.claim('worker_2')
+        self.assertEqual((first.name, second.name), ('a', 'b'))
+        self.assertIsNone(work_queue.claim('worker_3'))
+        self.assertEqual(work_queue.state('a'), RUNNING)
+        self.assertFalse(work_queue.submit('a', 'self_docking', {}, 'out/a'))
+
+        self.assertEqual(first.finish(), DONE)
+        self.assertEqual(second.finish('docking failed'), PENDING)
+        retry = work_queue.claim('worker_1')
+        self.assertEqual(retry.read()['attempts'], 2)
+        self.assertEqual(retry.finish('docking failed'), FAILED)
+        self.assertEqual(work_queue.counts(), {PENDING: 0, RUNNING: 0, DONE: 1, FAILED: 1})
+        with open(work_queue.path(FAILED, 'b')) as job_file:
+            history = json.load(job_file)['history']
+        self.assertEqual([claim['worker'] for claim in history], ['worker_2', 'worker_1'])
+        self.assertEqual(history[0]['error'], 'docking failed')
+
+    def test_expired(self):
+        """Test expired claims are requeued and can not be finished by their old owner"""
+        WorkQueue(self.queue_dir).submit('a', 'self_docking', {}, 'out/a')
+        lost = WorkQueue(self.queue_dir).claim('crashed')
+        self.assertEqual(WorkQueue(self.queue_dir).requeue_expired(), [])
+        self.assertEqual(WorkQueue(self.queue_dir, timeout=0).requeue_expired(), ['a'])
+        self.assertFalse(lost.heartbeat())
+        claim = WorkQueue(self.queue_dir).claim('worker')
+        self.assertIsNone(lost.finish())
+        self.assertEqual(claim.read()['attempts'], 2)
+        self.assertEqual(claim.finish(), DONE)
+
+        WorkQueue(self.queue_dir).submit('b', 'self_docking', {}, 'out/b')
+        WorkQueue(self.queue_dir).claim('crashed')
+        WorkQueue(self.queue_dir, timeout=0, max_attempts=1).requeue_expired()
+        self.assertEqual(WorkQueue(self.queue_dir).state('b'), FAILED)
+
+    def test_heartbeat(self):
+        """Test a heartbeat keeps a claim from expiring"""
+        work_queue = WorkQueue(self.queue_dir, timeout=0.5)
+        work_queue.submit('a', 'self_docking', {}, 'out/a')
+        claim = work_queue.claim('worker')
+        with Heartbeat(claim, 0.05):
+            for _check in range(10):
+                time.sleep(0.1)
+                self.assertEqual(work_queue.requeue_expired(), [])
+        time.sleep(0.6)
+        self.assertEqual(work_queue.requeue_expired(), ['a'])
+
+    def test_lost_claim(self):
+        """Test no pipeline element is started once the claim is lost"""
+        work_queue = WorkQueue(self.queue_dir)
+        work_queue.submit('a', 'self_docking', {}, 'out/a')
+        claim = work_queue.claim('worker')
+        source = os.path.join(self.tmp_dir.name, 'source')
+        with open(source, 'w') as source_file:
+            source_file.write('content')
+        log = []
+        scheduler = Scheduler()
+        scheduler.add(FileCopy(source, os.path.join(self.tmp_dir.name, 'a'), log, delay=0.5), 'a')
+        scheduler.add(FileCopy(
+            os.path.join(self.tmp_dir.name, 'a'), os.path.join(self.tmp_dir.name, 'b'), log), 'b')
+        with Heartbeat(claim, 0.05) as heartbeat:
+            self.assertEqual(WorkQueue(self.queue_dir, timeout=0).requeue_expired(), ['a'])
+            with self.assertRaisesRegex(RuntimeError, 'Lost claim of: a'):
+                scheduler.run()
+            self.assertTrue(heartbeat.lost.is_set())
+        self.assertEqual([target for _event, target in log], [
+            os.path.join(self.tmp_dir.name, 'a'), os.path.join(self.tmp_dir.name, 'a')])
+        self.assertIsNone(claim.finish())
+        self.assertEqual(work_queue.state('a'), PENDING)
+
+    def test_submit_workflow(self):
+        """Test workflows are submitted with absolute paths under their output directory"""
+        config = configparser.ConfigParser()
+        arguments = {'protein': '1cps.pdb', 'docking_in': None, 'shards': 2}
+        self.assertTrue(submit_workflow(
+            self.queue_dir, config, 'cross_docking', arguments, 'output/job'))
+        self.assertFalse(submit_workflow(
+            self.queue_dir, config, 'cross_docking', arguments, 'output/job'))
+        self.assertTrue(submit_workflow(
+            self.queue_dir, config, 'cross_docking', arguments, 'other/job', recalc=True))
+        work_queue = WorkQueue(self.queue_dir)
+        self.assertEqual(len(work_queue.jobs(PENDING)), 2)
+        self.assertTrue(job_name('output/job').startswith('job_'))
+        self.assertEqual(job_name('output/job'), job_name(os.path.abspath('output/job')))
+        with open(work_queue.path(PENDING, job_name('output/job'))) as job_file:
+            job = json.load(job_file)
+        self.assertEqual(job['arguments'], {'protein': os.path.abspath('1cps.pdb'), 'shards': 2})
+        self.assertEqual(job['output'], os.path.abspath('output/job'))
+        self.assertFalse(job['recalc'])
+        with open(work_queue.path(PENDING, job_name('other/job'))) as job_file:
+            self.assertTrue(json.load(job_file)['recalc'])
+
+    def test_workers(self):
+        """Test worker processes drain a queue including the job of a crashed worker"""
+        stubs = write_stubs(os.path.join(self.tmp_dir.name, 'bin'), records=3)
+        config_path = write_stub_config(os.path.join(self.tmp_dir.name, 'config.ini'), stubs)
+        config = configparser.ConfigParser()
+        config.read(config_path)
+        config['Execution']['queue_heartbeat'] = '0.2'
+        config['Execution']['queue_timeout'] = '2'
+        with open(config_path, 'w') as config_file:
+            config.write(config_file)
+
+        output = os.path.join(self.tmp_dir.name, 'output')
+        names = ['job_{}'.format(index) for index in range(5)]
+        for name in names:
+            subprocess.run([
+                sys.executable, os.path.join(BASE_DIR, 'cross_docking.py'),
+                os.path.join(TEST_FILES, '1cps.pdb'),
+                os.path.join(TEST_FILES, '1cps_ligand.sdf'),
+                os.path.join(TEST_FILES, '1cbx_ligand.sdf'),
+                os.path.join(output, name),
+                '--config', config_path,
+                '--queue', self.queue_dir
+            ], check=True, capture_output=True)
+        work_queue = WorkQueue(self.queue_dir)
+        jobs = sorted(job_name(os.path.join(output, name)) for name in names)
+        self.assertEqual(work_queue.jobs(PENDING), jobs)
+        crashed = work_queue.claim('crashed').name
+
+        workers = [
+            subprocess.Popen([
+                sys.executable, os.path.join(BASE_DIR, 'queue_worker.py'), self.queue_dir,
+                '--config', config_path, '--poll', '0.2'
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _worker in range(3)
+        ]
+        for worker in workers:
+            self.assertEqual(worker.wait(timeout=300), 0)
+
+        self.assertEqual(work_queue.jobs(DONE), jobs)
+        for name in jobs:
+            with open(work_queue.path(DONE, name)) as job_file:
+                job = json.load(job_file)
+            self.assertEqual(job['attempts'], 2 if name == crashed else 1)
+            self.assertTrue(os.path.exists(
+                os.path.join(job['output'], 'dock', 'docked_scored.mol2')))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()